@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark da montagem do histórico de chat nos prompts
+Compara re-renderizar todas as mensagens a cada pedido (comportamento antigo)
+com as linhas renderizadas guardadas pelo Chat, num canal de 10 mil mensagens
+"""
+
+import sys
+import os
+import time
+import datetime
+from types import SimpleNamespace
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from discord_tools.chat import Chat
+from discord_tools.conversion import parse_message
+from rpg_tools import prompts
+
+class FakeEntity:
+    """Usuário ou cargo falso; precisa ser hashable porque os mapas globais de IDs usam o objeto como chave"""
+
+    def __init__(self, id: int, **attrs):
+        self.id = id
+        self.__dict__.update(attrs)
+
+class FakeGuild:
+    """Servidor falso com o cache de membros e cargos do discord.py"""
+
+    def __init__(self, members: list, roles: list):
+        self.members = members
+        self.roles = roles
+        self._members = {member.id: member for member in members}
+        self._roles = {role.id: role for role in roles}
+
+    def get_member(self, id):
+        return self._members.get(id)
+
+    def get_role(self, id):
+        return self._roles.get(id)
+
+def fake_guild(members: int = 500, roles: int = 20):
+    """Servidor falso com membros e cargos, no formato usado por parse_message"""
+    users = [FakeEntity(1000 + i, display_name=f"Jogador{i}") for i in range(members)]
+    role_list = [FakeEntity(9000 + i, name=f"cargo{i}") for i in range(roles)]
+    return FakeGuild(users, role_list)
+
+def fake_messages(guild, count: int):
+    channel = SimpleNamespace(name="taverna", members=guild.members[:50])
+    start = datetime.datetime(2025, 1, 1)
+    messages = []
+    for i in range(count):
+        author = guild.members[i % len(guild.members)]
+        target = guild.members[(i * 7) % len(guild.members)]
+        content = f"<@{target.id}> eu ataco o goblin com minha espada e rolo iniciativa, {i}"
+        messages.append(SimpleNamespace(
+            content=content, created_at=start + datetime.timedelta(seconds=i),
+            author=author, mentions=[target], role_mentions=[], channel=channel, guild=guild,
+        ))
+    return messages
+
+def legacy_chat_build(messages):
+    """chatBuild original: parse_message de todo o histórico a cada pedido"""
+    chat_text = map(lambda x: f"$ Mensagem de {x.author.display_name} às {x.created_at}: " + parse_message(x) + "\n$$$", messages)
+    return "\n".join(chat_text)
+
+def bench_chat_build(count: int = 10_000, requests: int = 5):
+    guild = fake_guild()
+    messages = fake_messages(guild, count)
+
+    chat = Chat(max_messages=count)
+    start = time.perf_counter()
+    for message in messages:
+        chat.add_message(message, message.author.display_name)
+    add_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        legacy = legacy_chat_build(messages)
+    legacy_ms = (time.perf_counter() - start) / requests * 1000
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        prompt = prompts.chatBuild(chat)
+    cached_ms = (time.perf_counter() - start) / requests * 1000
+
+    assert legacy in prompt
+    print(f"🧪 Canal com {count} mensagens e {len(guild.members)} membros")
+    print(f"Renderização ao receber (total, uma vez): {add_ms:.1f} ms")
+    print(f"chatBuild antigo por pedido:  {legacy_ms:>9.2f} ms")
+    print(f"chatBuild com linhas renderizadas por pedido: {cached_ms:>6.2f} ms")
+
+if __name__ == "__main__":
+    bench_chat_build()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark da memória do histórico de chat por mensagem
+Compara o layout antigo (objeto discord.Message inteiro por mensagem e dois
+textos acumulados com o mesmo conteúdo) com os registros compactos do Chat
+"""
+
+import sys
+import os
+import gc
+import asyncio
+import datetime
+import tracemalloc
+from types import SimpleNamespace
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import discord
+from discord.http import HTTPClient
+from discord.state import ConnectionState
+
+from discord_tools.chat import Chat, ChatMessage
+
+def discord_messages(count: int, members: int = 50):
+    """Mensagens reais do discord.py, criadas a partir de payloads como os do gateway"""
+    loop = asyncio.new_event_loop()
+    state = ConnectionState(dispatch=lambda *args: None, handlers={}, hooks={},
+                            http=HTTPClient(loop), intents=discord.Intents.default())
+    channel = SimpleNamespace(id=1, guild=None)
+    start = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+    messages = []
+    for i in range(count):
+        author, target = 1000 + i % members, 1000 + (i * 7) % members
+        messages.append(discord.Message(state=state, channel=channel, data={
+            "id": str(10**17 + i), "channel_id": "1", "type": 0,
+            "content": f"<@{target}> eu ataco o goblin com minha espada e rolo iniciativa, {i}",
+            "author": {"id": str(author), "username": f"jogador{author}", "discriminator": "0",
+                       "avatar": None, "global_name": f"Jogador{author}"},
+            "member": {"roles": [], "joined_at": start.isoformat(), "deaf": False, "mute": False},
+            "mentions": [{"id": str(target), "username": f"jogador{target}", "discriminator": "0", "avatar": None}],
+            "timestamp": (start + datetime.timedelta(seconds=i)).isoformat(), "edited_timestamp": None,
+            "tts": False, "mention_everyone": False, "mention_roles": [], "attachments": [],
+            "embeds": [], "pinned": False,
+        }))
+    return messages
+
+def rendered_text(message) -> str:
+    # Texto já convertido, como parse_message devolveria
+    return message.content.replace(f"<@{message.mentions[0].id}>", f"@Jogador{message.mentions[0].id}")
+
+class LegacyChatMessage:
+    """ChatMessage antigo: guardava o objeto do Discord junto com a linha renderizada"""
+
+    def __init__(self, msg, time, username, text):
+        self.discord_message = msg
+        self.time = time
+        self.username = username
+        self.rendered = f"$ Mensagem de {username} às {time}: " + text + "\n$$$"
+
+def measure(build) -> int:
+    gc.collect()
+    tracemalloc.start()
+    kept = build()
+    gc.collect()
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return used
+
+def bench_chat_memory(count: int = 5_000):
+    def legacy():
+        messages, history_text, chat_text = [], "", ""
+        for message in discord_messages(count):
+            username = message.author.display_name
+            text = rendered_text(message)
+            record = LegacyChatMessage(message, message.created_at, username, text)
+            messages.append(record)
+            history_text += ("\n" if history_text else "") + record.rendered
+            chat_text += f"$ Mensagem de {username} às {message.created_at}: " + text + "\n\n\n"
+        return messages, history_text, chat_text
+
+    def compact():
+        chat = Chat(max_messages=count)
+        for message in discord_messages(count):
+            chat.append(ChatMessage(message, message.created_at, message.author.display_name, rendered_text(message)))
+        # Os objetos do Discord não ficam referenciados pelo histórico
+        return chat
+
+    before = measure(legacy) / count
+    after = measure(compact) / count
+    chat = compact()
+    print(f"🧪 Histórico com {count} mensagens")
+    print(f"Layout antigo:      {before:>7.0f} bytes por mensagem")
+    print(f"Registros compactos: {after:>6.0f} bytes por mensagem ({before / after:.1f}x menos)")
+    print(f"Estimativa do Chat:  {chat.memory_size() / count:>6.0f} bytes por mensagem")
+
+if __name__ == "__main__":
+    bench_chat_memory()
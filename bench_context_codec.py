@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark do codec de sessões RPG
+Compara o JSON original do pydantic com as variantes do codec compacto:
+tempo de codificação/decodificação, bytes por sessão e, se houver Redis,
+a memória ocupada por sessão (MEMORY USAGE)
+"""
+
+import sys
+import os
+import json
+import time
+from datetime import datetime
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from rpg_tools.context_manager import ContextManager, RpgContext
+from rpg_tools import context_codec
+from rpg_tools.context_codec import ContextCodec
+from bench_context_merge import extracted_batch
+
+def build_context(messages: int) -> RpgContext:
+    """Monta uma sessão realista com eventos e história do mundo"""
+    manager = object.__new__(ContextManager)
+    context = RpgContext(session_id="bench", channel_id="bench", channel_name="bench")
+    for i in range(messages):
+        manager._merge_extracted_info(context, extracted_batch(i, cast_size=50), f"Jogador{i % 4}")
+    context.world_history = "Há muito tempo, nas montanhas de ferro, os anões ergueram reinos. " * 80
+    return context
+
+def legacy_encode(context: RpgContext):
+    return context.model_dump_json()
+
+def legacy_decode(data) -> RpgContext:
+    # Caminho original do get_session
+    context_dict = json.loads(data)
+    for field in ['created_at', 'last_updated']:
+        if field in context_dict and context_dict[field]:
+            context_dict[field] = datetime.fromisoformat(context_dict[field])
+    return RpgContext(**context_dict)
+
+def timed(func, arg, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func(arg)
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+def redis_memory_usage(blob):
+    """Memória ocupada pela chave no Redis, ou None se não houver servidor"""
+    try:
+        import redis
+        client = redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379"))
+        client.set("rpg:bench:codec", blob)
+        usage = client.memory_usage("rpg:bench:codec")
+        client.delete("rpg:bench:codec")
+        return usage
+    except Exception:
+        return None
+
+def bench_codec(messages: int = 300, repeat: int = 20):
+    context = build_context(messages)
+    variants = [("pydantic JSON (original)", legacy_encode, legacy_decode)]
+
+    serializers = [("json", context_codec.SERIALIZER_JSON)]
+    if context_codec.ORJSON_AVAILABLE:
+        serializers.append(("orjson", context_codec.SERIALIZER_ORJSON))
+    if context_codec.MSGPACK_AVAILABLE:
+        serializers.append(("msgpack", context_codec.SERIALIZER_MSGPACK))
+    compressions = ["none", "zlib"] + (["zstd"] if context_codec.ZSTD_AVAILABLE else [])
+
+    for ser_name, serializer in serializers:
+        for compression in compressions:
+            codec = ContextCodec(RpgContext, serializer=serializer, compression=compression)
+            variants.append((f"{ser_name} + {compression}", codec.encode, codec.decode))
+
+    print(f"🧪 Sessão com {len(context.key_events)} eventos e {len(context.world_history)} caracteres de história")
+    print(f"{'variante':<26} {'encode ms':>10} {'decode ms':>10} {'bytes':>10} {'redis bytes':>12}")
+    for name, encode, decode in variants:
+        encode_ms, blob = timed(encode, context, repeat)
+        decode_ms, decoded = timed(decode, blob, repeat)
+        assert decoded.created_at == context.created_at
+        assert len(decoded.key_events) == len(context.key_events)
+        usage = redis_memory_usage(blob)
+        size = len(blob.encode() if isinstance(blob, str) else blob)
+        print(f"{name:<26} {encode_ms:>10.2f} {decode_ms:>10.2f} {size:>10} {usage if usage is not None else '-':>12}")
+
+    # Sessões já salvas no formato original continuam legíveis
+    migrated = ContextCodec(RpgContext).decode(legacy_encode(context))
+    assert migrated.session_id == context.session_id
+    print("✅ Sessões no formato original são migradas na leitura")
+
+if __name__ == "__main__":
+    bench_codec()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark da mesclagem de informações extraídas no contexto RPG
+Mede o custo por mensagem conforme a sessão acumula milhares de eventos
+"""
+
+import sys
+import os
+import time
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from rpg_tools.context_manager import ContextManager, RpgContext
+from rpg_tools.event_compaction import EventRetentionPolicy, compact_events, enforce_payload_cap
+
+def extracted_batch(i: int, cast_size: int = None) -> dict:
+    """Simula a saída do analisador para a i-ésima mensagem"""
+    c = i % cast_size if cast_size else i
+    return {
+        "world_info": {"name": "Terra dos Anões", "type": "medieval", "description": None},
+        "characters": [
+            {"name": f"Personagem {c}", "type": "npc" if c % 3 else "player", "description": None, "role": None},
+            # Nome repetido com outra grafia: deve ser deduplicado
+            {"name": f"PERSONAGEM {c // 2}", "type": "npc", "description": None, "role": None},
+        ],
+        "locations": [
+            {"name": f"Cidade {i}", "description": None, "is_current": i % 10 == 0},
+            {"name": f"cidade {i // 2}", "description": None, "is_current": False},
+        ],
+        "quests": [
+            {"name": f"Missão {i}", "description": None, "status": "active"},
+            {"name": f"Missao {i // 2}", "description": None, "status": "active"},
+        ],
+        "events": [
+            {"description": f"Evento número {i}", "importance": "high" if i % 5 == 0 else "medium"},
+        ],
+        "session_changes": {"state_change": None, "difficulty_change": None},
+    }
+
+def bench_merge(total_messages: int = 5000, checkpoint: int = 1000):
+    # A mesclagem não usa Redis nem o analisador, então evitamos o __init__
+    manager = object.__new__(ContextManager)
+    context = RpgContext(session_id="bench", channel_id="bench", channel_name="bench")
+    batches = [extracted_batch(i) for i in range(total_messages)]
+
+    print(f"🧪 Mesclando {total_messages} mensagens extraídas")
+    print(f"{'mensagens':>10} {'eventos':>10} {'µs/mensagem':>12}")
+    start_total = time.perf_counter()
+    start = start_total
+    for i, batch in enumerate(batches, 1):
+        manager._merge_extracted_info(context, batch, "bench")
+        if i % checkpoint == 0:
+            elapsed = time.perf_counter() - start
+            print(f"{i:>10} {len(context.key_events):>10} {elapsed / checkpoint * 1e6:>12.1f}")
+            start = time.perf_counter()
+    total = time.perf_counter() - start_total
+
+    print(f"Total: {total * 1000:.1f} ms")
+    print(f"Personagens: {len(context.player_characters) + len(context.npcs)}, eventos: {len(context.key_events)}")
+
+    # Recarregar a sessão deve reconstruir os mesmos índices
+    start = time.perf_counter()
+    reloaded = RpgContext.model_validate_json(context.model_dump_json())
+    print(f"Recarga com reconstrução de índices: {(time.perf_counter() - start) * 1000:.1f} ms")
+    assert reloaded.has_character("personagem 0") and reloaded.has_location("CIDADE 1")
+
+def bench_compaction(total_messages: int = 5000, checkpoint: int = 1000):
+    """Com compactação, o log de eventos fica estável e o tamanho salvo nunca passa do limite (elenco de 50 personagens)"""
+    manager = object.__new__(ContextManager)
+    policy = EventRetentionPolicy()
+    context = RpgContext(session_id="bench", channel_id="bench", channel_name="bench")
+
+    print(f"\n🗜️ Mesclando {total_messages} mensagens com compactação")
+    print(f"{'mensagens':>10} {'eventos':>10} {'resumos':>10} {'bytes':>10}")
+    for i in range(1, total_messages + 1):
+        manager._merge_extracted_info(context, extracted_batch(i, cast_size=50), "bench")
+        if policy.needs_compaction(context):
+            compact_events(context, policy)
+        enforce_payload_cap(context, policy, lambda c: len(c.model_dump_json().encode()))
+        if i % checkpoint == 0:
+            size = len(context.model_dump_json().encode())
+            print(f"{i:>10} {len(context.key_events):>10} {len(context.event_summaries):>10} {size:>10}")
+            assert size <= policy.max_payload_bytes
+
+if __name__ == "__main__":
+    bench_merge()
+    bench_compaction()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Benchmark do tempo de importação dos módulos do agente
+Cada importação roda em um processo novo, sem credenciais no ambiente
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+MODULES = ["rpg_tools.context_manager", "rpg_tools.reasoner"]
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+cm = sys.modules["rpg_tools.context_manager"]
+print(elapsed * 1000, "google.generativeai" in sys.modules, cm._context_manager is not None)
+"""
+
+def measure(module: str, runs: int):
+    env = {k: v for k, v in os.environ.items() if k not in ("GOOGLE_API_KEY", "GEMINI_API_KEY", "REDIS_URL")}
+    times = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-W", "ignore", "-c", PROBE.format(module=module)],
+                                cwd=ROOT, env=env, capture_output=True, text=True)
+        if result.returncode != 0:
+            return None, result.stderr.strip().splitlines()[-1]
+        elapsed, genai_loaded, manager_created = result.stdout.strip().splitlines()[-1].split()
+        times.append(float(elapsed))
+    return statistics.median(times), f"gemini importado: {genai_loaded}, gerenciador criado: {manager_created}"
+
+def bench_import_time(runs: int = 5):
+    print(f"🧪 Tempo de importação (mediana de {runs} processos, sem GOOGLE_API_KEY)")
+    for module in MODULES:
+        median, detail = measure(module, runs)
+        if median is None:
+            print(f"❌ {module}: {detail}")
+        else:
+            print(f"{module:<28} {median:>8.1f} ms   {detail}")
+
+if __name__ == "__main__":
+    bench_import_time()
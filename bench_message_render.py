@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark da conversão da marcação do Discord (parse_message)
+Compara o passe antigo (split/findall com `<.+>` e re.match por trecho)
+com o re.sub único de padrão pré-compilado
+"""
+
+import sys
+import os
+import re
+import time
+from types import SimpleNamespace
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from discord_tools.conversion import parse_message
+from discord_tools.user_id import GlobalUserId, GlobalRoleId
+
+class FakeEntity:
+    """Usuário ou cargo falso; precisa ser hashable porque os mapas globais de IDs usam o objeto como chave"""
+
+    def __init__(self, id: int, **attrs):
+        self.id = id
+        self.__dict__.update(attrs)
+
+def legacy_parse_message(message):
+    """Conversão antiga, com os mapas já preenchidos"""
+    def convert_mention(mention):
+        if not re.match("<@[0-9]+>$", mention):
+            return mention
+        return f"@{GlobalUserId.GetUser(int(mention[2:-1])).display_name}"
+
+    def convert_role_mention(mention):
+        if not re.match("<@&[0-9]+>$", mention):
+            return mention
+        return f"@role_{GlobalRoleId.GetRole(int(mention[3:-1])).name}"
+
+    content = message.content
+    if content is None or content == "":
+        return ""
+    mention_flag = content[0] == '<'
+    other_texts = iter(re.split(r"<.+>", content))
+    metadata = map(convert_role_mention, map(convert_mention, re.findall(r"<.+>", content)))
+    final_text = ""
+    while True:
+        first, second = (metadata, other_texts) if mention_flag else (other_texts, metadata)
+        next1 = next(first, None)
+        if next1:
+            final_text += next1
+        next2 = next(second, None)
+        if next2:
+            final_text += next2
+        if next1 is None and next2 is None:
+            break
+    return final_text
+
+def fake_messages(count: int):
+    users = [FakeEntity(1000 + i, display_name=f"Jogador{i}") for i in range(50)]
+    roles = [FakeEntity(9000 + i, name=f"cargo{i}") for i in range(5)]
+    for user in users:
+        GlobalUserId.AddUserId(user, user.id)
+    for role in roles:
+        GlobalRoleId.AddRoleId(role, role.id)
+    guild = SimpleNamespace(get_member=lambda id: None, get_role=lambda id: None, get_channel=lambda id: None)
+    # Mensagens com uma só menção (o padrão antigo erra com duas) e sem marcação
+    templates = [
+        "eu ataco o goblin com minha espada e rolo iniciativa, {i}",
+        "<@{user}> segura a porta enquanto eu procuro armadilhas, {i}",
+        "alguém da <@&{role}> pode curar o guerreiro? {i}",
+    ]
+    messages = []
+    for i in range(count):
+        content = templates[i % len(templates)].format(i=i, user=users[i % 50].id, role=roles[i % 5].id)
+        messages.append(SimpleNamespace(content=content, guild=guild, mentions=[], role_mentions=[],
+                                        channel_mentions=[]))
+    return messages
+
+def bench(function, messages, rounds: int):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for message in messages:
+            function(message)
+    return (time.perf_counter() - start) / (rounds * len(messages)) * 1e6
+
+def bench_message_render(count: int = 3_000, rounds: int = 10):
+    sys.stdout = open(os.devnull, "w")
+    try:
+        messages = fake_messages(count)
+    finally:
+        sys.stdout = sys.__stdout__
+    assert [legacy_parse_message(m) for m in messages] == [parse_message(m) for m in messages]
+
+    legacy_us = bench(legacy_parse_message, messages, rounds)
+    single_us = bench(parse_message, messages, rounds)
+    print(f"🧪 {count} mensagens, {rounds} rodadas")
+    print(f"Conversão antiga:       {legacy_us:>6.2f} µs por mensagem")
+    print(f"re.sub pré-compilado:   {single_us:>6.2f} µs por mensagem ({legacy_us / single_us:.1f}x)")
+
+if __name__ == "__main__":
+    bench_message_render()
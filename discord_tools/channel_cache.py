@@ -0,0 +1,127 @@
+import asyncio
+import os
+import json
+import zlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+class ChannelCache:
+    """
+    Estado por canal, indexado pelo ID, com despejo LRU
+
+    Canais inativos há mais de `idle_ttl` segundos saem primeiro; acima de
+    `max_channels` ou de `max_bytes` (estimados por `size_of`) saem os menos
+    usados. Canais usados nos últimos `min_idle` segundos nunca são despejados,
+    para não perder estado de uma resposta em andamento. Cada canal despejado
+    é entregue a `on_evict`, que o grava no armazenamento.
+    """
+
+    def __init__(self, on_evict: Callable[[Hashable, Any], None], size_of: Callable[[Any], int] = None,
+                 max_channels: int = None, idle_ttl: float = None, max_bytes: int = None,
+                 min_idle: float = 60.0):
+        self.on_evict = on_evict
+        self.size_of = size_of or (lambda value: 0)
+        self.max_channels = max_channels or int(os.getenv("CHANNEL_CACHE_MAX", "200"))
+        self.idle_ttl = idle_ttl if idle_ttl is not None else float(os.getenv("CHANNEL_IDLE_HOURS", "6")) * 3600
+        self.max_bytes = max_bytes or int(float(os.getenv("CHANNEL_CACHE_MAX_MB", "256")) * 1024 * 1024)
+        self.min_idle = min_idle
+        # ID do canal -> [estado, último acesso]
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.RLock()
+        self.evictions = 0
+
+    def __contains__(self, channel_id: Hashable) -> bool:
+        return channel_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, channel_id: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(channel_id)
+            if entry is None:
+                return None
+            entry[1] = time.monotonic()
+            self._entries.move_to_end(channel_id)
+            return entry[0]
+
+    def put(self, channel_id: Hashable, value: Any):
+        with self._lock:
+            self._entries[channel_id] = [value, time.monotonic()]
+            self._entries.move_to_end(channel_id)
+        self.evict()
+
+    def memory_usage(self) -> int:
+        with self._lock:
+            return sum(self.size_of(value) for value, _ in self._entries.values())
+
+    def evict(self) -> int:
+        """Despeja canais inativos e, se preciso, os menos usados até caber nos limites"""
+        now = time.monotonic()
+        evicted = []
+        with self._lock:
+            for channel_id, (value, last_used) in list(self._entries.items()):
+                if now - last_used > self.idle_ttl:
+                    evicted.append((channel_id, value))
+                    del self._entries[channel_id]
+
+            total = sum(self.size_of(value) for value, _ in self._entries.values())
+            for channel_id, (value, last_used) in list(self._entries.items()):
+                if len(self._entries) <= self.max_channels and total <= self.max_bytes:
+                    break
+                if now - last_used < self.min_idle:
+                    # Daqui em diante todos foram usados há pouco (ordem LRU)
+                    break
+                evicted.append((channel_id, value))
+                total -= self.size_of(value)
+                del self._entries[channel_id]
+            self.evictions += len(evicted)
+
+        for channel_id, value in evicted:
+            try:
+                self.on_evict(channel_id, value)
+            except Exception as e:
+                print(f"Erro ao despejar estado do canal {channel_id}: {e}")
+        if evicted:
+            print(f"♻️ {len(evicted)} canal(is) despejado(s) da memória; {len(self._entries)} em uso")
+        return len(evicted)
+
+class SingleFlight:
+    """
+    No máximo uma inicialização em andamento por chave
+
+    Chamadas concorrentes para a mesma chave esperam a tarefa já em andamento
+    em vez de repetir o trabalho; cancelar uma delas não cancela a tarefa.
+    """
+
+    def __init__(self):
+        self._tasks: dict[Hashable, asyncio.Future] = {}
+        self.joined = 0  # Chamadas que reaproveitaram uma tarefa em andamento
+
+    async def run(self, key: Hashable, factory: Callable[[], Any]):
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._tasks.pop(key) if self._tasks.get(key) is done else None)
+        else:
+            self.joined += 1
+        return await asyncio.shield(task)
+
+def default_storage():
+    """Armazenamento do contexto das sessões, usado também para o estado despejado; None se indisponível"""
+    try:
+        from rpg_tools.context_manager import get_context_manager
+        manager = get_context_manager()
+        return manager.storage, manager.session_ttl
+    except Exception as e:
+        print(f"⚠️ Armazenamento indisponível para estado de canais: {e}")
+        return None, None
+
+def dump_state(state: dict) -> bytes:
+    return zlib.compress(json.dumps(state, ensure_ascii=False).encode("utf-8"))
+
+def load_state(blob: bytes) -> dict:
+    return json.loads(zlib.decompress(blob))
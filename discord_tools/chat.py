@@ -1,18 +1,65 @@
-from discord import TextChannel, Message
+from discord import TextChannel, Message, Object
+import asyncio
 import datetime
+import os
+import sys
+from collections import deque
+from discord_tools.channel_cache import ChannelCache, SingleFlight, default_storage, dump_state, load_state
 from discord_tools.conversion import parse_message
 from discord_tools.commands import COMMAND_CHARS
+from discord_tools.transcript_store import TranscriptStore
   
     
 class ChatMessage:
-    discord_message: Message
-    time: datetime.datetime
-    username: str
-    
-    def __init__(self, msg: Message, time: datetime.datetime, username: str):
-        self.discord_message = msg
+    """
+    Registro compacto de uma mensagem do histórico
+
+    Guarda só os IDs, o nome exibido, o horário e a linha já formatada para os
+    prompts; o objeto do Discord (autor, servidor, canal, membro) não é mantido.
+    """
+    __slots__ = ("message_id", "author_id", "username", "time", "rendered")
+
+    HEADER = "$ Mensagem de {username} às {time}: "
+    FOOTER = "\n$$$"
+
+    def __init__(self, msg: Message, time: datetime.datetime, username: str, text: str = None):
+        self.message_id = getattr(msg, "id", None)
+        author = getattr(msg, "author", None)
+        self.author_id = getattr(author, "id", None)
+        # O mesmo nome se repete em milhares de mensagens; uma só cópia dele
+        self.username = sys.intern(username)
         self.time = time
-        self.username = username
+        if text is None:
+            text = parse_message(msg)
+        self.render(text)
+
+    def render(self, text: str):
+        """Monta a linha dos prompts a partir do texto da mensagem"""
+        self.rendered = self.HEADER.format(username=self.username, time=self.time) + text + self.FOOTER
+
+    @classmethod
+    def from_rendered(cls, time: datetime.datetime, username: str, rendered: str,
+                      message_id: int = None, author_id: int = None) -> "ChatMessage":
+        """Recria uma mensagem restaurada do armazenamento"""
+        chat_message = cls.__new__(cls)
+        chat_message.message_id = message_id
+        chat_message.author_id = author_id
+        chat_message.username = sys.intern(username)
+        chat_message.time = time
+        chat_message.rendered = rendered
+        return chat_message
+
+    @property
+    def text(self) -> str:
+        """Texto da mensagem, sem o cabeçalho e o terminador da linha renderizada"""
+        header = self.HEADER.format(username=self.username, time=self.time)
+        text = self.rendered.removesuffix(self.FOOTER)
+        return text[len(header):] if text.startswith(header) else text
+
+    def size(self) -> int:
+        """Bytes ocupados pelo registro e pela linha renderizada"""
+        return (sys.getsizeof(self) + sys.getsizeof(self.rendered) + sys.getsizeof(self.time)
+                + sys.getsizeof(self.message_id) + sys.getsizeof(self.author_id))
 
 class Chat:
     preinitialization = """
@@ -23,14 +70,19 @@ class Chat:
     Responda continuando a conversa de forma natural, continuando e contribuindo para o tópico em questão\n
     Agora iniciam as mensagens:\n
     """
-    chat_text = ""
-    messages: list[ChatMessage] = []
+    messages: deque  # Buffer circular com as últimas `max_messages` mensagens
 
     postinitialization = ""
-    def __init__(self, nome = None):
+    def __init__(self, nome = None, max_messages: int = None):
         self.SetName(nome)
-        self.messages = []
-        self.chat_text = ""
+        if max_messages is None:
+            max_messages = int(os.getenv("CHAT_MAX_MESSAGES", "2000"))
+        self.messages = deque(maxlen=max_messages)
+        # Índice absoluto de messages[0]: quantas mensagens já saíram do buffer
+        self.first_index = 0
+        self._bytes = 0
+        # Recebe cada mensagem que entra no histórico (a transcrição local do canal)
+        self.sink = None
     
     def SetName(self, nome = None, timestamp = True):
         if nome is not None:
@@ -40,40 +92,303 @@ class Chat:
         else:
             self.postinitialization = lambda: "\n\n$ Mensagem do modelo: "
             
-    def add_message(self, message: Message, username: str):
+    def _record(self, message: Message, username: str) -> ChatMessage | None:
+        """Registro de uma mensagem do Discord, ou None para mensagens de comandos"""
         message_content = message.content
         # Não acrescentar mensagens de comandos
-        if message_content[0] in  ['!', '\\']:
+        if message_content and message_content[0] in  ['!', '\\']:
+            return None
+        chat_message = None
+        # Menção a alguém ainda desconhecido: a linha é refeita quando a busca na API o encontrar
+        text = parse_message(message, lambda: self._rerender(chat_message, message))
+        chat_message = ChatMessage(message, message.created_at, username, text)
+        return chat_message
+
+    def _rerender(self, chat_message: ChatMessage, message: Message):
+        """Renderiza de novo uma mensagem cujas menções foram resolvidas depois de entrar no histórico"""
+        before = chat_message.size()
+        chat_message.render(parse_message(message))
+        # A mensagem pode já ter saído do buffer; só as que estão nele contam no tamanho
+        if any(m is chat_message for m in reversed(self.messages)):
+            self._bytes += chat_message.size() - before
+
+    def add_message(self, message: Message, username: str):
+        # A mensagem pode já ter vindo na recuperação do histórico disparada por ela mesma
+        if self.has_message(getattr(message, "id", None)):
             return
-        elif message_content[0] in ['&']:
-            message_content = message_content[1:]
-        self.messages.append(ChatMessage(message, message.created_at, username))
-        new_message = f"$ Mensagem de {username} às {message.created_at}: " + parse_message(message) + "\n\n\n"
-        # print(f"{message.channel}|{username}|{message.author.id}:\n", new_message)
-        self.chat_text += new_message
+        chat_message = self._record(message, username)
+        if chat_message is not None:
+            self.append(chat_message)
+
+    def has_message(self, message_id: int | None) -> bool:
+        """Se a mensagem de ID `message_id` já está no fim do histórico"""
+        if message_id is None:
+            return False
+        # Os IDs do Discord crescem com o tempo: só as mais novas que ela precisam ser olhadas
+        for chat_message in reversed(self.messages):
+            if chat_message.message_id is None:
+                continue
+            if chat_message.message_id == message_id:
+                return True
+            if chat_message.message_id < message_id:
+                return False
+        return False
     
-    async def RecoverHistory(self, channel: TextChannel):
+    def append(self, chat_message: ChatMessage):
+        """Acrescenta uma mensagem já renderizada ao histórico"""
+        if len(self.messages) == self.messages.maxlen:
+            self._bytes -= self.messages[0].size()
+            self.first_index += 1
+        self.messages.append(chat_message)
+        self._bytes += chat_message.size()
+        if self.sink is not None:
+            self.sink(chat_message)
+
+    def prepend(self, chat_message: ChatMessage) -> bool:
+        """Acrescenta uma mensagem mais antiga no início; False se o buffer já está cheio"""
+        if len(self.messages) == self.messages.maxlen:
+            return False
+        self.messages.appendleft(chat_message)
+        self.first_index -= 1
+        self._bytes += chat_message.size()
+        if self.sink is not None:
+            self.sink(chat_message)
+        return True
+
+    @property
+    def history_text(self) -> str:
+        """Linhas renderizadas das mensagens, unidas, para os prompts"""
+        return "\n".join(m.rendered for m in self.messages)
+
+    @property
+    def chat_text(self) -> str:
+        """Histórico no formato antigo, com as mensagens separadas por linhas em branco"""
+        return "".join(m.rendered.removesuffix(ChatMessage.FOOTER) + "\n\n\n" for m in self.messages)
+
+    async def RecoverHistory(self, channel: TextChannel, after: datetime.datetime | Object = None, limit: int = None):
+        """
+        Busca as `limit` mensagens mais recentes do canal (depois de `after`, se dado)
+        Retorna quantas vieram da API e o ID da mais antiga, para continuar a busca
+        """
         print(f"Recovering history from channel {channel.name}")
-        hist = channel.history(oldest_first=True)
+        hist = channel.history(limit=limit, after=after, oldest_first=False)
         hist = [mes async for mes in hist]
-        for message in hist[:-1]:
+        hist.reverse()
+        # Inclui a mensagem que disparou a recuperação, se houver: o on_message não a repete
+        for message in hist:
             self.add_message(message, str(message.author.display_name))
+        return len(hist), (hist[0].id if hist else None)
+
+    async def BackfillHistory(self, channel: TextChannel, before: int, limit: int):
+        """
+        Busca até `limit` mensagens anteriores à de ID `before` e as põe no início do histórico
+        Retorna quantas vieram da API, o ID da mais antiga e se o buffer ainda tem espaço
+        """
+        hist = channel.history(limit=limit, before=Object(id=before), oldest_first=False)
+        count, oldest = 0, None
+        async for message in hist:
+            count, oldest = count + 1, message.id
+            chat_message = self._record(message, str(message.author.display_name))
+            if chat_message is not None and not self.prepend(chat_message):
+                return count, oldest, False
+        return count, oldest, len(self.messages) < self.messages.maxlen
+
+    def to_state(self) -> dict:
+        """Estado serializável do chat, para despejo no armazenamento"""
+        return {
+            "first_index": self.first_index,
+            "messages": [[m.username, m.time.isoformat(), m.rendered, m.message_id, m.author_id]
+                         for m in self.messages],
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> "Chat":
+        chat = cls()
+        for username, time, rendered, *ids in state["messages"]:
+            chat.append(ChatMessage.from_rendered(datetime.datetime.fromisoformat(time), username, rendered, *ids))
+        chat.first_index = state.get("first_index", 0) + chat.first_index
+        return chat
+
+    @classmethod
+    def from_transcript(cls, rows: list[tuple]) -> "Chat":
+        """Chat com as mensagens lidas da transcrição local: (ID, ID do autor, nome, horário, linha)"""
+        chat = cls()
+        for message_id, author_id, username, time, rendered in rows:
+            chat.append(ChatMessage.from_rendered(time, username, rendered, message_id, author_id))
+        return chat
+
+    def memory_size(self) -> int:
+        """Bytes ocupados pelos registros do histórico"""
+        return self._bytes + sys.getsizeof(self.messages)
 
 
 class ChatManager:
-    channel_chat: dict
+    channel_chat: ChannelCache  # ID do canal -> Chat, com despejo LRU para o armazenamento
     
-    def __init__(self):
-        self.channel_chat = dict()
+    def __init__(self, storage=None, spill_ttl=None, recover_limit: int = None,
+                 backfill_page: int = None, backfill_delay: float = None,
+                 transcripts: TranscriptStore = None, **cache_options):
+        # Sem armazenamento explícito, usa o do contexto das sessões na primeira necessidade
+        self.storage = storage
+        # Com a transcrição local, as mensagens já estão gravadas e os chats voltam dela
+        self.transcripts = transcripts
+        self.spill_ttl = spill_ttl
+        self.spill_prefix = "rpg:chat:"
+        self.backfill_prefix = "rpg:backfill:"
+        self.channel_chat = ChannelCache(self._evict, size_of=Chat.memory_size, **cache_options)
+        # A primeira resposta num canal espera só as mensagens recentes; o resto vem em segundo plano
+        self.recover_limit = recover_limit or int(os.getenv("HISTORY_RECOVER_LIMIT", "100"))
+        self.backfill_page = backfill_page or int(os.getenv("HISTORY_BACKFILL_PAGE", "100"))
+        if backfill_delay is None:
+            backfill_delay = float(os.getenv("HISTORY_BACKFILL_DELAY", "1.0"))
+        self.backfill_delay = backfill_delay
+        self._backfills: dict[int, asyncio.Task] = {}
+        self._loading = SingleFlight()
+
+    def _storage(self):
+        if self.storage is None:
+            self.storage, self.spill_ttl = default_storage()
+        return self.storage
+
+    def _spill(self, channel_id, chat: Chat):
+        storage = self._storage()
+        if storage is not None:
+            storage.set(f"{self.spill_prefix}{channel_id}", dump_state(chat.to_state()), self.spill_ttl)
+
+    def _evict(self, channel_id, chat: Chat):
+        if self.transcripts is not None:
+            # Cada mensagem já foi para a transcrição ao entrar no chat
+            return
+        # Gravar um chat grande é I/O bloqueante; no bot, vai para uma thread
+        try:
+            asyncio.get_running_loop().run_in_executor(None, self._spill, channel_id, chat)
+        except RuntimeError:
+            self._spill(channel_id, chat)
+
+    def _restore(self, channel_id):
+        if self.transcripts is not None:
+            rows = self.transcripts.load(channel_id, int(os.getenv("CHAT_MAX_MESSAGES", "2000")))
+            return Chat.from_transcript(rows) if rows else None
+        storage = self._storage()
+        blob = storage.get(f"{self.spill_prefix}{channel_id}") if storage is not None else None
+        return Chat.from_state(load_state(blob)) if blob else None
+
+    def _load_cursor(self, channel_id) -> dict | None:
+        storage = self._storage()
+        blob = storage.get(f"{self.backfill_prefix}{channel_id}") if storage is not None else None
+        return load_state(blob) if blob else None
+
+    def _save_cursor(self, channel_id, cursor: dict):
+        storage = self._storage()
+        if storage is not None:
+            storage.set(f"{self.backfill_prefix}{channel_id}", dump_state(cursor), self.spill_ttl)
+
+    def _checkpoint(self, channel_id, chat: Chat, cursor: dict):
+        """
+        Salva o cursor do histórico anterior junto com as mensagens que ele pressupõe
+
+        Sem a transcrição local, o chat é gravado também: um cursor sem as mensagens
+        já buscadas deixaria um buraco no histórico depois de um reinício.
+        """
+        if self.transcripts is None:
+            self._spill(channel_id, chat)
+        self._save_cursor(channel_id, cursor)
+
+    async def _backfill(self, channel, chat: Chat, cursor: dict):
+        """
+        Busca em segundo plano, por páginas, o histórico anterior ao que o chat já tem
+
+        O cursor ({"before": ID da mais antiga já buscada, "done": fim}) é salvo com o
+        chat a cada página, para um reinício continuar de onde parou.
+        """
+        pages = 0
+        try:
+            while not cursor["done"] and channel.id in self.channel_chat:
+                await asyncio.sleep(self.backfill_delay)
+                count, oldest, room = await chat.BackfillHistory(channel, cursor["before"], self.backfill_page)
+                pages += 1
+                if oldest is not None:
+                    cursor["before"] = oldest
+                # Fim do canal, ou o buffer do chat já está cheio
+                cursor["done"] = count < self.backfill_page or not room
+                await asyncio.to_thread(self._checkpoint, channel.id, chat, cursor)
+            if pages:
+                print(f"📚 Histórico anterior do canal {channel.name} recuperado em {pages} página(s): "
+                      f"{len(chat.messages)} mensagens")
+        except Exception as e:
+            print(f"Erro ao recuperar histórico anterior do canal {channel.id}: {e}")
+        finally:
+            self._backfills.pop(channel.id, None)
+
+    def _start_backfill(self, channel, chat: Chat, cursor: dict):
+        if cursor["done"] or cursor["before"] is None or channel.id in self._backfills:
+            return
+        self._backfills[channel.id] = asyncio.create_task(self._backfill(channel, chat, cursor))
     
     async def add_channel(self, channel):
-        if channel.name in self.channel_chat.keys():
-            return self.channel_chat[channel.name]
-        else:
-            self.channel_chat[channel.name] = Chat()
-            chat = self.channel_chat[channel.name]
-            await chat.RecoverHistory(channel)
-            print(f"Current chats: {self.channel_chat}")
+        chat = self.channel_chat.get(channel.id)
+        if chat is not None:
             return chat
+        # Mensagens simultâneas num canal novo esperam a mesma recuperação
+        return await self._loading.run(channel.id, lambda: self._load_channel(channel))
+
+    async def _load_channel(self, channel) -> Chat:
+        try:
+            chat, cursor = await asyncio.gather(asyncio.to_thread(self._restore, channel.id),
+                                                asyncio.to_thread(self._load_cursor, channel.id))
+        except Exception as e:
+            print(f"Erro ao restaurar chat do canal {channel.id}: {e}")
+            chat, cursor = None, None
+        if chat is not None:
+            print(f"♻️ Chat do canal {channel.name} restaurado com {len(chat.messages)} mensagens")
+            self._attach_sink(channel.id, chat)
+            # Só o que chegou depois da última mensagem guardada
+            last = chat.messages[-1] if chat.messages else None
+            after = None if last is None else Object(id=last.message_id) if last.message_id else last.time
+            count, oldest = await chat.RecoverHistory(channel, after=after, limit=self.recover_limit)
+            if count >= self.recover_limit:
+                # Chegou mais do que o limite desde o estado salvo: recomeça pelas recentes
+                print(f"⚠️ Estado salvo do canal {channel.name} muito antigo, recomeçando pelas mensagens recentes")
+                chat = None
+        if chat is None:
+            chat = Chat()
+            self._attach_sink(channel.id, chat)
+            count, oldest = await chat.RecoverHistory(channel, limit=self.recover_limit)
+            cursor = {"before": oldest, "done": count < self.recover_limit}
+            await asyncio.to_thread(self._checkpoint, channel.id, chat, cursor)
+        elif cursor is None:
+            # Estado salvo sem cursor: continua a partir da mais antiga que o chat tem
+            first = chat.messages[0].message_id if chat.messages else None
+            cursor = {"before": first, "done": first is None}
+        self.channel_chat.put(channel.id, chat)
+        self._start_backfill(channel, chat, cursor)
+        print(f"Current chats: {len(self.channel_chat)}")
+        return chat
+
+    def _attach_sink(self, channel_id, chat: Chat):
+        if self.transcripts is not None:
+            chat.sink = lambda chat_message: self.transcripts.append(channel_id, chat_message)
+
+    async def rehydrate(self, get_channel, limit: int = None):
+        """
+        Restaura da transcrição local os canais com atividade mais recente, antes
+        da primeira mensagem; `get_channel` resolve o ID do canal (ex.: client.get_channel)
+        """
+        if self.transcripts is None:
+            return 0
+        if limit is None:
+            limit = int(os.getenv("TRANSCRIPT_REHYDRATE_CHANNELS", "20"))
+        restored = 0
+        for channel_id in await asyncio.to_thread(self.transcripts.recent_channels, limit):
+            channel = get_channel(channel_id)
+            if channel is None:
+                continue
+            try:
+                await self.add_channel(channel)
+                restored += 1
+            except Exception as e:
+                print(f"Erro ao restaurar o canal {channel_id} da transcrição: {e}")
+        print(f"♻️ {restored} canal(is) restaurado(s) da transcrição local")
+        return restored
 
-GlobalManager = ChatManager()
\ No newline at end of file
+GlobalManager = ChatManager(transcripts=TranscriptStore.from_env())
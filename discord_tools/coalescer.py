@@ -0,0 +1,52 @@
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Hashable
+
+class ReplyCoalescer:
+    """
+    Agrega as menções de um canal enquanto uma geração está em andamento
+
+    Sem geração em andamento, a menção é respondida na hora. As que chegam
+    durante a geração entram na fila e, quando ela termina, esperam a janela de
+    debounce por outras e são respondidas juntas, num só pedido.
+    """
+
+    def __init__(self, debounce: float = None):
+        if debounce is None:
+            debounce = float(os.getenv("REPLY_DEBOUNCE_SECONDS", "1.5"))
+        self.debounce = debounce
+        self._pending: dict[Hashable, list] = {}
+        self._running: set = set()
+        self.requests = 0
+        self.coalesced = 0
+
+    async def submit(self, key: Hashable, item: Any, handler: Callable[[list], Awaitable[Any]]) -> bool:
+        """
+        Enfileira o item do canal `key`; retorna True se esta chamada executou o
+        handler e False se o item foi agregado a uma geração em andamento
+        """
+        # Tudo roda no loop do bot, então não há disputa entre verificar e marcar o canal
+        self._pending.setdefault(key, []).append(item)
+        if key in self._running:
+            return False
+
+        self._running.add(key)
+        try:
+            while True:
+                batch = self._pending.pop(key, [])
+                if not batch:
+                    break
+                self.requests += 1
+                if len(batch) > 1:
+                    self.coalesced += len(batch) - 1
+                    print(f"🧺 {len(batch)} menções respondidas numa única geração")
+                try:
+                    await handler(batch)
+                except Exception as e:
+                    print(f"Erro ao responder menções agregadas: {e}")
+                if key in self._pending and self.debounce > 0:
+                    # Menções acumuladas durante a geração: espera as que ainda estão chegando
+                    await asyncio.sleep(self.debounce)
+        finally:
+            self._running.discard(key)
+        return True
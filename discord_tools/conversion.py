@@ -1,73 +1,75 @@
 
+import datetime
 import re
 from discord import Message
 from discord_tools.user_id import GlobalUserId, GlobalRoleId
 
-def convert_mention(mention: str):
-    if not re.match("<@[0-9]+>$", mention):
-        return mention
-    id = int(mention[2:-1])
-    return f"@{GlobalUserId.GetUser(id).display_name}"
+# Toda a marcação do Discord num único padrão, compilado uma vez:
+# <@id> / <@!id>, <@&id>, <#id>, <:nome:id> / <a:nome:id> e <t:unix> / <t:unix:estilo>
+MARKUP = re.compile(
+    r"<(?:@!?(?P<user>\d+)|@&(?P<role>\d+)|#(?P<channel>\d+)"
+    r"|a?:(?P<emoji>\w+):\d+|t:(?P<time>-?\d+)(?::(?P<style>[tTdDfFR]))?)>"
+)
 
-def convert_role_mention(mention: str):
-    if not re.match("<@&[0-9]+>$", mention):
-        return mention
-    id = int(mention[3:-1])
-    return f"@role_{GlobalRoleId.GetRole(id).name}"
-    
+# Horários em UTC, como os das mensagens; o relativo (R) vira data e hora absolutas no prompt
+TIMESTAMP_FORMATS = {
+    "t": "%H:%M UTC",
+    "T": "%H:%M:%S UTC",
+    "d": "%d/%m/%Y",
+    "D": "%d/%m/%Y",
+    "f": "%d/%m/%Y %H:%M UTC",
+    "F": "%d/%m/%Y %H:%M UTC",
+    "R": "%d/%m/%Y %H:%M UTC",
+}
 
-def parse_message(message: Message):
+def convert_mention(id: int, message: Message = None, on_resolved=None):
+    user = GlobalUserId.Resolve(id, message)
+    if user is None and on_resolved is not None:
+        GlobalUserId.WhenResolved(id, on_resolved)
+    return f"@{user.display_name}" if user is not None else "@usuário_desconhecido"
+
+def convert_role_mention(id: int, message: Message = None):
+    role = GlobalRoleId.Resolve(id, message)
+    return f"@role_{role.name}" if role is not None else "@role_desconhecido"
+
+def convert_channel_mention(id: int, message: Message = None):
+    channel = None
+    if message is not None:
+        channel = next((mentioned for mentioned in getattr(message, "channel_mentions", ())
+                        if mentioned.id == id), None)
+        if channel is None and message.guild is not None:
+            channel = message.guild.get_channel(id)
+    return f"#{channel.name}" if channel is not None else "#canal_desconhecido"
+
+def convert_timestamp(unix: int, style: str = None):
+    try:
+        time = datetime.datetime.fromtimestamp(unix, tz=datetime.timezone.utc)
+    except (OverflowError, OSError, ValueError):
+        return None
+    return time.strftime(TIMESTAMP_FORMATS[style or "f"])
+
+def render_markup(match: re.Match, message: Message = None, on_resolved=None) -> str:
+    """Texto de um trecho de marcação encontrado por MARKUP"""
+    kind = match.lastgroup if match.lastgroup != "style" else "time"
+    if kind == "user":
+        return convert_mention(int(match["user"]), message, on_resolved)
+    if kind == "role":
+        return convert_role_mention(int(match["role"]), message)
+    if kind == "channel":
+        return convert_channel_mention(int(match["channel"]), message)
+    if kind == "emoji":
+        return f":{match['emoji']}:"
+    return convert_timestamp(int(match["time"]), match["style"]) or match.group(0)
+
+def parse_message(message: Message, on_resolved=None):
+    """
+    Texto da mensagem para os prompts, com a marcação do Discord convertida
+    on_resolved é chamado quando um usuário mencionado, ainda desconhecido, for encontrado na API
+    """
     content = message.content
     if content is None or content == "":
         return ""
-    mention_flag = content[0] == '<'
-    
-    # Add users and their ids to the mapping, if at least one is missing
-    guild = message.guild
-    guild_users = []
-    if guild:
-        guild_users = list(guild.members)
-    all_users = [message.author] + message.mentions + message.channel.members + guild_users
-    all_users_ids = map(lambda x: x.id, all_users)
-    if not GlobalUserId.IdsExist(all_users_ids):
-        for user in all_users:
-            GlobalUserId.AddUserId(user, user.id)
-    
-    all_roles_ids = map(lambda x: x.id, message.guild.roles)
-    if not GlobalRoleId.IdsExist(all_roles_ids):
-        for role in message.guild.roles:
-            GlobalRoleId.AddRoleId(role, role.id)
-    
-            
-    # Parse mentions: <@id> to @display_name
-    other_texts = iter(re.split(r"<.+>", content))
-    metadata = re.findall(r"<.+>", content)
-    metadata = map(convert_mention, metadata)
-    metadata = map(convert_role_mention, metadata)
-    
-    final_text: str = ""
-    if mention_flag:
-        # If the message starts with a mention
-        while True:
-            next1 = next(metadata, None)
-            if next1:
-                final_text += next1
-            next2 = next(other_texts, None)
-            if next2:
-                final_text += next2
-            if next1 is None and next2 is None:
-                break
-    else:
-        # If the message does not start with a mention
-        while True:
-            next1 = next(other_texts, None)
-            if next1:
-                final_text += next1
-            next2 = next(metadata, None)
-            if next2:
-                final_text += next2
-            if next1 is None and next2 is None:
-                break
-    
-    return final_text
-          
\ No newline at end of file
+    if "<" not in content:
+        return content
+    # Só os IDs mencionados são resolvidos; os mapas são mantidos pelos eventos do gateway
+    return MARKUP.sub(lambda match: render_markup(match, message, on_resolved), content)
@@ -0,0 +1,70 @@
+import os
+import time
+
+class StreamingReply:
+    """
+    Resposta do bot publicada aos poucos, conforme o modelo gera o texto
+
+    O primeiro trecho é enviado assim que chega; depois a mensagem é editada
+    no máximo uma vez a cada `min_interval` segundos, para respeitar os limites
+    de edição do Discord. Texto acima de `limit` caracteres continua em novas
+    mensagens.
+    """
+
+    def __init__(self, channel, min_interval: float = None, limit: int = 1900):
+        self.channel = channel
+        if min_interval is None:
+            min_interval = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+        self.min_interval = min_interval
+        self.limit = limit
+        self.text = ""
+        self.messages = []  # Mensagens do Discord já publicadas
+        self._published = []  # Conteúdo atual de cada mensagem publicada
+        self._last_flush = 0.0
+        self.started_at = time.perf_counter()
+        self.first_message_ms = None
+        self.edits = 0
+        self.finished = False
+
+    def _pages(self, text: str) -> list[str]:
+        """Divide o texto em páginas de até `limit` caracteres, quebrando de preferência em linhas"""
+        pages = []
+        while len(text) > self.limit:
+            cut = text.rfind("\n", 0, self.limit)
+            if cut <= 0:
+                cut = self.limit
+            pages.append(text[:cut])
+            text = text[cut:].lstrip("\n")
+        pages.append(text)
+        return pages
+
+    async def update(self, text: str):
+        """Recebe o texto acumulado até agora; publica se o intervalo mínimo já passou"""
+        self.text = text
+        if not self.messages or time.perf_counter() - self._last_flush >= self.min_interval:
+            await self.flush()
+
+    async def flush(self):
+        pages = [page for page in self._pages(self.text) if page.strip()]
+        for i, page in enumerate(pages):
+            if i < len(self.messages):
+                if self._published[i] != page:
+                    await self.messages[i].edit(content=page)
+                    self._published[i] = page
+                    self.edits += 1
+            else:
+                self.messages.append(await self.channel.send(page))
+                self._published.append(page)
+                if self.first_message_ms is None:
+                    self.first_message_ms = (time.perf_counter() - self.started_at) * 1000
+        self._last_flush = time.perf_counter()
+
+    async def finish(self):
+        """Publica o texto final completo; chamadas repetidas não fazem nada"""
+        if self.finished:
+            return
+        self.finished = True
+        await self.flush()
+        if self.first_message_ms is not None:
+            print(f"📡 Resposta em streaming: primeira mensagem em {self.first_message_ms:.0f} ms, "
+                  f"{self.edits} edições, {len(self.messages)} mensagem(ns)")
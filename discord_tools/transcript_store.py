@@ -0,0 +1,129 @@
+import atexit
+import datetime
+import os
+import queue
+import sqlite3
+import threading
+from typing import List, Optional
+
+class TranscriptStore:
+    """
+    Mensagens renderizadas por (canal, mensagem), gravadas por uma thread própria
+
+    `append` só enfileira a linha; a thread de escrita grava em lotes, numa
+    transação por lote, sem bloquear o loop do bot. A conexão é aberta no
+    primeiro uso.
+    """
+
+    def __init__(self, path: str = None, batch_size: int = 200):
+        self.path = path or os.getenv("TRANSCRIPT_DB_PATH", "rpg_transcripts.db")
+        self.batch_size = batch_size
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._queue: queue.Queue = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self.written = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["TranscriptStore"]:
+        """Transcrição configurada pelo ambiente, ou None se TRANSCRIPT_STORE=0"""
+        if os.getenv("TRANSCRIPT_STORE", "1") == "0":
+            return None
+        store = cls()
+        # Grava o que ainda estiver na fila quando o bot encerra
+        atexit.register(store.flush)
+        return store
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            with self._lock:
+                if self._conn is None:
+                    conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute("PRAGMA synchronous=NORMAL")
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS transcript ("
+                        "channel_id INTEGER NOT NULL, message_id INTEGER NOT NULL, author_id INTEGER, "
+                        "username TEXT NOT NULL, time TEXT NOT NULL, rendered TEXT NOT NULL, "
+                        "PRIMARY KEY (channel_id, message_id)) WITHOUT ROWID"
+                    )
+                    self._conn = conn
+        return self._conn
+
+    def append(self, channel_id: int, chat_message) -> bool:
+        """Enfileira uma mensagem para gravação; mensagens sem ID do Discord não são gravadas"""
+        if chat_message.message_id is None:
+            return False
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_loop, name="rpg-transcript", daemon=True)
+                    self._writer.start()
+        self._queue.put((channel_id, chat_message.message_id, chat_message.author_id, chat_message.username,
+                         chat_message.time.isoformat(), chat_message.rendered))
+        return True
+
+    def _write_loop(self):
+        while True:
+            rows = [self._queue.get()]
+            while len(rows) < self.batch_size:
+                try:
+                    rows.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                conn = self._connection()
+                with self._lock:
+                    try:
+                        conn.execute("BEGIN")
+                        # Mensagens já gravadas (histórico buscado de novo) são ignoradas
+                        conn.executemany("INSERT OR IGNORE INTO transcript VALUES (?, ?, ?, ?, ?, ?)", rows)
+                        conn.execute("COMMIT")
+                    except sqlite3.Error:
+                        if conn.in_transaction:
+                            conn.execute("ROLLBACK")
+                        raise
+                self.written += len(rows)
+            except sqlite3.Error as e:
+                print(f"Erro ao gravar transcrição ({len(rows)} mensagens): {e}")
+            finally:
+                for _ in rows:
+                    self._queue.task_done()
+
+    def flush(self):
+        """Espera as mensagens enfileiradas serem gravadas"""
+        if self._writer is not None:
+            self._queue.join()
+
+    def load(self, channel_id: int, limit: int) -> List[tuple]:
+        """
+        As `limit` mensagens mais recentes do canal, da mais antiga para a mais nova,
+        como (ID da mensagem, ID do autor, nome, horário, linha renderizada)
+        """
+        conn = self._connection()
+        with self._lock:
+            rows = conn.execute(
+                "SELECT message_id, author_id, username, time, rendered FROM transcript "
+                "WHERE channel_id = ? ORDER BY message_id DESC LIMIT ?",
+                (channel_id, limit),
+            ).fetchall()
+        rows.reverse()
+        return [(message_id, author_id, username, datetime.datetime.fromisoformat(time), rendered)
+                for message_id, author_id, username, time, rendered in rows]
+
+    def recent_channels(self, limit: int) -> List[int]:
+        """Canais com mensagens mais recentes primeiro (IDs do Discord crescem com o tempo)"""
+        conn = self._connection()
+        with self._lock:
+            rows = conn.execute(
+                "SELECT channel_id FROM transcript GROUP BY channel_id ORDER BY MAX(message_id) DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
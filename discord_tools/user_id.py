@@ -1,3 +1,4 @@
+import asyncio
 from discord import User, Role
 
 class UserId:
@@ -7,11 +8,22 @@ class UserId:
     def __init__(self):
         self.user_id = dict()
         self.id_user = dict()
+        # IDs que a API não encontrou e buscas em andamento, para não repetir a chamada
+        self.missing = set()
+        self._fetching = set()
+        # Quem quer saber quando uma busca em andamento encontrar o usuário
+        self._waiters = dict()
         
     def AddUserId(self, user, id):
         print(f"added id {id}")
         self.user_id[user] = id
         self.id_user[id] = user
+        self.missing.discard(id)
+
+    def RemoveUserId(self, id):
+        user = self.id_user.pop(id, None)
+        if user is not None:
+            self.user_id.pop(user, None)
         
     def GetId(self, user) -> int:
         return self.user_id[user]
@@ -29,6 +41,53 @@ class UserId:
                 return False
         return True
     
+    def Resolve(self, id, message=None) -> User | None:
+        """
+        Usuário de uma menção: do mapa, das menções da própria mensagem ou do cache
+        do servidor; desconhecido, é buscado na API em segundo plano para as próximas
+        """
+        user = self.id_user.get(id)
+        if user is not None or message is None:
+            return user
+        user = next((mentioned for mentioned in message.mentions if mentioned.id == id), None)
+        guild = message.guild
+        if user is None and guild is not None:
+            user = guild.get_member(id)
+        if user is not None:
+            self.AddUserId(user, id)
+        else:
+            self.FetchLater(guild, id)
+        return user
+
+    def FetchLater(self, guild, id):
+        """Busca um membro desconhecido na API, sem bloquear quem está renderizando a mensagem"""
+        if guild is None or id in self.missing or id in self._fetching:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._fetching.add(id)
+
+        async def fetch():
+            try:
+                self.AddUserId(await guild.fetch_member(id), id)
+            except Exception:
+                self.missing.add(id)
+                self._waiters.pop(id, None)
+            finally:
+                self._fetching.discard(id)
+            for callback in self._waiters.pop(id, ()):
+                callback()
+        loop.create_task(fetch())
+
+    def WhenResolved(self, id, callback) -> bool:
+        """Chama `callback` quando a busca em andamento de `id` o encontrar; False se não há busca"""
+        if id not in self._fetching:
+            return False
+        self._waiters.setdefault(id, []).append(callback)
+        return True
+    
 GlobalUserId = UserId()
 
 class RoleId:
@@ -43,6 +102,11 @@ class RoleId:
         print(f"added role id {id}")
         self.role_id[user] = id
         self.id_role[id] = user
+
+    def RemoveRoleId(self, id):
+        role = self.id_role.pop(id, None)
+        if role is not None:
+            self.role_id.pop(role, None)
         
     def GetId(self, user) -> int:
         return self.role_id[user]
@@ -60,4 +124,51 @@ class RoleId:
                 return False
         return True
     
-GlobalRoleId = RoleId()
\ No newline at end of file
+    def Resolve(self, id, message=None) -> Role | None:
+        """Cargo de uma menção: do mapa, das menções da mensagem ou do cache do servidor"""
+        role = self.id_role.get(id)
+        if role is not None or message is None:
+            return role
+        role = next((mentioned for mentioned in message.role_mentions if mentioned.id == id), None)
+        if role is None and message.guild is not None:
+            role = message.guild.get_role(id)
+        if role is not None:
+            self.AddRoleId(role, id)
+        return role
+    
+GlobalRoleId = RoleId()
+
+def register_member_events(client):
+    """
+    Mantém os mapas de usuários e cargos atualizados pelos eventos do gateway
+    Só quem já foi mencionado está nos mapas; os eventos atualizam ou removem essas entradas.
+    Cargos novos entram na primeira menção, pelo cache do servidor (guild.get_role)
+    """
+    @client.event
+    async def on_member_update(before, after):
+        if GlobalUserId.IdExists(after.id):
+            GlobalUserId.AddUserId(after, after.id)
+
+    @client.event
+    async def on_user_update(before, after):
+        if GlobalUserId.IdExists(after.id):
+            GlobalUserId.AddUserId(after, after.id)
+
+    @client.event
+    async def on_member_join(member):
+        # Uma menção a ele antes da entrada pode ter ficado marcada como desconhecida
+        GlobalUserId.missing.discard(member.id)
+
+    @client.event
+    async def on_member_remove(member):
+        # Menções futuras trazem o usuário no próprio payload da mensagem
+        GlobalUserId.RemoveUserId(member.id)
+
+    @client.event
+    async def on_guild_role_update(before, after):
+        if GlobalRoleId.IdExists(after.id):
+            GlobalRoleId.AddRoleId(after, after.id)
+
+    @client.event
+    async def on_guild_role_delete(role):
+        GlobalRoleId.RemoveRoleId(role.id)
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Dublês compartilhados pelos testes do RpgReasoner e do contexto
+Chats com mensagens prontas, a base dos modelos de linguagem falsos e o analisador de contexto local
+"""
+
+import datetime
+from types import SimpleNamespace
+
+from discord_tools.chat import Chat, ChatMessage
+from llm_tools import LanguageModel
+
+def text_part(value: str):
+    return SimpleNamespace(text=value, function_call=None)
+
+def call_part(name: str, **args):
+    return SimpleNamespace(text="", function_call=SimpleNamespace(name=name, args=args))
+
+def response(*parts):
+    return SimpleNamespace(parts=list(parts))
+
+def add_message(chat: Chat, text: str, minutes: int = 0, username: str = "Thorin"):
+    """Acrescenta uma mensagem de `username`, `minutes` minutos depois do início da sessão"""
+    time = datetime.datetime(2025, 1, 1) + datetime.timedelta(minutes=minutes)
+    chat.append(ChatMessage(SimpleNamespace(content=text), time, username, text))
+
+def make_chat(text: str = "eu ataco", username: str = "Thorin") -> Chat:
+    """Chat com uma única mensagem"""
+    chat = Chat()
+    add_message(chat, text, username=username)
+    return chat
+
+class FakeModel(LanguageModel):
+    """Base dos modelos falsos: a geração sem ferramentas cai na com ferramentas, e não há o que configurar"""
+
+    def generate_content(self, req):
+        return self.generate_content_with_functions(req, None)
+
+    def generate_content_with_functions(self, req, tools):
+        raise NotImplementedError
+
+    def configure(self, model_name, functions):
+        pass
+
+class FakeAnalyzer:
+    """Analisador local, sem chamadas ao Gemini"""
+
+    def analyze_message_context(self, message, current_context=None):
+        return {
+            "world_info": {"name": "Terra dos Anões", "type": "medieval", "description": None},
+            "characters": [{"name": "Thorin", "type": "player", "description": None, "role": "guerreiro"}],
+            "locations": [{"name": "Ironforge", "description": None, "is_current": True}],
+            "quests": [],
+            "events": [{"description": message, "importance": "high"}],
+            "session_changes": {"state_change": None, "difficulty_change": None},
+        }
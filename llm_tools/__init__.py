@@ -1,45 +1,181 @@
 from enum import Enum
 from abc import ABC, abstractmethod
+import asyncio
+from collections import deque
+from datetime import datetime, timedelta, timezone
+import hashlib
+import os
+import threading
+import time
 
 import google.generativeai as genai
 from google.generativeai import types
-    
+
+class PromptLayout:
+    """
+    Prompt dividido em partes ordenadas da mais estável para a mais volátil
+
+    system: instruções fixas (papel do modelo, ferramentas), iguais em todos os canais
+    campaign: bloco da campanha de cada canal, que muda raramente (história do mundo);
+        vai no início do texto do pedido, logo depois das instruções
+    dynamic: contexto da sessão, mensagens e instrução final, a cada pedido
+    turns: turnos seguintes da mesma conversa no laço de ferramentas, como
+        ("model", partes da resposta) e ("function", [(nome, resultado), ...])
+    """
+
+    def __init__(self, system: str, campaign: str = "", dynamic: str = ""):
+        self.system = system
+        self.campaign = campaign
+        self.dynamic = dynamic
+        self.turns = []
+
+    def prefix_key(self, tools=None) -> str:
+        """Identifica o prefixo compartilhado por todos os canais (instruções e ferramentas) para reuso"""
+        digest = hashlib.sha256()
+        for part in (self.system, *_tool_names(tools)):
+            digest.update(part.encode())
+            digest.update(b"\x00")
+        return digest.hexdigest()
+
+    def __str__(self):
+        return self.system + self.campaign + self.dynamic
+
+def _conversation(text: str, turns: list):
+    """Conteúdo do pedido: só o texto, ou o texto seguido dos turnos do laço de ferramentas"""
+    if not turns:
+        return text
+    contents = [genai.protos.Content(role="user", parts=[genai.protos.Part(text=text)])]
+    for role, payload in turns:
+        if role == "model":
+            contents.append(genai.protos.Content(role="model", parts=list(payload)))
+        else:
+            contents.append(genai.protos.Content(role="user", parts=[
+                genai.protos.Part(function_response=genai.protos.FunctionResponse(name=name, response=result))
+                for name, result in payload
+            ]))
+    return contents
+
+def _tool_names(tools) -> list[str]:
+    names = []
+    for tool in tools or []:
+        if isinstance(tool, types.Tool):
+            names += [declaration.name for declaration in tool.function_declarations]
+        elif isinstance(tool, dict):
+            names.append(tool.get("name", ""))
+        else:
+            names.append(getattr(tool, "name", str(tool)))
+    return names
+
 class LanguageModel(ABC):
     @abstractmethod
-    def generate_content(self, req: str):
+    def generate_content(self, req: str | PromptLayout):
         pass
-    
+
     @abstractmethod
-    def generate_content_with_functions(self, req: str, tools):
+    def generate_content_with_functions(self, req: str | PromptLayout, tools):
         pass
-    
+
     @abstractmethod
     def configure(self, model_name: str, functions: list):
         pass
-    
+
+    # Interface assíncrona: por padrão roda a chamada síncrona numa thread,
+    # para não travar o loop de eventos do bot; modelos com cliente assíncrono sobrescrevem
+    async def generate_content_async(self, req: str | PromptLayout):
+        return await asyncio.to_thread(self.generate_content, req)
+
+    async def generate_content_with_functions_async(self, req: str | PromptLayout, tools):
+        return await asyncio.to_thread(self.generate_content_with_functions, req, tools)
+
+    async def generate_content_stream_async(self, req: str | PromptLayout, tools):
+        """Gera a resposta em trechos; sem suporte a streaming, entrega a resposta inteira de uma vez"""
+        yield await self.generate_content_with_functions_async(req, tools)
+
 class GeminiModel(LanguageModel):
     tools: types.Tool
     model: genai.GenerativeModel
-    
+
+    # Prefixos menores que isso não compensam um cache explícito (mínimo aceito pela API)
+    CACHE_MIN_TOKENS = int(os.getenv("GEMINI_CACHE_MIN_TOKENS", "1024"))
+    CACHE_TTL = timedelta(minutes=int(os.getenv("GEMINI_CACHE_TTL_MINUTES", "60")))
+    # Depois de uma falha ao criar o cache, quanto tempo usar o modelo sem cache antes de tentar de novo
+    CACHE_RETRY = timedelta(minutes=5)
+
+    # Modelos por (nome do modelo, prefixo): (modelo, conteúdo em cache ou None, expiração).
+    # Compartilhados entre instâncias, então níveis do pool com o mesmo modelo usam o mesmo cache;
+    # as chaves são poucas (instruções e ferramentas fixas) e cada entrada vale até expirar
+    _prefix_models: dict = {}
+    _prefix_lock = threading.Lock()
+
     def __init__(self, model_name: str, functions: list):
         super().__init__()
+        self.model_name = model_name
         if functions and len(functions) > 0:
             self.tools = types.Tool(function_declarations=functions)
             self.model = genai.GenerativeModel(model_name, tools=[self.tools])
         else:
             self.tools = None
             self.model = genai.GenerativeModel(model_name)
-        
-    def generate_content(self, req) -> types.GenerateContentResponse:
-        print("DOING REQUEST")
-        print(req)
-        print("REQUEST DONE")
-        return self.model.generate_content(req)
-    
-    def generate_content_with_functions(self, req, functions) -> types.GenerateContentResponse:
-        print("DOING REQUEST WITH FUNCTIONS")
+        self.context_cache = os.getenv("GEMINI_CONTEXT_CACHE", "1") != "0"
+
+    def _prefix_model(self, prompt: PromptLayout, tools) -> tuple[genai.GenerativeModel, bool]:
+        """
+        Modelo com as instruções fixas e as ferramentas já configuradas
+
+        Com instruções grandes, elas vão para um CachedContent, único para todos os
+        canais, e não são reenviadas nem reprocessadas; senão, o system_instruction
+        fixo ainda mantém o início do pedido idêntico entre mensagens. A campanha de
+        cada canal segue no texto do pedido. Retorna o modelo e se ele usa o cache.
+        """
+        key = (self.model_name, prompt.prefix_key(tools))
+        now = datetime.now(timezone.utc)
+        with self._prefix_lock:
+            entry = self._prefix_models.get(key)
+            if entry and (entry[2] is None or entry[2] > now):
+                return entry[0], entry[1] is not None
+
+        model, cache, expires = None, None, None
+        prefix_tokens = len(prompt.system) // 4
+        if self.context_cache and prefix_tokens >= self.CACHE_MIN_TOKENS:
+            try:
+                cache = genai.caching.CachedContent.create(
+                    model=self.model_name,
+                    system_instruction=prompt.system,
+                    tools=tools or None,
+                    ttl=self.CACHE_TTL,
+                )
+                model = genai.GenerativeModel.from_cached_content(cache)
+                # Renova um pouco antes de a API descartar o cache
+                expires = now + self.CACHE_TTL - timedelta(minutes=1)
+                print(f"🗄️ Prefixo do prompt em cache ({prefix_tokens} tokens): {cache.name}")
+            except Exception as e:
+                print(f"⚠️ Cache de contexto indisponível, usando system_instruction: {e}")
+                cache = None
+                expires = now + self.CACHE_RETRY
+        if model is None:
+            model = genai.GenerativeModel(self.model_name, tools=tools or None,
+                                          system_instruction=prompt.system)
+
+        with self._prefix_lock:
+            # O cache substituído expira sozinho na API, pelo TTL
+            self._prefix_models[key] = (model, cache, expires)
+        return model, cache is not None
+
+    def _request(self, req, functions):
+        """Modelo, conteúdo e argumentos de um pedido; functions=None para pedido sem ferramentas"""
+        if isinstance(req, PromptLayout):
+            if isinstance(functions, list):
+                functions = types.Tool(function_declarations=functions) if functions else None
+            model, _ = self._prefix_model(req, [functions] if functions else None)
+            text = req.campaign + req.dynamic
+            contents = _conversation(text, req.turns)
+            print(text)
+            print("REQUEST DONE")
+            return model, contents, {}
         print(req)
         print("REQUEST DONE")
+        if functions is None:
+            return self.model, req, {}
         print(functions)
         print("FUNCTIONS DONE")
         if isinstance(functions, list):
@@ -47,15 +183,304 @@ class GeminiModel(LanguageModel):
                 functions = types.Tool(function_declarations=functions)
             else:
                 # Se não há ferramentas, usar generate_content normal
-                return self.model.generate_content(req)
-        return self.model.generate_content(req, tools=[functions])
-    
+                return self.model, req, {}
+        return self.model, req, {"tools": [functions]}
+
+    def generate_content(self, req) -> types.GenerateContentResponse:
+        print("DOING REQUEST")
+        model, contents, kwargs = self._request(req, None)
+        return model.generate_content(contents, **kwargs)
+
+    def generate_content_with_functions(self, req, functions) -> types.GenerateContentResponse:
+        print("DOING REQUEST WITH FUNCTIONS")
+        model, contents, kwargs = self._request(req, functions)
+        return model.generate_content(contents, **kwargs)
+
+    async def generate_content_async(self, req) -> types.AsyncGenerateContentResponse:
+        print("DOING REQUEST")
+        # Criar um cache de contexto é uma chamada bloqueante; fica fora do loop
+        model, contents, kwargs = await asyncio.to_thread(self._request, req, None)
+        return await model.generate_content_async(contents, **kwargs)
+
+    async def generate_content_with_functions_async(self, req, functions) -> types.AsyncGenerateContentResponse:
+        print("DOING REQUEST WITH FUNCTIONS")
+        model, contents, kwargs = await asyncio.to_thread(self._request, req, functions)
+        return await model.generate_content_async(contents, **kwargs)
+
+    async def generate_content_stream_async(self, req, functions):
+        print("DOING STREAMING REQUEST WITH FUNCTIONS")
+        model, contents, kwargs = await asyncio.to_thread(self._request, req, functions)
+        response = await model.generate_content_async(contents, stream=True, **kwargs)
+        async for chunk in response:
+            yield chunk
+
     def configure(self, model_name: str, functions: list):
         # Recriar o modelo com as novas configurações usando a mesma lógica do __init__
+        self.model_name = model_name
         if functions and len(functions) > 0:
             self.tools = types.Tool(function_declarations=functions)
             self.model = genai.GenerativeModel(model_name, tools=[self.tools])
         else:
             self.tools = None
             self.model = genai.GenerativeModel(model_name)
-    
+
+class ModelTier:
+    """
+    Um nível do pool de modelos, com as latências e falhas mais recentes
+
+    Fica indisponível quando o p95 da janela passa de `p95_limit_ms` ou a taxa
+    de erros passa de `max_error_rate`; depois de `cooldown` segundos sem uso,
+    volta a receber um pedido de teste.
+    """
+
+    MIN_SAMPLES = 5
+
+    def __init__(self, name: str, model: LanguageModel, p95_limit_ms: float,
+                 max_error_rate: float = 0.25, max_prompt_tokens: int = None,
+                 window: int = 50, cooldown: float = 60.0):
+        self.name = name
+        self.model = model
+        self.p95_limit_ms = p95_limit_ms
+        self.max_error_rate = max_error_rate
+        self.max_prompt_tokens = max_prompt_tokens
+        self.cooldown = cooldown
+        self._samples = deque(maxlen=window)  # (latência em ms, sucesso)
+        self._last_sample = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, latency_ms: float, ok: bool):
+        with self._lock:
+            self._samples.append((latency_ms, ok))
+            self._last_sample = time.monotonic()
+
+    def p95_ms(self) -> float | None:
+        with self._lock:
+            latencies = sorted(latency for latency, ok in self._samples if ok)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+
+    def error_rate(self) -> float:
+        with self._lock:
+            if not self._samples:
+                return 0.0
+            return sum(1 for _, ok in self._samples if not ok) / len(self._samples)
+
+    def healthy(self) -> bool:
+        with self._lock:
+            if len(self._samples) < self.MIN_SAMPLES or time.monotonic() - self._last_sample > self.cooldown:
+                return True
+        p95 = self.p95_ms()
+        return self.error_rate() <= self.max_error_rate and (p95 is None or p95 <= self.p95_limit_ms)
+
+    def fits(self, prompt_tokens: int) -> bool:
+        return self.max_prompt_tokens is None or prompt_tokens <= self.max_prompt_tokens
+
+class ModelPool(LanguageModel):
+    """
+    Modelos em níveis (lite, flash, pro) escolhidos a cada pedido
+
+    O nível sai do tipo de tarefa, sobe se o prompt não cabe no nível e desce
+    para um mais rápido quando o nível está lento ou falhando, ou quando o p95
+    dele não cabe na latência pedida. Um pedido que falha é repetido uma vez no
+    nível mais rápido seguinte. Usado diretamente, atende como tarefa "conversation".
+    O pro não atende nenhuma tarefa por padrão; MODEL_TIER_<TAREFA> muda o nível de
+    uma tarefa (por exemplo MODEL_TIER_WORLD=pro).
+    """
+
+    TIER_ORDER = ["lite", "flash", "pro"]  # Do mais rápido para o mais capaz
+    TASK_TIERS = {
+        "context": "lite",
+        "rag": "lite",
+        "summary": "lite",
+        "conversation": "flash",
+        "world": "flash",
+    }
+
+    def __init__(self, tiers: list[ModelTier], default_task: str = "conversation", task_tiers: dict = None):
+        self.tiers = sorted(tiers, key=lambda tier: self.TIER_ORDER.index(tier.name))
+        self.default_task = default_task
+        self.task_tiers = {**self.TASK_TIERS, **(task_tiers or {})}
+
+    @classmethod
+    def from_env(cls, functions: list = None) -> "ModelPool":
+        """Pool de modelos Gemini configurado pelas variáveis MODEL_LITE, MODEL_FLASH, MODEL_PRO e MODEL_TIER_<TAREFA>"""
+        defaults = {
+            "lite": ("gemini-2.0-flash-lite", 4000),
+            "flash": ("gemini-2.5-flash", 15000),
+            "pro": ("gemini-2.5-pro", 45000),
+        }
+        max_error_rate = float(os.getenv("MODEL_MAX_ERROR_RATE", "0.25"))
+        tiers = []
+        for name, (model_name, p95_limit) in defaults.items():
+            model_name = os.getenv(f"MODEL_{name.upper()}", model_name)
+            if not model_name:
+                continue  # Nível desativado; as tarefas dele vão para o vizinho
+            tiers.append(ModelTier(
+                name, GeminiModel(model_name, functions),
+                p95_limit_ms=float(os.getenv(f"MODEL_{name.upper()}_P95_MS", str(p95_limit))),
+                max_error_rate=max_error_rate,
+                max_prompt_tokens=int(os.getenv("MODEL_LITE_MAX_TOKENS", "32000")) if name == "lite" else None,
+            ))
+        task_tiers = {}
+        for task in cls.TASK_TIERS:
+            tier = os.getenv(f"MODEL_TIER_{task.upper()}", "").strip().lower()
+            if tier in cls.TIER_ORDER:
+                task_tiers[task] = tier
+            elif tier:
+                print(f"⚠️ MODEL_TIER_{task.upper()}={tier} ignorado: use {', '.join(cls.TIER_ORDER)}")
+        return cls(tiers, task_tiers=task_tiers)
+
+    def select(self, task: str, req=None, latency_budget_ms: float = None) -> list[ModelTier]:
+        """Níveis a tentar para o pedido, em ordem: o escolhido e o mais rápido seguinte"""
+        wanted = self.TIER_ORDER.index(self.task_tiers.get(task, "flash"))
+        # Nível configurado mais próximo do desejado, preferindo o mais capaz
+        start = next((i for i, tier in enumerate(self.tiers) if self.TIER_ORDER.index(tier.name) >= wanted),
+                     len(self.tiers) - 1)
+        prompt_tokens = len(str(req)) // 4 if req is not None else 0
+        while start < len(self.tiers) - 1 and not self.tiers[start].fits(prompt_tokens):
+            start += 1
+
+        chosen = start
+        for i in range(start, -1, -1):
+            tier = self.tiers[i]
+            if not tier.fits(prompt_tokens):
+                break
+            p95 = tier.p95_ms()
+            within_budget = latency_budget_ms is None or p95 is None or p95 <= latency_budget_ms
+            if tier.healthy() and within_budget:
+                chosen = i
+                break
+        if chosen != start:
+            print(f"⚖️ Tarefa {task}: nível {self.tiers[start].name} indisponível ou lento, "
+                  f"usando {self.tiers[chosen].name}")
+        order = [self.tiers[chosen]]
+        if chosen > 0 and self.tiers[chosen - 1].fits(prompt_tokens):
+            order.append(self.tiers[chosen - 1])
+        return order
+
+    def for_task(self, task: str, latency_budget_ms: float = None) -> "TaskModel":
+        return TaskModel(self, task, latency_budget_ms)
+
+    def _call(self, task, latency_budget_ms, method: str, *args):
+        tiers = self.select(task, args[0], latency_budget_ms)
+        for i, tier in enumerate(tiers):
+            start = time.perf_counter()
+            try:
+                response = getattr(tier.model, method)(*args)
+            except Exception as e:
+                tier.record((time.perf_counter() - start) * 1000, False)
+                if i + 1 == len(tiers):
+                    raise
+                print(f"⚠️ Falha no nível {tier.name} ({e}); repetindo no {tiers[i + 1].name}")
+                continue
+            tier.record((time.perf_counter() - start) * 1000, True)
+            return response
+
+    async def _call_async(self, task, latency_budget_ms, method: str, *args):
+        tiers = self.select(task, args[0], latency_budget_ms)
+        for i, tier in enumerate(tiers):
+            start = time.perf_counter()
+            try:
+                response = await getattr(tier.model, method)(*args)
+            except Exception as e:
+                tier.record((time.perf_counter() - start) * 1000, False)
+                if i + 1 == len(tiers):
+                    raise
+                print(f"⚠️ Falha no nível {tier.name} ({e}); repetindo no {tiers[i + 1].name}")
+                continue
+            tier.record((time.perf_counter() - start) * 1000, True)
+            return response
+
+    async def _stream(self, task, latency_budget_ms, req, tools):
+        tiers = self.select(task, req, latency_budget_ms)
+        for i, tier in enumerate(tiers):
+            start = time.perf_counter()
+            started = False
+            try:
+                async for chunk in tier.model.generate_content_stream_async(req, tools):
+                    started = True
+                    yield chunk
+            except Exception as e:
+                tier.record((time.perf_counter() - start) * 1000, False)
+                # Depois do primeiro trecho o texto já foi publicado; não dá para trocar de nível
+                if started or i + 1 == len(tiers):
+                    raise
+                print(f"⚠️ Falha no nível {tier.name} ({e}); repetindo no {tiers[i + 1].name}")
+                continue
+            tier.record((time.perf_counter() - start) * 1000, True)
+            return
+
+    def generate_content(self, req):
+        return self._call(self.default_task, None, "generate_content", req)
+
+    def generate_content_with_functions(self, req, tools):
+        return self._call(self.default_task, None, "generate_content_with_functions", req, tools)
+
+    async def generate_content_async(self, req):
+        return await self._call_async(self.default_task, None, "generate_content_async", req)
+
+    async def generate_content_with_functions_async(self, req, tools):
+        return await self._call_async(self.default_task, None, "generate_content_with_functions_async", req, tools)
+
+    async def generate_content_stream_async(self, req, tools):
+        async for chunk in self._stream(self.default_task, None, req, tools):
+            yield chunk
+
+    def configure(self, model_name: str, functions: list):
+        """Troca as ferramentas de todos os níveis; `model_name`, se dado, vale para o nível flash"""
+        for tier in self.tiers:
+            name = model_name if model_name and tier.name == "flash" else getattr(tier.model, "model_name", model_name)
+            tier.model.configure(name, functions)
+
+    def stats(self) -> dict:
+        return {tier.name: {"p95_ms": tier.p95_ms(), "error_rate": tier.error_rate(), "healthy": tier.healthy()}
+                for tier in self.tiers}
+
+class TaskModel(LanguageModel):
+    """Visão do pool para um tipo de tarefa, com a mesma interface de um modelo"""
+
+    def __init__(self, pool: ModelPool, task: str, latency_budget_ms: float = None):
+        self.pool = pool
+        self.task = task
+        self.latency_budget_ms = latency_budget_ms
+
+    def generate_content(self, req):
+        return self.pool._call(self.task, self.latency_budget_ms, "generate_content", req)
+
+    def generate_content_with_functions(self, req, tools):
+        return self.pool._call(self.task, self.latency_budget_ms, "generate_content_with_functions", req, tools)
+
+    async def generate_content_async(self, req):
+        return await self.pool._call_async(self.task, self.latency_budget_ms, "generate_content_async", req)
+
+    async def generate_content_with_functions_async(self, req, tools):
+        return await self.pool._call_async(self.task, self.latency_budget_ms,
+                                           "generate_content_with_functions_async", req, tools)
+
+    async def generate_content_stream_async(self, req, tools):
+        async for chunk in self.pool._stream(self.task, self.latency_budget_ms, req, tools):
+            yield chunk
+
+    def configure(self, model_name: str, functions: list):
+        self.pool.configure(model_name, functions)
+
+def for_task(model: LanguageModel, task: str, latency_budget_ms: float = None) -> LanguageModel:
+    """Modelo para o tipo de tarefa; sem pool, o próprio modelo"""
+    if isinstance(model, ModelPool):
+        return model.for_task(task, latency_budget_ms)
+    if isinstance(model, TaskModel):
+        return model.pool.for_task(task, latency_budget_ms)
+    return model
+
+_model_pool: ModelPool | None = None
+_model_pool_lock = threading.Lock()
+
+def get_model_pool() -> ModelPool:
+    """Pool global de modelos, sem ferramentas fixas; quem precisa delas as passa no pedido"""
+    global _model_pool
+    if _model_pool is None:
+        with _model_pool_lock:
+            if _model_pool is None:
+                _model_pool = ModelPool.from_env()
+    return _model_pool
@@ -1,4 +1,5 @@
 import os
+import datetime
 import google.generativeai as genai
 import numpy as np
 import faiss
@@ -7,10 +8,13 @@ from langchain_text_splitters import RecursiveCharacterTextSplitter
 from dotenv import load_dotenv
 import pickle
 import re
+import threading
 from typing import List, Dict, Any
 import logging
 from en_terms import dnd_dictionary_pt_en
-from discord_tools.chat import Chat
+from discord_tools.chat import Chat, ChatMessage
+from rpg_tools.intent_router import get_intent_router
+from llm_tools import get_model_pool
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -37,7 +41,7 @@ class DNDRagSystem:
                 raise ValueError("GEMINI_API_KEY ou GOOGLE_API_KEY não encontrada. Configure a variável de ambiente ou passe como parâmetro.")
             genai.configure(api_key=api_key)
         
-        self.gemini_model = genai.GenerativeModel('gemini-2.0-flash-lite')
+        self.gemini_model = get_model_pool().for_task("rag")
         
         # Inicializar modelo de embeddings
         self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
@@ -233,19 +237,8 @@ Agora iniciam as mensagens:
         Returns:
             True se for pergunta sobre D&D
         """
-        query_lower = query.lower()
-        
-        # Verificar se alguma palavra da query está nas chaves (português) do dicionário
-        for pt_term in dnd_dictionary_pt_en.keys():
-            if pt_term in query_lower:
-                return True
-        
-        # Verificar se alguma palavra da query está nos valores (inglês) do dicionário
-        for en_term in dnd_dictionary_pt_en.values():
-            if en_term in query_lower:
-                return True
-        
-        return False
+        # Termos em português e inglês do dicionário, compilados no roteador de intenções
+        return get_intent_router().has_dnd_terms(query)
     
     def save_index(self, index_path: str = "dnd_index.pkl") -> None:
         """Salva o índice e dados para reuso futuro"""
@@ -314,12 +307,21 @@ def initialize_rag_system():
 
 # Instância global do sistema RAG
 global_rag_system = None
+_rag_initialized = False
+_rag_lock = threading.Lock()
 
 def get_rag_system():
-    """Retorna a instância global do sistema RAG"""
-    global global_rag_system
-    if global_rag_system is None:
-        global_rag_system = initialize_rag_system()
+    """
+    Retorna a instância global do sistema RAG
+    Inicializa uma única vez, mesmo com chamadas de várias threads; uma falha
+    também fica registrada, para não recarregar o índice a cada canal
+    """
+    global global_rag_system, _rag_initialized
+    if not _rag_initialized:
+        with _rag_lock:
+            if not _rag_initialized:
+                global_rag_system = initialize_rag_system()
+                _rag_initialized = True
     return global_rag_system
 
 
@@ -331,6 +333,6 @@ if __name__ == "__main__":
         chat.SetName("LLM", False)
         test_query = "Quais são as características dos Anões?"
         print(f"\n🧪 Teste: {test_query}")
-        chat.chat_text += f"$ Mensagem de Fulaninho: {test_query}\n\n"
+        chat.append(ChatMessage(None, datetime.datetime.now(), "Fulaninho", test_query))
         response = rag.generate_answer(chat, test_query)
         print(f"📝 Resposta: {response}")
@@ -13,12 +13,12 @@ from rpg_tools import reasoner
 from discord_tools import dd_client, send_message, DISCORD_BOT_TOKEN
 from discord_tools.commands import COMMAND_CHARS
 
-def get_responses(model, chat: chat_.Chat, reasoner: reasoner.RpgReasoner):
+async def get_responses(model, chat: chat_.Chat, reasoner: reasoner.RpgReasoner):
     # Faça uma solicitação de geração de texto
-    return reasoner.GenerateRequest(chat, model)
+    return await reasoner.GenerateRequest(chat, model)
 
-def expand_hist(model, chat: chat_.Chat, reasoner: reasoner.RpgReasoner):
-    return reasoner.ExpandHistRequest(chat, model)
+async def expand_hist(model, chat: chat_.Chat, reasoner: reasoner.RpgReasoner):
+    return await reasoner.ExpandHistRequest(chat, model)
             
 # Message functionality
 async def respond_message(chat: chat_.Chat, message: Message, reasoner: reasoner.RpgReasoner, func = get_responses):
@@ -26,7 +26,7 @@ async def respond_message(chat: chat_.Chat, message: Message, reasoner: reasoner
         print("Message none error")
     async with message.channel.typing():
         try:
-            for response in func(model, chat, reasoner):
+            for response in await func(model, chat, reasoner):
                 await send_message(message.channel, response)
         except Exception as e:
             print("Error in get response", e, e.__traceback__)
@@ -62,7 +62,7 @@ async def on_message(message: Message):
     channel = message.channel
     
     my_chat = await chat_.GlobalManager.add_channel(channel)
-    my_reasoner = reasoner.GlobalReasonerManager.add_channel(channel)
+    my_reasoner = await reasoner.GlobalReasonerManager.add_channel(channel)
     my_chat.SetName(dd_client.user.display_name)
     
     my_chat.add_message(message, username)
@@ -10,11 +10,14 @@ from dotenv import load_dotenv
 import google.generativeai as genai
 from discord import Intents, Client, Message, TextChannel
 import discord_tools.chat as chat_
+from discord_tools.commands import COMMAND_CHARS
+from discord_tools.user_id import register_member_events
 from rpg_tools.reasoner import GlobalReasonerManager, RpgReasoner
 from rag import get_rag_system
-from llm_tools import GeminiModel
-from rpg_tools.agentic_tools import ToolSettings
-from discord_tools.commands import COMMAND_CHARS
+from llm_tools import get_model_pool
+from rpg_tools.intent_router import INTENT_RULES, get_intent_router
+from discord_tools.coalescer import ReplyCoalescer
+from discord_tools.streaming import StreamingReply
 
 # Carregar variáveis de ambiente
 load_dotenv()
@@ -33,15 +36,17 @@ if not DISCORD_BOT_TOKEN:
 # Configurar Gemini
 genai.configure(api_key=GOOGLE_API_TOKEN)
 
-# Inicializar ferramentas RPG para o modelo
-tool_settings = ToolSettings()
-model = GeminiModel('gemini-2.5-flash', tool_settings.get_tool_list())
+# Modelos em níveis (lite, flash, pro), escolhidos por tarefa a cada pedido;
+# as ferramentas RPG vão em cada pedido do reasoner
+model = get_model_pool()
 
 # Configurar bot Discord
 intents = Intents.default()
 intents.message_content = True
 intents.members = True
 client = Client(intents=intents)
+# Nomes de usuários e cargos mencionados atualizados pelos eventos do gateway
+register_member_events(client)
 
 # Sistema RAG global
 rag_system = None
@@ -49,6 +54,9 @@ rag_system = None
 # Sistema de contexto Redis
 context_manager = None
 
+# Menções feitas durante uma geração no mesmo canal são respondidas juntas
+reply_coalescer = ReplyCoalescer()
+
 async def initialize_systems():
     """Inicializa todos os sistemas necessários"""
     global rag_system, context_manager
@@ -62,13 +70,23 @@ async def initialize_systems():
         print("✅ Sistema RAG inicializado")
     else:
         print("⚠️ Sistema RAG não disponível")
+
+    # Compilar o roteador de intenções antes da primeira mensagem
+    router = get_intent_router()
+    if rag_system:
+        router.attach_embedder(lambda texts: rag_system.embedding_model.encode(texts, normalize_embeddings=True))
+    print(f"🧭 Roteador de intenções compilado com {len(router.terms)} termos")
     
     # Inicializar sistema de contexto Redis
     print("🗄️ Inicializando sistema de contexto Redis...")
     try:
-        from rpg_tools.context_manager import context_manager as cm
-        context_manager = cm
-        print("✅ Sistema de contexto Redis inicializado")
+        from rpg_tools.context_manager import get_context_manager, is_context_manager_ready
+        context_manager = get_context_manager()
+        context_manager.start_sweeper()
+        if is_context_manager_ready():
+            print("✅ Sistema de contexto Redis inicializado")
+        else:
+            print("⚠️ Armazenamento de contexto não respondeu; tentando novamente a cada uso")
     except Exception as e:
         print(f"⚠️ Sistema de contexto Redis não disponível: {e}")
         context_manager = None
@@ -81,42 +99,42 @@ async def respond_with_rag(chat: chat_.Chat, message: Message) -> str:
         return "❌ Sistema RAG não disponível"
     
     try:
-        response = ["RESPOSTA: " + rag_system.generate_answer(chat, message.content)]
+        response = ["RESPOSTA: " + await asyncio.to_thread(rag_system.generate_answer, chat, message.content)]
         return response
     except Exception as e:
         print(f"Erro no RAG: {e}")
         return f"❌ Erro ao consultar regras D&D: {str(e)}"
 
-async def respond_with_rpg(chat: chat_.Chat, reasoner) -> list[str]:
+async def respond_with_rpg(chat: chat_.Chat, reasoner, mentions: list[Message] = None) -> list[str]:
     """Responde usando o agente RPG"""
     try:
         # Usar o reasoner para gerar resposta
-        responses = reasoner.GenerateRequest(chat, model)
+        if mentions:
+            mentions = [(str(m.author.display_name), m.content) for m in mentions]
+        responses = await reasoner.GenerateRequest(chat, model, mentions)
         return responses
     except Exception as e:
         print(f"Erro no agente RPG: {e}")
         return [f"❌ Erro no agente RPG: {str(e)}"]
 
-def should_use_rag(message_content: str) -> bool:
-    """Usar RAG para perguntas diretas"""
-    if not message_content[-1] == '?':
-        return False
-    
-    """Determina se deve usar RAG ou agente RPG"""
-    if not rag_system:
-        return False
-    
-    # Verificar se é pergunta sobre D&D
-    if rag_system.is_dnd_question(message_content):
-        return True
-    
-    # Verificar palavras-chave relacionadas a regras
-    dnd_keywords = ['regra', 'regras', 'd&d', 'dnd', 'dungeons', 'dragons', 'classe', 'raça', 'magia', 'combate', 'ac', 'hp', 'dano']
-    message_lower = message_content.lower()
-    if any(keyword in message_lower for keyword in dnd_keywords):
-        return True
-    
-    return False
+async def respond_with_rpg_stream(chat: chat_.Chat, message: Message, reasoner, mentions: list[Message] = None,
+                                  intent: str = None):
+    """Responde usando o agente RPG, publicando o texto conforme o modelo o gera"""
+    reply = StreamingReply(message.channel)
+    async with message.channel.typing():
+        try:
+            if mentions:
+                mentions = [(str(m.author.display_name), m.content) for m in mentions]
+            # O texto é finalizado assim que o modelo termina, antes das mensagens das ferramentas
+            responses = await reasoner.GenerateRequest(chat, model, mentions, on_text=reply.update,
+                                                       on_stream_end=reply.finish, intent=intent)
+            await reply.finish()
+            # Resultados de ferramentas (dado, história) e respostas fora do streaming
+            for response in responses:
+                await send_message(message.channel, response)
+        except Exception as e:
+            print(f"Erro no agente RPG: {e}")
+            await send_message(message.channel, f"❌ Erro no agente RPG: {str(e)}")
 
 async def send_message(channel: TextChannel, response: str):
     """Envia resposta para o canal Discord"""
@@ -150,9 +168,11 @@ async def on_ready():
     
     # Inicializar sistemas
     await initialize_systems()
+    # Chats dos canais mais ativos voltam da transcrição local, buscando só o delta
+    asyncio.create_task(chat_.GlobalManager.rehydrate(client.get_channel))
 
 async def expand_hist(chat: chat_.Chat, reasoner: RpgReasoner):
-    return reasoner.ExpandHistRequest(chat, model)
+    return await reasoner.ExpandHistRequest(chat, model)
 
 # Message functionality
 async def respond_message(chat: chat_.Chat, message: Message, reasoner: RpgReasoner, func = respond_with_rpg):
@@ -205,7 +225,7 @@ async def on_message(message: Message):
     my_chat.add_message(message, username)
     
     # Adicionar ao reasoner RPG (que agora gerencia contexto Redis)
-    my_reasoner: RpgReasoner = GlobalReasonerManager.add_channel(channel)
+    my_reasoner: RpgReasoner = await GlobalReasonerManager.add_channel(channel)
     
     # Debug: mostrar informações sobre menções
     print(f"🔍 DEBUG: Bot ID: {client.user.id}")
@@ -220,18 +240,26 @@ async def on_message(message: Message):
         f"<@!{client.user.id}>" in message.content  # Menção com nickname
     )
     
-    if message.content[0] in COMMAND_CHARS:
+    if message.content.strip()[0] in COMMAND_CHARS:
         await respond_command(my_chat, message, my_reasoner, message.content[0])
     elif bot_mentioned:
         print("✅ Bot foi mencionado, processando...")
         try:
+            # Só as menções são roteadas; o embedding das ambíguas não roda no loop
+            route = await get_intent_router().route_async(message.content)
             # Determinar se deve usar RAG ou RPG
-            if should_use_rag(message.content):
-                print("🔍 Usando sistema RAG para consulta D&D")
+            if rag_system and route.intent == INTENT_RULES:
+                print(f"🔍 Usando sistema RAG para consulta D&D (confiança {route.confidence:.2f})")
                 await respond_message(my_chat, message, message, respond_with_rag)
             else: 
                 print("🎲 Usando agente RPG para resposta")
-                await respond_message(my_chat, message, my_reasoner)
+                # Cada menção leva a intenção decidida aqui; o reasoner não roteia de novo.
+                # A resposta é ancorada na última menção do lote, e vale a intenção dela
+                async def respond_batch(batch: list[tuple[Message, str]]):
+                    mentions = [mention for mention, _ in batch]
+                    await respond_with_rpg_stream(my_chat, mentions[-1], my_reasoner, mentions, batch[-1][1])
+                if not await reply_coalescer.submit(channel.id, (message, route.intent), respond_batch):
+                    print("🧺 Geração em andamento no canal; menção agregada à próxima resposta")
                     
         except Exception as e:
             error_msg = f"❌ Erro ao processar mensagem: {str(e)}"
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Janela deslizante do histórico de chat com orçamento de tokens
+As mensagens mais recentes vão na íntegra para o prompt; as antigas são
+enroladas num resumo incremental, atualizado em segundo plano
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+
+from discord_tools.chat import Chat, ChatMessage
+import rpg_tools.prompts as prompts
+
+# Resumos de todos os canais compartilham poucos workers
+_summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="rpg-history")
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa local de tokens (~4 caracteres por token), sem chamar a API"""
+    return len(text) // 4 + 1
+
+class HistoryBudget:
+    """Orçamento de tokens do histórico enviado nos prompts"""
+
+    def __init__(self, recent_tokens: int = None, summary_tokens: int = None,
+                 fold_tokens: int = None, max_fold_tokens: int = None):
+        # Tokens das mensagens mais recentes mantidas na íntegra
+        self.recent_tokens = recent_tokens or int(os.getenv("HISTORY_RECENT_TOKENS", "6000"))
+        # Tamanho máximo do resumo das mensagens antigas
+        self.summary_tokens = summary_tokens or int(os.getenv("HISTORY_SUMMARY_TOKENS", "800"))
+        # Quantos tokens fora da janela acumulam antes de um novo resumo
+        self.fold_tokens = fold_tokens or self.recent_tokens // 3
+        # Limite de tokens enrolados por job (históricos recuperados enormes vão por partes)
+        self.max_fold_tokens = max_fold_tokens or self.recent_tokens * 2
+
+class ChatHistory:
+    """
+    Histórico de um canal para os prompts do RpgReasoner
+
+    Mantém o resumo das mensagens antigas e o cursor até onde elas já foram
+    resumidas; o prompt fica com tamanho aproximadamente constante.
+    """
+
+    def __init__(self, budget: HistoryBudget = None, summarizer: Callable[[str, str, object], str] = None):
+        self.budget = budget or HistoryBudget()
+        self.summarizer = summarizer or summarize_with_model
+        self.summary = ""
+        # Índice absoluto (contando as que já saíram do buffer do Chat) da primeira mensagem
+        # ainda não resumida; None enquanto nada foi resumido, para que mensagens antigas
+        # recuperadas depois, no início do buffer, também entrem no resumo
+        self.summarized_upto = None
+        self._pending = False
+        self._future = None
+        self._lock = threading.Lock()
+
+    def window_start(self, messages: List[ChatMessage], tokens: int) -> int:
+        """Índice da mensagem mais antiga que cabe num orçamento de tokens, contando do fim"""
+        used = 0
+        start = len(messages)
+        while start > 0:
+            cost = estimate_tokens(messages[start - 1].rendered)
+            if used + cost > tokens and start < len(messages):
+                break
+            used += cost
+            start -= 1
+        return start
+
+    def _unsummarized(self, offset: int) -> int:
+        """Índice, na cópia do buffer que começa em `offset`, da primeira mensagem não resumida"""
+        if self.summarized_upto is None:
+            return 0
+        return max(self.summarized_upto - offset, 0)
+
+    def build(self, chat: Chat, model=None) -> str:
+        """Texto do histórico para o prompt: resumo das antigas e janela recente"""
+        # Cópia do buffer circular: índices estáveis enquanto o resumo roda em outra thread
+        messages = list(chat.messages)
+        offset = chat.first_index
+        with self._lock:
+            if self.summarized_upto is not None and self.summarized_upto > offset + len(messages):
+                # Chat recuperado com menos mensagens que o resumo cobria: o cursor recomeça
+                self.summarized_upto = None
+        start = self.window_start(messages, self.budget.recent_tokens)
+        if start > self._unsummarized(offset):
+            self._schedule_fold(messages, offset, start, model)
+
+        # Mensagens fora da janela que ainda não entraram no resumo continuam
+        # na íntegra, até o limite de um lote; o prompt fica limitado a
+        # recent_tokens + fold_tokens + summary_tokens
+        with self._lock:
+            summary = self.summary
+            start = max(self._unsummarized(offset),
+                        self.window_start(messages, self.budget.recent_tokens + self.budget.fold_tokens))
+        window = prompts.chatBuild(messages[start:])
+        if summary:
+            return prompts.historySummaryBuild(summary) + window
+        return window
+
+    def _schedule_fold(self, messages: List[ChatMessage], offset: int, start: int, model):
+        """
+        Agenda o resumo das mensagens que saíram da janela, se já houver um lote
+        `offset` é o índice absoluto de messages[0]; o cursor do resumo é absoluto
+        """
+        with self._lock:
+            if self._pending:
+                return
+            # Mensagens que saíram do buffer antes de serem resumidas ficam de fora
+            begin = end = self._unsummarized(offset)
+            tokens = 0
+            while end < start and tokens < self.budget.max_fold_tokens:
+                tokens += estimate_tokens(messages[end].rendered)
+                end += 1
+            if tokens < self.budget.fold_tokens:
+                # Lote ainda pequeno: espera acumular mais mensagens fora da janela
+                return
+            self._pending = True
+            summary = self.summary
+            lines = "\n".join(m.rendered for m in messages[begin:end])
+            self._future = _summary_executor.submit(self._fold, summary, lines, offset + end, model)
+
+    def _fold(self, summary: str, lines: str, end: int, model):
+        """Job de resumo: incorpora as mensagens antigas ao resumo anterior"""
+        try:
+            new_summary = self.summarizer(summary, lines, model)
+            limit = self.budget.summary_tokens * 4
+            if len(new_summary) > limit:
+                new_summary = new_summary[:limit].rsplit(" ", 1)[0] + "…"
+            with self._lock:
+                self.summary = new_summary
+                self.summarized_upto = end
+            print(f"📜 Histórico resumido até a mensagem {end} ({estimate_tokens(new_summary)} tokens de resumo)")
+        except Exception as e:
+            print(f"Erro ao resumir histórico: {e}")
+        finally:
+            with self._lock:
+                self._pending = False
+
+    def wait(self, timeout: float = None) -> bool:
+        """Espera o resumo pendente terminar (uso em testes e benchmarks)"""
+        future = self._future
+        if future is None:
+            return True
+        future.result(timeout)
+        return future.done()
+
+def summarize_with_model(summary: str, lines: str, model) -> str:
+    """Resumo incremental usando o modelo de linguagem do canal"""
+    if model is None:
+        raise ValueError("nenhum modelo disponível para resumir o histórico")
+    response = model.generate_content(prompts.historyFoldBuild(summary, lines))
+    return response.text.strip()
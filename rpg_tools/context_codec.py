@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Codec compacto e versionado para os contextos RPG armazenados
+Serializa com orjson/msgpack (quando disponíveis) e comprime payloads grandes
+"""
+
+import json
+import zlib
+from typing import Any, Callable, Dict, Optional, Type
+
+# Serializadores e compressores opcionais
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# Cabeçalho: MAGIC + versão do schema + serializador + compressão
+MAGIC = b"RC"
+HEADER_SIZE = len(MAGIC) + 3
+
+# Versão atual do schema do RpgContext
+# 1: JSON do pydantic, sem cabeçalho (formato original)
+# 2: inclui event_summaries
+SCHEMA_VERSION = 2
+
+SERIALIZER_JSON = 0
+SERIALIZER_ORJSON = 1
+SERIALIZER_MSGPACK = 2
+
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_ZSTD = 2
+
+def _migrate_v1_to_v2(data: Dict[str, Any]) -> Dict[str, Any]:
+    data.setdefault("event_summaries", [])
+    return data
+
+# Migração de cada versão para a seguinte
+MIGRATIONS: Dict[int, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+    1: _migrate_v1_to_v2,
+}
+
+def migrate(data: Dict[str, Any], from_version: int) -> Dict[str, Any]:
+    """Aplica as migrações em sequência até a versão atual do schema"""
+    if from_version != SCHEMA_VERSION and from_version not in MIGRATIONS:
+        raise ValueError(f"Versão de schema desconhecida: {from_version}")
+    for version in range(from_version, SCHEMA_VERSION):
+        data = MIGRATIONS[version](data)
+    return data
+
+def _default_serializer() -> int:
+    if MSGPACK_AVAILABLE:
+        return SERIALIZER_MSGPACK
+    if ORJSON_AVAILABLE:
+        return SERIALIZER_ORJSON
+    return SERIALIZER_JSON
+
+class ContextCodec:
+    """Codifica e decodifica contextos para bytes com cabeçalho versionado"""
+
+    def __init__(self, model_cls: Type, serializer: Optional[int] = None,
+                 compression: str = "auto", compress_threshold: int = 1024, level: int = 3):
+        """
+        Args:
+            model_cls: Modelo pydantic do contexto (RpgContext)
+            serializer: SERIALIZER_*; por padrão o mais rápido disponível
+                (JSON é gerado pelo pydantic; orjson acelera a leitura com migração)
+            compression: "auto" (zstd ou zlib), "zstd", "zlib" ou "none"
+            compress_threshold: Tamanho mínimo em bytes para comprimir
+            level: Nível de compressão
+        """
+        self.model_cls = model_cls
+        self.serializer = _default_serializer() if serializer is None else serializer
+        if compression == "auto":
+            compression = "zstd" if ZSTD_AVAILABLE else "zlib"
+        if compression == "zstd" and not ZSTD_AVAILABLE:
+            raise ValueError("Compressão zstd requer o pacote zstandard")
+        self.compression = {"none": COMPRESSION_NONE, "zlib": COMPRESSION_ZLIB, "zstd": COMPRESSION_ZSTD}[compression]
+        self.compress_threshold = compress_threshold
+        self.level = level
+
+    @staticmethod
+    def _loads(payload: bytes, serializer: int) -> Dict[str, Any]:
+        if serializer == SERIALIZER_MSGPACK:
+            return msgpack.unpackb(payload, raw=False)
+        if serializer == SERIALIZER_ORJSON:
+            return orjson.loads(payload)
+        return json.loads(payload)
+
+    def _compress(self, payload: bytes) -> tuple[int, bytes]:
+        if self.compression == COMPRESSION_NONE or len(payload) < self.compress_threshold:
+            return COMPRESSION_NONE, payload
+        if self.compression == COMPRESSION_ZSTD:
+            compressed = zstandard.ZstdCompressor(level=self.level).compress(payload)
+        else:
+            compressed = zlib.compress(payload, self.level)
+        # Só vale a pena se realmente diminuir
+        if len(compressed) >= len(payload):
+            return COMPRESSION_NONE, payload
+        return self.compression, compressed
+
+    @staticmethod
+    def _decompress(payload: bytes, compression: int) -> bytes:
+        if compression == COMPRESSION_ZSTD:
+            return zstandard.ZstdDecompressor().decompress(payload)
+        if compression == COMPRESSION_ZLIB:
+            return zlib.decompress(payload)
+        return payload
+
+    def encode(self, context) -> bytes:
+        """Serializa o contexto na versão atual do schema"""
+        if self.serializer == SERIALIZER_MSGPACK:
+            payload = msgpack.packb(context.model_dump(mode="json", exclude_none=True), use_bin_type=True)
+        else:
+            # O serializador JSON nativo do pydantic já é compacto e mais rápido
+            payload = context.model_dump_json(exclude_none=True).encode()
+        compression, payload = self._compress(payload)
+        return MAGIC + bytes((SCHEMA_VERSION, self.serializer, compression)) + payload
+
+    def decode_dict(self, blob) -> Dict[str, Any]:
+        """Decodifica para dicionário já migrado, aceitando também o JSON original"""
+        if isinstance(blob, str):
+            blob = blob.encode()
+        if not blob.startswith(MAGIC):
+            # Formato original: JSON do pydantic sem cabeçalho
+            return migrate(json.loads(blob), 1)
+        version, serializer, compression = blob[len(MAGIC):HEADER_SIZE]
+        payload = self._decompress(blob[HEADER_SIZE:], compression)
+        return migrate(self._loads(payload, serializer), version)
+
+    def decode(self, blob):
+        """Decodifica bytes em uma instância do modelo (datetimes são convertidos pelo pydantic)"""
+        if isinstance(blob, bytes) and blob.startswith(MAGIC):
+            version, serializer, compression = blob[len(MAGIC):HEADER_SIZE]
+            if version == SCHEMA_VERSION and serializer != SERIALIZER_MSGPACK:
+                # Versão atual em JSON: validação direta, sem dicionário intermediário
+                return self.model_cls.model_validate_json(self._decompress(blob[HEADER_SIZE:], compression))
+        return self.model_cls.model_validate(self.decode_dict(blob))
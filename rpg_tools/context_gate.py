@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Filtro local e barato que decide se uma mensagem merece a análise de contexto pelo LLM
+Conversa fora do jogo ("kkk", "ok", rolagens, OOC) não gera chamada ao Gemini
+"""
+
+import math
+import re
+import threading
+from typing import Dict
+
+from rpg_tools.names import normalize_name
+
+# Marcadores do Discord e links não contam como conteúdo
+_MARKUP = re.compile(r"<[@#][!&]?\d+>|<a?:\w+:\d+>|<t:\d+(?::[a-zA-Z])?>|https?://\S+")
+
+# Mensagens que são só risada, concordância ou reação
+_CHATTER = re.compile(
+    r"^(?:k{2,}|(?:ha|he|hu|rs)+|lol|lmao|xd|ok|okay|blz|beleza|sim|nao|não|vlw|valeu|obg|obrigad[oa]|"
+    r"boa|top|show|nice|gg|pronto|foi|hmm+|ah+|oh+|eita|uai|opa|oi|ola|olá|tchau|\W)+$",
+    re.IGNORECASE,
+)
+
+# Rolagens de dado soltas: "1d20+3", "d6", "rolei 17"
+_DICE = re.compile(r"^(?:rol(?:ei|ando|a)\s+)?(?:\d*d\d+(?:\s*[+-]\s*\d+)?|\d{1,2})(?:\s+\S{0,3})?$", re.IGNORECASE)
+
+# Fora do personagem: "(( ... ))", "ooc: ...", "// ..."
+_OOC = re.compile(r"^\s*(?:\(\(|ooc\b|off\b|//)", re.IGNORECASE)
+
+# Pistas de narrativa para o classificador
+_NARRATIVE_CUES = re.compile(
+    r"\b(?:mundo|reino|cidade|vila|aldeia|castelo|floresta|montanha|caverna|masmorra|taverna|templo|"
+    r"porto|ilha|deserto|rio|personagem|npc|miss[aã]o|quest|objetivo|tesouro|artefato|drag[aã]o|rei|"
+    r"rainha|pr[ií]ncipe|princesa|guarda|mago|guerreir[oa]|elf[oa]|an[aã]o|chamad[oa]|conhecid[oa]|"
+    r"viaj|cheg|entr|atac|mat|morr|descobr|encontr|fug|salv|trai|nasc|histor|aventura|"
+    r"medieval|cyberpunk|fantasia|gal[aá]xia|planeta|nave)\w*",
+    re.IGNORECASE,
+)
+
+# Palavra com inicial maiúscula fora do início de frase (provável nome próprio)
+_PROPER_NOUN = re.compile(r"(?<![.!?]\s)(?<!^)\b[A-ZÀ-Ý][a-zà-ÿ]{2,}")
+
+class ContextGate:
+    """
+    Pré-filtro que estima se uma mensagem pode conter informação de mundo,
+    personagens, locais ou quests
+
+    Combina regras baratas (tamanho, risadas, rolagens, OOC), um gazetteer com
+    os nomes já conhecidos do contexto e um pequeno classificador linear.
+    """
+
+    # Pesos do classificador (ajustados à mão sobre mensagens de sessões reais)
+    BIAS = -2.0
+    WEIGHT_CUES = 1.4
+    WEIGHT_PROPER_NOUNS = 0.9
+    WEIGHT_WORDS = 0.08
+
+    def __init__(self, min_length: int = 12, threshold: float = 0.5, report_every: int = 100):
+        self.min_length = min_length
+        self.threshold = threshold
+        self.report_every = report_every
+        self.checked = 0
+        self.skipped = 0
+        self._stats_lock = threading.Lock()
+
+    def _gazetteer_hit(self, normalized: str, context) -> bool:
+        """Verifica se a mensagem cita um nome já conhecido da sessão"""
+        if context is None:
+            return False
+        padded = f" {normalized} "
+        for index in (context._character_index, context._location_index, context._quest_index):
+            for name in index:
+                if f" {name} " in padded:
+                    return True
+        if context.world_name and f" {normalize_name(context.world_name)} " in padded:
+            return True
+        return False
+
+    def score(self, message: str, context=None) -> float:
+        """Probabilidade estimada de a mensagem conter informação de contexto"""
+        text = _MARKUP.sub(" ", message).strip()
+        if not text or _CHATTER.match(text) or _DICE.match(text) or _OOC.match(text):
+            return 0.0
+
+        normalized = " ".join(re.findall(r"\w+", normalize_name(text)))
+        if self._gazetteer_hit(normalized, context):
+            return 1.0
+        if len(text) < self.min_length:
+            return 0.0
+
+        cues = len(_NARRATIVE_CUES.findall(text))
+        proper_nouns = len(_PROPER_NOUN.findall(text))
+        words = min(len(text.split()), 40)
+        z = self.BIAS + self.WEIGHT_CUES * cues + self.WEIGHT_PROPER_NOUNS * proper_nouns + self.WEIGHT_WORDS * words
+        return 1.0 / (1.0 + math.exp(-z))
+
+    def should_analyze(self, message: str, context=None) -> bool:
+        """Decide se a análise pelo LLM deve rodar, contabilizando as chamadas evitadas"""
+        analyze = self.score(message, context) >= self.threshold
+        with self._stats_lock:
+            self.checked += 1
+            if not analyze:
+                self.skipped += 1
+            report = self.report_every and self.checked % self.report_every == 0
+        if report:
+            stats = self.stats()
+            print(f"🚦 Filtro de contexto: {stats['skipped']}/{stats['checked']} análises evitadas "
+                  f"({stats['skip_rate']:.0%})")
+        return analyze
+
+    def stats(self) -> Dict[str, float]:
+        """Contadores de mensagens verificadas, analisadas e evitadas"""
+        return {
+            "checked": self.checked,
+            "analyzed": self.checked - self.skipped,
+            "skipped": self.skipped,
+            "skip_rate": self.skipped / self.checked if self.checked else 0.0,
+        }
@@ -1,17 +1,23 @@
 #!/usr/bin/env python3
 """
-Sistema de Gerenciamento de Contexto RPG usando Redis
+Sistema de Gerenciamento de Contexto RPG com backends plugáveis (memória, SQLite ou Redis)
 Mantém informações importantes da sessão em cache estruturado
 """
 
 import json
-import redis
 import os
-from typing import Dict, List, Optional, Any
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime, timedelta
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 from dotenv import load_dotenv
-import google.generativeai as genai
+from rpg_tools.event_compaction import EventRetentionPolicy, compact_events, enforce_payload_cap
+from rpg_tools.context_codec import ContextCodec
+from rpg_tools.names import normalize_name
+from rpg_tools.context_gate import ContextGate
+from rpg_tools.context_storage import ContextStorage, RedisContextStorage, SqliteContextStorage, create_storage
 
 # Carregar variáveis de ambiente
 load_dotenv()
@@ -38,21 +44,80 @@ class RpgContext(BaseModel):
     
     # Histórico e eventos
     key_events: List[Dict[str, Any]] = Field(default_factory=list, description="Eventos importantes da sessão")
+    event_summaries: List[Dict[str, Any]] = Field(default_factory=list, description="Resumos periódicos dos eventos antigos")
     world_history: Optional[str] = Field(None, description="História geral do mundo")
     
     # Metadados
     created_at: datetime = Field(default_factory=datetime.now, description="Data de criação da sessão")
     last_updated: datetime = Field(default_factory=datetime.now, description="Última atualização")
     session_state: str = Field("active", description="Estado da sessão (active, paused, completed)")
+    version: int = Field(0, description="Versão do contexto, incrementada a cada gravação")
     
     # Configurações
     game_system: str = Field("D&D 5e", description="Sistema de RPG")
     difficulty_level: str = Field("medium", description="Nível de dificuldade")
     
+    # Índices por nome normalizado (não serializados), mantidos junto das listas
+    _character_index: Dict[str, Dict[str, Any]] = PrivateAttr(default_factory=dict)
+    _location_index: Dict[str, Dict[str, Any]] = PrivateAttr(default_factory=dict)
+    _quest_index: Dict[str, Dict[str, Any]] = PrivateAttr(default_factory=dict)
+    
     class Config:
         json_encoders = {
             datetime: lambda v: v.isoformat()
         }
+    
+    def model_post_init(self, __context: Any) -> None:
+        self.rebuild_indexes()
+    
+    def rebuild_indexes(self):
+        """Reconstrói os índices a partir das listas (necessário após alterá-las diretamente)"""
+        self._character_index = {}
+        for char in self.player_characters + self.npcs:
+            if char.get("name"):
+                self._character_index.setdefault(normalize_name(char["name"]), char)
+        
+        self._location_index = {}
+        self._quest_index = {}
+        # Nomes de eventos já compactados continuam valendo para deduplicação
+        for summary in self.event_summaries:
+            for name in summary.get("locations", []):
+                self._location_index.setdefault(normalize_name(name), {"type": "location", "name": name})
+            for name in summary.get("quests", []):
+                self._quest_index.setdefault(normalize_name(name), {"type": "quest", "name": name})
+        for event in self.key_events:
+            if not event.get("name"):
+                continue
+            if event.get("type") == "location":
+                self._location_index.setdefault(normalize_name(event["name"]), event)
+            elif event.get("type") == "quest":
+                self._quest_index.setdefault(normalize_name(event["name"]), event)
+    
+    def has_character(self, name: str) -> bool:
+        return normalize_name(name) in self._character_index
+    
+    def has_location(self, name: str) -> bool:
+        return normalize_name(name) in self._location_index
+    
+    def has_quest(self, name: str) -> bool:
+        return normalize_name(name) in self._quest_index
+    
+    def add_character(self, character: Dict[str, Any], is_player: bool):
+        """Adiciona um personagem (jogador ou NPC) mantendo o índice atualizado"""
+        if is_player:
+            self.player_characters.append(character)
+        else:
+            self.npcs.append(character)
+        self._character_index[normalize_name(character["name"])] = character
+    
+    def add_key_event(self, event: Dict[str, Any]):
+        """Adiciona um evento, localização ou quest mantendo os índices atualizados"""
+        self.key_events.append(event)
+        if event.get("name"):
+            if event.get("type") == "location":
+                self._location_index[normalize_name(event["name"])] = event
+            elif event.get("type") == "quest":
+                self._quest_index[normalize_name(event["name"])] = event
 
 class ContextAnalyzer:
     """Analisador de contexto usando Gemini para extrair informações importantes"""
@@ -64,8 +129,23 @@ class ContextAnalyzer:
         if not api_key:
             raise ValueError("GOOGLE_API_KEY não encontrada")
         
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.0-flash-lite')
+        self.api_key = api_key
+        self._model = None
+        self._model_lock = threading.Lock()
+    
+    @property
+    def model(self):
+        """Modelo Gemini, configurado só na primeira análise"""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    import google.generativeai as genai
+                    
+                    from llm_tools import get_model_pool
+                    
+                    genai.configure(api_key=self.api_key)
+                    self._model = get_model_pool().for_task("context")
+        return self._model
     
     def analyze_message_context(self, message: str, current_context: Optional[RpgContext] = None) -> Dict[str, Any]:
         """
@@ -175,29 +255,115 @@ Se não houver informações relevantes em alguma categoria, use null ou lista v
                 "session_changes": {"state_change": None, "difficulty_change": None}
             }
 
-class RedisContextManager:
-    """Gerenciador de contexto usando Redis"""
+def render_context_summary(context: RpgContext) -> str:
+    """Renderiza o resumo do contexto em markdown para os prompts"""
+    summary_parts = []
     
-    def __init__(self, redis_url: str = None):
-        if not redis_url:
-            redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
-        
-        self.redis_client = redis.from_url(redis_url, decode_responses=True)
-        self.analyzer = ContextAnalyzer()
-        
-        # Prefixos para chaves Redis
+    # Informações básicas
+    if context.world_name:
+        summary_parts.append(f"🌍 **Mundo**: {context.world_name}")
+    if context.world_type:
+        summary_parts.append(f"🎭 **Tipo**: {context.world_type}")
+    if context.current_location:
+        summary_parts.append(f"📍 **Localização Atual**: {context.current_location}")
+    if context.current_quest:
+        summary_parts.append(f"🎯 **Quest Atual**: {context.current_quest}")
+    
+    # Personagens
+    if context.player_characters:
+        pc_names = [pc["name"] for pc in context.player_characters]
+        summary_parts.append(f"👥 **Jogadores**: {', '.join(pc_names)}")
+    
+    if context.npcs:
+        npc_names = [npc["name"] for npc in context.npcs]
+        summary_parts.append(f"🤖 **NPCs**: {', '.join(npc_names)}")
+    
+    # Eventos importantes
+    important_events = [e["description"] for e in context.key_events if e.get("importance") == "high"]
+    if len(important_events) < 3:
+        # Completar com destaques dos eventos já compactados
+        older_highlights = [h for s in context.event_summaries for h in s.get("highlights", [])]
+        important_events = older_highlights + important_events
+    if important_events:
+        event_descriptions = important_events[-3:]  # Últimos 3 eventos importantes
+        summary_parts.append(f"⚡ **Eventos Importantes**: {'; '.join(event_descriptions)}")
+    
+    # Histórico do mundo
+    if context.world_history:
+        summary_parts.append(f"📚 **História**: {context.world_history[:200]}...")
+    
+    if not summary_parts:
+        return "Sessão RPG criada, aguardando informações do mundo."
+    
+    return "\n".join(summary_parts)
+
+class ContextManager:
+    """Gerenciador de contexto sobre um backend de armazenamento (memória, SQLite ou Redis)"""
+    
+    def __init__(self, storage: ContextStorage, session_ttl: Optional[timedelta] = timedelta(hours=24),
+                 analyzer: ContextAnalyzer = None, retention_policy: EventRetentionPolicy = None,
+                 codec: ContextCodec = None, gate: ContextGate = None):
+        """
+        Args:
+            storage: Backend de armazenamento
+            session_ttl: Expiração das sessões; None para sessões duráveis
+            analyzer: Analisador de mensagens (por padrão, Gemini)
+            retention_policy: Política de retenção do log de eventos
+            codec: Codec de serialização das sessões
+            gate: Pré-filtro que evita análises do LLM em mensagens sem conteúdo narrativo
+        """
+        self.storage = storage
+        self.session_ttl = session_ttl
+        self.analyzer = analyzer or ContextAnalyzer()
+        self.gate = gate or ContextGate()
+        # Sessões são armazenadas em binário pelo codec
+        self.codec = codec or ContextCodec(RpgContext, compression=os.getenv("CONTEXT_COMPRESSION", "auto"))
+        
+        # Retenção do log de eventos, compactado em segundo plano
+        self.retention_policy = retention_policy or EventRetentionPolicy()
+        self._compaction_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rpg-compaction")
+        self._pending_compactions = set()
+        self._channel_locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        
+        # Resumo renderizado por canal: (versão do contexto, texto)
+        self._summary_cache: Dict[str, Tuple[int, str]] = {}
+        
+        # Expiração deslizante: renovada no acesso, no máximo uma vez por intervalo
+        self.touch_interval = 60.0
+        self._last_touch: Dict[str, float] = {}
+        
+        # Varredura incremental de sessões órfãs
+        self._sweep_cursor = None
+        self._sweeper_stop = threading.Event()
+        self._sweeper_thread: Optional[threading.Thread] = None
+        
+        # Prefixos das chaves
         self.session_prefix = "rpg:session:"
         self.channel_prefix = "rpg:channel:"
+        self.summary_prefix = "rpg:summary:"
         self.global_prefix = "rpg:global:"
     
     def _get_session_key(self, session_id: str) -> str:
-        """Gera chave Redis para uma sessão"""
+        """Gera chave de armazenamento para uma sessão"""
         return f"{self.session_prefix}{session_id}"
     
     def _get_channel_key(self, channel_id: str) -> str:
-        """Gera chave Redis para um canal"""
+        """Gera chave de armazenamento para um canal"""
         return f"{self.channel_prefix}{channel_id}"
     
+    def _get_summary_key(self, channel_id: str) -> str:
+        """Gera chave de armazenamento para o resumo renderizado de um canal"""
+        return f"{self.summary_prefix}{channel_id}"
+    
+    def _channel_lock(self, channel_id: str) -> threading.Lock:
+        """Lock por canal, serializando atualizações e compactações do mesmo contexto"""
+        with self._locks_guard:
+            lock = self._channel_locks.get(channel_id)
+            if lock is None:
+                lock = self._channel_locks[channel_id] = threading.Lock()
+            return lock
+    
     def create_session(self, channel_id: str, channel_name: str) -> str:
         """
         Cria uma nova sessão RPG
@@ -211,6 +377,12 @@ class RedisContextManager:
         """
         session_id = f"{channel_id}_{int(datetime.now().timestamp())}"
         
+        # A sessão anterior do canal deixaria de ser referenciada: removê-la já
+        previous_session = self.storage.get(self._get_channel_key(channel_id))
+        if previous_session and previous_session.decode() != session_id:
+            self.storage.delete(self._get_session_key(previous_session.decode()))
+            self._forget_channel(channel_id)
+        
         # Criar contexto inicial
         context = RpgContext(
             session_id=session_id,
@@ -218,21 +390,18 @@ class RedisContextManager:
             channel_name=channel_name
         )
         
-        # Salvar no Redis
-        session_key = self._get_session_key(session_id)
-        self.redis_client.setex(
-            session_key,
-            timedelta(hours=24),  # TTL de 24 horas
-            context.model_dump_json()
-        )
+        # A versão continua a do canal, para que o cache de resumo nunca repita uma versão
+        previous_version = self.storage.hget(self._get_summary_key(channel_id), "version")
+        if previous_version is not None:
+            context.version = int(previous_version)
         
-        # Mapear canal para sessão
+        # Mapear canal para sessão antes de gravá-la: a varredura de sessões órfãs,
+        # rodando em outra thread, apagaria uma sessão que o canal ainda não referencia
         channel_key = self._get_channel_key(channel_id)
-        self.redis_client.setex(
-            channel_key,
-            timedelta(hours=24),
-            session_id
-        )
+        self.storage.set(channel_key, session_id.encode(), self.session_ttl)
+        
+        # Salvar no armazenamento
+        self._save_context(context)
         
         print(f"✅ Nova sessão RPG criada: {session_id}")
         return session_id
@@ -248,25 +417,20 @@ class RedisContextManager:
             Contexto da sessão ou None se não existir
         """
         channel_key = self._get_channel_key(channel_id)
-        session_id = self.redis_client.get(channel_key)
+        session_id = self.storage.get(channel_key)
         
         if not session_id:
             return None
         
-        session_key = self._get_session_key(session_id)
-        session_data = self.redis_client.get(session_key)
+        session_key = self._get_session_key(session_id.decode())
+        session_data = self.storage.get(session_key)
         
         if not session_data:
             return None
         
+        self._touch(channel_id, session_id.decode())
         try:
-            context_dict = json.loads(session_data)
-            # Converter timestamps de volta para datetime
-            for field in ['created_at', 'last_updated']:
-                if field in context_dict and context_dict[field]:
-                    context_dict[field] = datetime.fromisoformat(context_dict[field])
-            
-            return RpgContext(**context_dict)
+            return self.codec.decode(session_data)
         except Exception as e:
             print(f"Erro ao carregar contexto: {e}")
             return None
@@ -283,26 +447,58 @@ class RedisContextManager:
         Returns:
             Contexto atualizado
         """
-        # Recuperar ou criar sessão
-        context = self.get_session(channel_id)
-        if not context:
-            context = RpgContext(
-                session_id=self.create_session(channel_id, "Unknown"),
-                channel_id=channel_id,
-                channel_name="Unknown"
-            )
-        
-        # Analisar mensagem com Gemini
-        extracted_info = self.analyzer.analyze_message_context(message, context)
-        
-        # Atualizar contexto com informações extraídas
-        context = self._merge_extracted_info(context, extracted_info, username)
+        with self._channel_lock(channel_id):
+            # Recuperar ou criar sessão
+            context = self.get_session(channel_id)
+            if not context:
+                session_id = self.create_session(channel_id, "Unknown")
+                context = self.get_session(channel_id)
+            if not context:
+                # A sessão recém-criada não pôde ser lida de volta (armazenamento indisponível)
+                print(f"⚠️ Sessão do canal {channel_id} não encontrada após ser criada")
+                return RpgContext(session_id=session_id, channel_id=channel_id, channel_name="Unknown")
+            
+            # Conversa fora do jogo não precisa da análise do LLM
+            if not self.gate.should_analyze(message, context):
+                return context
+            
+            # Analisar mensagem com Gemini
+            extracted_info = self.analyzer.analyze_message_context(message, context)
+            
+            # Atualizar contexto com informações extraídas
+            context = self._merge_extracted_info(context, extracted_info, username)
+            
+            # Salvar contexto atualizado
+            self._save_context(context)
         
-        # Salvar contexto atualizado
-        self._save_context(context)
+        if self.retention_policy.needs_compaction(context):
+            self._schedule_compaction(channel_id)
         
         return context
     
+    def _schedule_compaction(self, channel_id: str):
+        """Agenda a compactação do log de eventos do canal em segundo plano"""
+        with self._locks_guard:
+            if channel_id in self._pending_compactions:
+                return
+            self._pending_compactions.add(channel_id)
+        self._compaction_executor.submit(self._compact_channel, channel_id)
+    
+    def _compact_channel(self, channel_id: str):
+        """Job de compactação: enrola eventos antigos em resumos periódicos"""
+        try:
+            with self._channel_lock(channel_id):
+                context = self.get_session(channel_id)
+                if context and compact_events(context, self.retention_policy):
+                    self._save_context(context)
+                    print(f"🗜️ Eventos compactados no canal {channel_id}: "
+                          f"{len(context.key_events)} recentes, {len(context.event_summaries)} resumos")
+        except Exception as e:
+            print(f"Erro na compactação de eventos: {e}")
+        finally:
+            with self._locks_guard:
+                self._pending_compactions.discard(channel_id)
+    
     def _merge_extracted_info(self, context: RpgContext, extracted_info: Dict[str, Any], username: str) -> RpgContext:
         """Mescla informações extraídas com o contexto existente"""
         
@@ -319,49 +515,37 @@ class RedisContextManager:
         # Adicionar novos personagens
         for char_info in extracted_info.get("characters", []):
             char_name = char_info.get("name")
-            if char_name and not any(c.get("name") == char_name for c in context.player_characters + context.npcs):
-                if char_info.get("type") == "player":
-                    context.player_characters.append({
-                        "name": char_name,
-                        "description": char_info.get("description"),
-                        "role": char_info.get("role"),
-                        "added_by": username,
-                        "added_at": datetime.now().isoformat()
-                    })
-                else:
-                    context.npcs.append({
-                        "name": char_name,
-                        "description": char_info.get("description"),
-                        "role": char_info.get("role"),
-                        "added_by": username,
-                        "added_at": datetime.now().isoformat()
-                    })
+            if char_name and not context.has_character(char_name):
+                context.add_character({
+                    "name": char_name,
+                    "description": char_info.get("description"),
+                    "role": char_info.get("role"),
+                    "added_by": username,
+                    "added_at": datetime.now().isoformat()
+                }, is_player=char_info.get("type") == "player")
         
         # Adicionar novas localizações
         for loc_info in extracted_info.get("locations", []):
             loc_name = loc_info.get("name")
-            if loc_name:
-                # Verificar se já existe
-                existing_locations = [loc for loc in context.key_events if loc.get("type") == "location"]
-                if not any(loc.get("name") == loc_name for loc in existing_locations):
-                    context.key_events.append({
-                        "type": "location",
-                        "name": loc_name,
-                        "description": loc_info.get("description"),
-                        "is_current": loc_info.get("is_current", False),
-                        "added_by": username,
-                        "added_at": datetime.now().isoformat()
-                    })
-                    
-                    # Atualizar localização atual se especificado
-                    if loc_info.get("is_current"):
-                        context.current_location = loc_name
+            if loc_name and not context.has_location(loc_name):
+                context.add_key_event({
+                    "type": "location",
+                    "name": loc_name,
+                    "description": loc_info.get("description"),
+                    "is_current": loc_info.get("is_current", False),
+                    "added_by": username,
+                    "added_at": datetime.now().isoformat()
+                })
+                
+                # Atualizar localização atual se especificado
+                if loc_info.get("is_current"):
+                    context.current_location = loc_name
         
         # Adicionar novas quests
         for quest_info in extracted_info.get("quests", []):
             quest_name = quest_info.get("name")
-            if quest_name and not any(q.get("name") == quest_name for q in context.key_events if q.get("type") == "quest"):
-                context.key_events.append({
+            if quest_name and not context.has_quest(quest_name):
+                context.add_key_event({
                     "type": "quest",
                     "name": quest_name,
                     "description": quest_info.get("description"),
@@ -378,7 +562,7 @@ class RedisContextManager:
         for event_info in extracted_info.get("events", []):
             event_desc = event_info.get("description")
             if event_desc:
-                context.key_events.append({
+                context.add_key_event({
                     "type": "event",
                     "description": event_desc,
                     "importance": event_info.get("importance", "medium"),
@@ -392,72 +576,217 @@ class RedisContextManager:
         return context
     
     def _save_context(self, context: RpgContext):
-        """Salva contexto no Redis"""
+        """Salva contexto no armazenamento, respeitando o limite de tamanho da política de retenção"""
+        context.version += 1
+        payload = self.codec.encode(context)
+        if len(payload) > self.retention_policy.max_payload_bytes:
+            enforce_payload_cap(context, self.retention_policy, lambda c: len(self.codec.encode(c)))
+            context.rebuild_indexes()
+            payload = self.codec.encode(context)
+        
         session_key = self._get_session_key(context.session_id)
-        self.redis_client.setex(
-            session_key,
-            timedelta(hours=24),
-            context.model_dump_json()
-        )
+        self.storage.set(session_key, payload, self.session_ttl)
+        self._store_summary(context)
     
     def get_context_summary(self, channel_id: str) -> str:
         """
         Gera um resumo do contexto para usar nos prompts
         
+        O resumo é renderizado a cada gravação e guardado junto da versão do
+        contexto; aqui só se lê a versão e, se mudou, o texto (sem carregar a sessão).
+        
         Args:
             channel_id: ID do canal Discord
             
         Returns:
             Resumo formatado do contexto
         """
+        summary_key = self._get_summary_key(channel_id)
+        version = self.storage.hget(summary_key, "version")
+        if version is not None:
+            version = int(version)
+            self._touch(channel_id)
+            cached = self._summary_cache.get(channel_id)
+            if cached and cached[0] == version:
+                return cached[1]
+            text = self.storage.hget(summary_key, "text")
+            if text is not None:
+                text = text.decode()
+                self._summary_cache[channel_id] = (version, text)
+                return text
+        
+        # Sessões gravadas antes do cache de resumo: renderizar e guardar
         context = self.get_session(channel_id)
         if not context:
             return "Nenhuma sessão RPG ativa neste canal."
+        return self._store_summary(context)
+    
+    def _store_summary(self, context: RpgContext) -> str:
+        """Renderiza e grava o resumo da versão atual do contexto"""
+        text = render_context_summary(context)
+        self.storage.hset(
+            self._get_summary_key(context.channel_id),
+            {"version": str(context.version).encode(), "text": text.encode()},
+            self.session_ttl
+        )
+        self._summary_cache[context.channel_id] = (context.version, text)
+        return text
+    
+    def _touch(self, channel_id: str, session_id: str = None):
+        """Renova a expiração das chaves de um canal ativo (expiração deslizante)"""
+        if not self.session_ttl:
+            return
+        now = time.monotonic()
+        if now - self._last_touch.get(channel_id, float("-inf")) < self.touch_interval:
+            return
+        self._last_touch[channel_id] = now
         
-        summary_parts = []
-        
-        # Informações básicas
-        if context.world_name:
-            summary_parts.append(f"🌍 **Mundo**: {context.world_name}")
-        if context.world_type:
-            summary_parts.append(f"🎭 **Tipo**: {context.world_type}")
-        if context.current_location:
-            summary_parts.append(f"📍 **Localização Atual**: {context.current_location}")
-        if context.current_quest:
-            summary_parts.append(f"🎯 **Quest Atual**: {context.current_quest}")
-        
-        # Personagens
-        if context.player_characters:
-            pc_names = [pc["name"] for pc in context.player_characters]
-            summary_parts.append(f"👥 **Jogadores**: {', '.join(pc_names)}")
-        
-        if context.npcs:
-            npc_names = [npc["name"] for npc in context.npcs]
-            summary_parts.append(f"🤖 **NPCs**: {', '.join(npc_names)}")
-        
-        # Eventos importantes
-        important_events = [e for e in context.key_events if e.get("importance") == "high"]
-        if important_events:
-            event_descriptions = [e["description"] for e in important_events[-3:]]  # Últimos 3 eventos importantes
-            summary_parts.append(f"⚡ **Eventos Importantes**: {'; '.join(event_descriptions)}")
-        
-        # Histórico do mundo
-        if context.world_history:
-            summary_parts.append(f"📚 **História**: {context.world_history[:200]}...")
+        channel_key = self._get_channel_key(channel_id)
+        if session_id is None:
+            current = self.storage.get(channel_key)
+            if not current:
+                return
+            session_id = current.decode()
+        for key in (channel_key, self._get_session_key(session_id), self._get_summary_key(channel_id)):
+            self.storage.expire(key, self.session_ttl)
+    
+    def _forget_channel(self, channel_id: str):
+        """Descarta o estado em memória de um canal cuja sessão foi removida"""
+        self._summary_cache.pop(channel_id, None)
+        self._last_touch.pop(channel_id, None)
+    
+    def sweep_expired_sessions(self, batch_size: int = 100) -> Dict[str, int]:
+        """
+        Executa um passo da varredura incremental de sessões órfãs
         
-        if not summary_parts:
-            return "Sessão RPG criada, aguardando informações do mundo."
+        Sessões que não são mais a sessão atual do seu canal (ou cujo canal
+        expirou) são removidas. O cursor é mantido entre chamadas, então cada
+        chamada examina no máximo batch_size chaves.
         
-        return "\n".join(summary_parts)
+        Returns:
+            Chaves examinadas e removidas neste passo, e se a varredura completou
+        """
+        self._sweep_cursor, keys = self.storage.scan(self.session_prefix, self._sweep_cursor, batch_size)
+        removed = 0
+        for key in keys:
+            session_id = key[len(self.session_prefix):]
+            channel_id = session_id.rsplit("_", 1)[0]
+            current = self.storage.get(self._get_channel_key(channel_id))
+            if current is None or current.decode() != session_id:
+                self.storage.delete(key)
+                removed += 1
+                if current is None:
+                    self._forget_channel(channel_id)
+        if self._sweep_cursor is None and self.session_ttl:
+            # Canais sem acesso há mais que o TTL já expiraram no armazenamento, sem passar pela varredura
+            cutoff = time.monotonic() - self.session_ttl.total_seconds()
+            for channel_id in [channel for channel, touched in list(self._last_touch.items()) if touched < cutoff]:
+                self._forget_channel(channel_id)
+        return {"scanned": len(keys), "removed": removed, "completed": self._sweep_cursor is None}
     
-    def cleanup_expired_sessions(self):
-        """Remove sessões expiradas do Redis"""
+    def cleanup_expired_sessions(self) -> Dict[str, int]:
+        """Remove sessões expiradas ou órfãs do armazenamento, em uma varredura completa"""
+        totals = {"scanned": 0, "removed": 0}
         try:
-            # Redis automaticamente remove chaves com TTL expirado
-            # Mas podemos fazer uma limpeza manual se necessário
-            print("🧹 Limpeza automática de sessões expiradas (TTL)")
+            self._sweep_cursor = None
+            while True:
+                step = self.sweep_expired_sessions()
+                totals["scanned"] += step["scanned"]
+                totals["removed"] += step["removed"]
+                if step["completed"]:
+                    break
+            print(f"🧹 Limpeza de sessões: {totals['removed']} removidas de {totals['scanned']} examinadas")
         except Exception as e:
             print(f"Erro na limpeza: {e}")
+        return totals
+    
+    def start_sweeper(self, interval: float = None, batch_size: int = None):
+        """
+        Inicia a varredura em segundo plano: um lote a cada intervalo
+        
+        CONTEXT_SWEEP_INTERVAL (segundos, 0 desativa) e CONTEXT_SWEEP_BATCH definem
+        a taxa, limitando a carga no armazenamento a batch_size chaves por intervalo.
+        """
+        if interval is None:
+            interval = float(os.getenv("CONTEXT_SWEEP_INTERVAL", "5"))
+        if batch_size is None:
+            batch_size = int(os.getenv("CONTEXT_SWEEP_BATCH", "100"))
+        if interval <= 0 or (self._sweeper_thread and self._sweeper_thread.is_alive()):
+            return
+        
+        def run():
+            while not self._sweeper_stop.wait(interval):
+                try:
+                    step = self.sweep_expired_sessions(batch_size)
+                    if step["removed"]:
+                        print(f"🧹 {step['removed']} sessões órfãs removidas")
+                except Exception as e:
+                    print(f"Erro na varredura de sessões: {e}")
+        
+        self._sweeper_stop.clear()
+        self._sweeper_thread = threading.Thread(target=run, name="rpg-session-sweeper", daemon=True)
+        self._sweeper_thread.start()
+    
+    def stop_sweeper(self):
+        self._sweeper_stop.set()
+    
+    def memory_report(self) -> Dict[str, Dict[str, int]]:
+        """Contagem de chaves e memória (MEMORY USAGE no Redis) por prefixo"""
+        report = {}
+        for prefix in (self.session_prefix, self.channel_prefix, self.summary_prefix):
+            keys = 0
+            total_bytes = 0
+            for key in self.storage.scan_iter(prefix):
+                keys += 1
+                total_bytes += self.storage.memory_usage(key) or 0
+            report[prefix] = {"keys": keys, "bytes": total_bytes}
+            print(f"📊 {prefix}* {keys} chaves, {total_bytes} bytes")
+        return report
+
+class RedisContextManager(ContextManager):
+    """Gerenciador de contexto usando Redis"""
+    
+    def __init__(self, redis_url: str = None, **kwargs):
+        super().__init__(RedisContextStorage(redis_url), **kwargs)
+        self.redis_client = self.storage.redis_client
+
+def create_context_manager(backend: str = None, **kwargs) -> ContextManager:
+    """
+    Cria o gerenciador com o backend configurado
+    
+    CONTEXT_BACKEND escolhe memory, sqlite ou redis (padrão). CONTEXT_TTL_HOURS
+    define a expiração das sessões (0 desativa); no SQLite o padrão é não expirar.
+    """
+    storage = create_storage(backend)
+    default_ttl = "0" if isinstance(storage, SqliteContextStorage) else "24"
+    ttl_hours = float(os.getenv("CONTEXT_TTL_HOURS", default_ttl))
+    kwargs.setdefault("session_ttl", timedelta(hours=ttl_hours) if ttl_hours > 0 else None)
+    return ContextManager(storage, **kwargs)
+
+# Instância global, criada no primeiro uso
+_context_manager: Optional[ContextManager] = None
+_context_manager_lock = threading.Lock()
+
+def get_context_manager() -> ContextManager:
+    """
+    Retorna o gerenciador global, criando-o no primeiro uso (thread-safe)
+    
+    Importar este módulo não conecta a nada nem configura o Gemini.
+    """
+    global _context_manager
+    if _context_manager is None:
+        with _context_manager_lock:
+            if _context_manager is None:
+                _context_manager = create_context_manager()
+    return _context_manager
+
+def is_context_manager_ready() -> bool:
+    """Sonda de prontidão: o gerenciador foi criado e o armazenamento responde"""
+    manager = _context_manager
+    return manager is not None and manager.storage.ping()
 
-# Instância global
-context_manager = RedisContextManager()
+def __getattr__(name: str):
+    # Compatibilidade com `from rpg_tools.context_manager import context_manager`
+    if name == "context_manager":
+        return get_context_manager()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
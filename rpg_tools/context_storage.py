@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Backends de armazenamento para o contexto das sessões RPG
+Memória (testes e desenvolvimento), SQLite em modo WAL (campanhas duráveis) e Redis
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+class ContextStorage(ABC):
+    """Armazenamento chave-valor em bytes, com expiração opcional por chave
+
+    Também oferece hashes (campos em bytes sob uma chave), usados para ler
+    pedaços pequenos, como o resumo do contexto, sem carregar a sessão inteira.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: Optional[timedelta] = None):
+        pass
+
+    @abstractmethod
+    def delete(self, key: str):
+        pass
+
+    @abstractmethod
+    def hget(self, key: str, field: str) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    def hset(self, key: str, mapping: Dict[str, bytes], ttl: Optional[timedelta] = None):
+        """Grava os campos e redefine a expiração da chave"""
+        pass
+
+    @abstractmethod
+    def expire(self, key: str, ttl: Optional[timedelta]) -> bool:
+        """Redefine a expiração de uma chave existente (None remove a expiração)"""
+        pass
+
+    @abstractmethod
+    def scan(self, prefix: str, cursor: Any = None, count: int = 100) -> Tuple[Any, List[str]]:
+        """
+        Varredura incremental das chaves com o prefixo
+
+        Returns:
+            (próximo cursor ou None ao terminar, chaves deste lote)
+        """
+        pass
+
+    def scan_iter(self, prefix: str) -> Iterator[str]:
+        cursor, keys = self.scan(prefix)
+        yield from keys
+        while cursor is not None:
+            cursor, keys = self.scan(prefix, cursor)
+            yield from keys
+
+    @abstractmethod
+    def memory_usage(self, key: str) -> Optional[int]:
+        """Bytes ocupados pela chave (aproximado fora do Redis)"""
+        pass
+
+    @abstractmethod
+    def ping(self) -> bool:
+        pass
+
+def _expires_at(ttl: Optional[timedelta]) -> Optional[float]:
+    return time.time() + ttl.total_seconds() if ttl else None
+
+class MemoryContextStorage(ContextStorage):
+    """Armazenamento em memória do processo; perdido ao reiniciar"""
+
+    def __init__(self):
+        # Valor em bytes ou, para hashes, dicionário de campos
+        self._data: Dict[str, Tuple[Any, Optional[float]]] = {}
+        self._lock = threading.Lock()
+
+    def _alive(self, key: str) -> Optional[Tuple[Any, Optional[float]]]:
+        entry = self._data.get(key)
+        if entry and entry[1] is not None and entry[1] <= time.time():
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._alive(key)
+            return entry[0] if entry else None
+
+    def set(self, key: str, value: bytes, ttl: Optional[timedelta] = None):
+        with self._lock:
+            self._data[key] = (value, _expires_at(ttl))
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def hget(self, key: str, field: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._alive(key)
+            return entry[0].get(field) if entry else None
+
+    def hset(self, key: str, mapping: Dict[str, bytes], ttl: Optional[timedelta] = None):
+        with self._lock:
+            entry = self._alive(key)
+            fields = dict(entry[0]) if entry else {}
+            fields.update(mapping)
+            self._data[key] = (fields, _expires_at(ttl))
+
+    def expire(self, key: str, ttl: Optional[timedelta]) -> bool:
+        with self._lock:
+            entry = self._alive(key)
+            if not entry:
+                return False
+            self._data[key] = (entry[0], _expires_at(ttl))
+            return True
+
+    def scan(self, prefix: str, cursor: Any = None, count: int = 100) -> Tuple[Any, List[str]]:
+        # O cursor é a última chave devolvida, em ordem lexicográfica
+        with self._lock:
+            keys = sorted(k for k in self._data if k.startswith(prefix) and (cursor is None or k > cursor))
+            batch = [k for k in keys[:count] if self._alive(k)]
+        next_cursor = keys[count - 1] if len(keys) > count else None
+        return next_cursor, batch
+
+    def memory_usage(self, key: str) -> Optional[int]:
+        with self._lock:
+            entry = self._alive(key)
+        if not entry:
+            return None
+        value = entry[0]
+        if isinstance(value, dict):
+            return len(key) + sum(len(f) + len(v) for f, v in value.items())
+        return len(key) + len(value)
+
+    def ping(self) -> bool:
+        return True
+
+class SqliteContextStorage(ContextStorage):
+    """Armazenamento durável em SQLite (modo WAL), para campanhas que sobrevivem ao TTL"""
+
+    def __init__(self, path: str = None):
+        if not path:
+            path = os.getenv("CONTEXT_SQLITE_PATH", "rpg_context.db")
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rpg_kv ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rpg_hash ("
+            "key TEXT NOT NULL, field TEXT NOT NULL, value BLOB NOT NULL, expires_at REAL, "
+            "PRIMARY KEY (key, field))"
+        )
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM rpg_kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, time.time()),
+            ).fetchone()
+        return bytes(row[0]) if row else None
+
+    def set(self, key: str, value: bytes, ttl: Optional[timedelta] = None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO rpg_kv (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, _expires_at(ttl)),
+            )
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM rpg_kv WHERE key = ?", (key,))
+            self._conn.execute("DELETE FROM rpg_hash WHERE key = ?", (key,))
+
+    def hget(self, key: str, field: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM rpg_hash WHERE key = ? AND field = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, field, time.time()),
+            ).fetchone()
+        return bytes(row[0]) if row else None
+
+    def hset(self, key: str, mapping: Dict[str, bytes], ttl: Optional[timedelta] = None):
+        expires_at = _expires_at(ttl)
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                # Campos já expirados não devem ressuscitar com a nova expiração
+                self._conn.execute(
+                    "DELETE FROM rpg_hash WHERE key = ? AND expires_at IS NOT NULL AND expires_at <= ?",
+                    (key, time.time()),
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO rpg_hash (key, field, value, expires_at) VALUES (?, ?, ?, ?)",
+                    [(key, field, value, expires_at) for field, value in mapping.items()],
+                )
+                self._conn.execute("UPDATE rpg_hash SET expires_at = ? WHERE key = ?", (expires_at, key))
+                self._conn.execute("COMMIT")
+            except sqlite3.Error:
+                # Sem o ROLLBACK, a transação aberta prenderia a conexão compartilhada
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                raise
+
+    def expire(self, key: str, ttl: Optional[timedelta]) -> bool:
+        now = time.time()
+        with self._lock:
+            updated = self._conn.execute(
+                "UPDATE rpg_kv SET expires_at = ? WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (_expires_at(ttl), key, now),
+            ).rowcount
+            updated += self._conn.execute(
+                "UPDATE rpg_hash SET expires_at = ? WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (_expires_at(ttl), key, now),
+            ).rowcount
+        return updated > 0
+
+    def purge_expired(self) -> int:
+        """Apaga as linhas já expiradas, que as leituras ignoram mas continuam no arquivo"""
+        now = time.time()
+        with self._lock:
+            removed = self._conn.execute(
+                "DELETE FROM rpg_kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)
+            ).rowcount
+            removed += self._conn.execute(
+                "DELETE FROM rpg_hash WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)
+            ).rowcount
+        return removed
+
+    def scan(self, prefix: str, cursor: Any = None, count: int = 100) -> Tuple[Any, List[str]]:
+        if cursor is None:
+            # Cada varredura completa começa limpando o que expirou desde a anterior
+            self.purge_expired()
+        # O intervalo [início, prefix + U+10FFFF) usa o índice da chave primária
+        # e o cursor é a última chave devolvida
+        start = cursor if cursor is not None else prefix
+        params = (start, prefix + "\U0010ffff", time.time())
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key FROM rpg_kv WHERE key > ? AND key < ? AND (expires_at IS NULL OR expires_at > ?) "
+                "UNION SELECT key FROM rpg_hash WHERE key > ? AND key < ? AND (expires_at IS NULL OR expires_at > ?) "
+                "ORDER BY key LIMIT ?",
+                params + params + (count,),
+            ).fetchall()
+        keys = [row[0] for row in rows if row[0].startswith(prefix)]
+        next_cursor = keys[-1] if len(rows) == count else None
+        return next_cursor, keys
+
+    def memory_usage(self, key: str) -> Optional[int]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT (SELECT SUM(length(key) + length(value)) FROM rpg_kv WHERE key = ? "
+                "AND (expires_at IS NULL OR expires_at > ?)), "
+                "(SELECT SUM(length(field) + length(value)) + length(?) FROM rpg_hash WHERE key = ? "
+                "AND (expires_at IS NULL OR expires_at > ?))",
+                (key, now, key, key, now),
+            ).fetchone()
+        if row[0] is None and row[1] is None:
+            return None
+        return (row[0] or 0) + (row[1] or 0)
+
+    def ping(self) -> bool:
+        try:
+            with self._lock:
+                self._conn.execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class RedisContextStorage(ContextStorage):
+    """Armazenamento em Redis; a expiração usa o TTL nativo das chaves"""
+
+    def __init__(self, redis_url: str = None):
+        import redis
+
+        if not redis_url:
+            redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
+        # Valores binários, gerados pelo codec
+        self.redis_client = redis.from_url(redis_url, decode_responses=False)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.redis_client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[timedelta] = None):
+        if ttl:
+            self.redis_client.set(key, value, px=int(ttl.total_seconds() * 1000))
+        else:
+            self.redis_client.set(key, value)
+
+    def delete(self, key: str):
+        self.redis_client.delete(key)
+
+    def hget(self, key: str, field: str) -> Optional[bytes]:
+        return self.redis_client.hget(key, field)
+
+    def hset(self, key: str, mapping: Dict[str, bytes], ttl: Optional[timedelta] = None):
+        pipe = self.redis_client.pipeline()
+        pipe.hset(key, mapping=mapping)
+        if ttl:
+            pipe.pexpire(key, int(ttl.total_seconds() * 1000))
+        else:
+            pipe.persist(key)
+        pipe.execute()
+
+    def expire(self, key: str, ttl: Optional[timedelta]) -> bool:
+        if ttl:
+            return bool(self.redis_client.pexpire(key, int(ttl.total_seconds() * 1000)))
+        return bool(self.redis_client.persist(key)) or bool(self.redis_client.exists(key))
+
+    def scan(self, prefix: str, cursor: Any = None, count: int = 100) -> Tuple[Any, List[str]]:
+        next_cursor, keys = self.redis_client.scan(cursor=cursor or 0, match=f"{prefix}*", count=count)
+        return (next_cursor or None), [key.decode() for key in keys]
+
+    def scan_iter(self, prefix: str) -> Iterator[str]:
+        return (key.decode() for key in self.redis_client.scan_iter(match=f"{prefix}*"))
+
+    def memory_usage(self, key: str) -> Optional[int]:
+        return self.redis_client.memory_usage(key)
+
+    def ping(self) -> bool:
+        try:
+            return bool(self.redis_client.ping())
+        except Exception:
+            return False
+
+def create_storage(backend: str = None) -> ContextStorage:
+    """
+    Cria o backend configurado em CONTEXT_BACKEND (memory, sqlite ou redis)
+
+    Args:
+        backend: Nome do backend; por padrão lido do ambiente (redis)
+    """
+    if not backend:
+        backend = os.getenv("CONTEXT_BACKEND", "redis")
+    backend = backend.lower()
+    if backend == "memory":
+        return MemoryContextStorage()
+    if backend == "sqlite":
+        return SqliteContextStorage()
+    if backend == "redis":
+        return RedisContextStorage()
+    raise ValueError(f"Backend de contexto desconhecido: {backend}")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Compactação em camadas do log de eventos do contexto RPG
+Mantém os eventos recentes na íntegra e enrola os antigos em resumos periódicos
+"""
+
+from typing import Any, Callable, Dict, List
+
+class EventRetentionPolicy:
+    """Política de retenção dos eventos de uma sessão"""
+
+    def __init__(self, recent_events: int = 200, summary_batch: int = 100,
+                 max_summaries: int = 20, max_highlights: int = 5,
+                 max_payload_bytes: int = 256 * 1024):
+        # Eventos mais recentes mantidos na íntegra
+        self.recent_events = recent_events
+        # Quantos eventos antigos cada resumo de primeiro nível cobre
+        self.summary_batch = summary_batch
+        # Acima disso, os resumos mais antigos são fundidos em um nível superior
+        self.max_summaries = max_summaries
+        # Descrições de eventos importantes preservadas por resumo
+        self.max_highlights = max_highlights
+        # Limite rígido do contexto serializado
+        self.max_payload_bytes = max_payload_bytes
+
+    def needs_compaction(self, context) -> bool:
+        """Indica se já há um lote completo de eventos antigos para resumir"""
+        return len(context.key_events) >= self.recent_events + self.summary_batch
+
+def _unique(names: List[str]) -> List[str]:
+    return list(dict.fromkeys(names))
+
+def summarize_events(events: List[Dict[str, Any]], max_highlights: int) -> Dict[str, Any]:
+    """Gera um resumo de primeiro nível para um lote de eventos"""
+    highlights = [e["description"] for e in events
+                  if e.get("type") == "event" and e.get("importance") == "high" and e.get("description")]
+    timestamps = [e["added_at"] for e in events if e.get("added_at")]
+    return {
+        "level": 1,
+        "count": len(events),
+        "from": timestamps[0] if timestamps else None,
+        "to": timestamps[-1] if timestamps else None,
+        "highlights": highlights[-max_highlights:],
+        "locations": _unique([e["name"] for e in events if e.get("type") == "location" and e.get("name")]),
+        "quests": _unique([e["name"] for e in events if e.get("type") == "quest" and e.get("name")]),
+    }
+
+def merge_summaries(older: Dict[str, Any], newer: Dict[str, Any], max_highlights: int) -> Dict[str, Any]:
+    """Funde dois resumos consecutivos em um resumo de nível superior"""
+    return {
+        "level": max(older.get("level", 1), newer.get("level", 1)) + 1,
+        "count": older.get("count", 0) + newer.get("count", 0),
+        "from": older.get("from") or newer.get("from"),
+        "to": newer.get("to") or older.get("to"),
+        "highlights": (older.get("highlights", []) + newer.get("highlights", []))[-max_highlights:],
+        "locations": _unique(older.get("locations", []) + newer.get("locations", [])),
+        "quests": _unique(older.get("quests", []) + newer.get("quests", [])),
+    }
+
+def compact_events(context, policy: EventRetentionPolicy, force: bool = False) -> bool:
+    """
+    Enrola eventos antigos em resumos e funde resumos excedentes
+
+    Args:
+        context: Contexto RPG (modificado no lugar)
+        policy: Política de retenção
+        force: Resume todo o excesso, mesmo sem completar um lote
+
+    Returns:
+        True se o contexto foi alterado
+    """
+    changed = False
+
+    # Camada 1: lotes de eventos antigos viram resumos
+    excess = len(context.key_events) - policy.recent_events
+    to_summarize = excess if force else (excess // policy.summary_batch) * policy.summary_batch
+    if to_summarize > 0:
+        old_events = context.key_events[:to_summarize]
+        for start in range(0, len(old_events), policy.summary_batch):
+            batch = old_events[start:start + policy.summary_batch]
+            context.event_summaries.append(summarize_events(batch, policy.max_highlights))
+        context.key_events = context.key_events[to_summarize:]
+        changed = True
+
+    # Camada 2: resumos mais antigos são fundidos em níveis superiores
+    while len(context.event_summaries) > policy.max_summaries:
+        older, newer = context.event_summaries[0], context.event_summaries[1]
+        context.event_summaries[0:2] = [merge_summaries(older, newer, policy.max_highlights)]
+        changed = True
+
+    return changed
+
+def enforce_payload_cap(context, policy: EventRetentionPolicy, payload_size: Callable[[Any], int]) -> bool:
+    """
+    Garante que o contexto serializado caiba em policy.max_payload_bytes
+
+    Descarta progressivamente: detalhes dos resumos antigos, resumos antigos
+    e, por último, parte dos eventos recentes. Personagens e dados do mundo
+    nunca são descartados, então o limite vale para o log de eventos.
+
+    Returns:
+        True se o contexto foi alterado
+    """
+    if payload_size(context) <= policy.max_payload_bytes:
+        return False
+
+    compact_events(context, policy, force=True)
+
+    # Remover detalhes dos resumos, do mais antigo para o mais novo
+    for summary in context.event_summaries:
+        if payload_size(context) <= policy.max_payload_bytes:
+            return True
+        summary["highlights"] = []
+        summary["locations"] = []
+        summary["quests"] = []
+
+    # Descartar os resumos mais antigos
+    while context.event_summaries and payload_size(context) > policy.max_payload_bytes:
+        context.event_summaries.pop(0)
+
+    # Em último caso, reduzir os eventos mantidos na íntegra
+    while context.key_events and payload_size(context) > policy.max_payload_bytes:
+        context.key_events = context.key_events[len(context.key_events) // 2 + 1:]
+
+    return True
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Roteador de intenções das mensagens: regras de D&D (RAG), narrativa (agente RPG) ou comando
+Compilado uma vez na inicialização e compartilhado pelo bot e pelos reasoners
+"""
+
+import asyncio
+import logging
+import math
+import re
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from discord_tools.commands import COMMAND_CHARS
+from en_terms import dnd_dictionary_pt_en
+from rpg_tools.names import normalize_name
+
+INTENT_COMMAND = "command"
+INTENT_RULES = "rules"
+INTENT_NARRATIVE = "narrative"
+
+# Termos curtos do dicionário colidem com palavras comuns ("do", "on", "car");
+# dos termos com menos de 4 letras, só estas abreviações contam
+_ABBREVIATIONS = {"ac", "ca", "c.a", "hp", "pv", "pc", "xp", "dex", "cha", "wis", "str", "d20", "dnd", "d&d"}
+
+# Palavras que indicam pergunta sobre regras, de ambas as listas antigas
+_RULE_KEYWORDS = {"regra", "regras", "d&d", "dnd", "dungeons", "dragons", "livro do jogador", "phb",
+                  "modificador", "bonus de proficiencia", "teste de resistencia", "classe de armadura"}
+
+_INTERROGATIVE = re.compile(
+    r"^(?:como|qual|quais|quanto|quantos|quantas|quando|o que|oque|pode|posso|existe|existem|"
+    r"e possivel|da pra|tem como|funciona)\b"
+)
+
+_TOKEN = re.compile(r"[\w&.'-]+")
+
+logger = logging.getLogger(__name__)
+
+class RouteDecision(NamedTuple):
+    intent: str
+    confidence: float
+    score: float  # Probabilidade estimada de ser pergunta de regras
+
+class IntentRouter:
+    """
+    Decide o destino de uma mensagem com um único passe sobre os tokens
+
+    Os termos de D&D (português e inglês) ficam num conjunto de n-gramas
+    normalizados; pergunta, interrogativos, palavras de regra e termos entram
+    num classificador linear. Com um `embedder`, mensagens de pontuação ambígua
+    são comparadas também com protótipos de cada intenção.
+    """
+
+    BIAS = -3.0
+    WEIGHT_QUESTION = 2.0
+    WEIGHT_INTERROGATIVE = 1.0
+    WEIGHT_RULE_KEYWORD = 2.0
+    WEIGHT_TERM = 0.8
+    WEIGHT_EMBEDDING = 4.0
+
+    PROTOTYPES = {
+        INTENT_RULES: [
+            "Como funciona a regra de ataque de oportunidade?",
+            "Quais são as características da raça anão?",
+            "Quanto de dano causa uma bola de fogo?",
+            "Qual a classe de armadura de uma armadura de placas?",
+        ],
+        INTENT_NARRATIVE: [
+            "Eu saco minha espada e avanço contra o goblin.",
+            "Entramos na taverna e pedimos uma bebida ao taverneiro.",
+            "O que tem atrás da porta da masmorra?",
+            "Vamos seguir a estrada até o castelo do rei.",
+        ],
+    }
+
+    def __init__(self, threshold: float = 0.5, report_every: int = 500):
+        self.threshold = threshold
+        self.report_every = report_every
+        self.terms = set()
+        for term in list(dnd_dictionary_pt_en.keys()) + list(dnd_dictionary_pt_en.values()):
+            normalized = " ".join(_TOKEN.findall(normalize_name(term)))
+            if len(normalized) >= 4 or normalized in _ABBREVIATIONS:
+                self.terms.add(normalized)
+        self.rule_keywords = {normalize_name(k) for k in _RULE_KEYWORDS}
+        self.max_ngram = max(len(t.split()) for t in self.terms | self.rule_keywords)
+
+        self._embedder: Optional[Callable] = None
+        self._prototypes: Dict[str, List[List[float]]] = {}
+
+        self._stats_lock = threading.Lock()
+        self.counts = {INTENT_COMMAND: 0, INTENT_RULES: 0, INTENT_NARRATIVE: 0}
+        self.total_ns = 0
+        self.embedding_checks = 0
+
+    def attach_embedder(self, embedder: Callable[[List[str]], List[List[float]]]):
+        """Ativa a comparação com protótipos; `embedder` gera vetores normalizados para uma lista de textos"""
+        self._prototypes = {intent: [list(map(float, v)) for v in embedder(texts)]
+                            for intent, texts in self.PROTOTYPES.items()}
+        self._embedder = embedder
+
+    def _matches(self, tokens: List[str]):
+        """Conta termos de D&D e palavras de regra entre os n-gramas da mensagem"""
+        terms = rules = 0
+        for i in range(len(tokens)):
+            for n in range(1, self.max_ngram + 1):
+                if i + n > len(tokens):
+                    break
+                gram = tokens[i] if n == 1 else " ".join(tokens[i:i + n])
+                if gram in self.rule_keywords:
+                    rules += 1
+                if gram in self.terms:
+                    terms += 1
+        return terms, rules
+
+    def has_dnd_terms(self, text: str) -> bool:
+        return self._matches(_TOKEN.findall(normalize_name(text)))[0] > 0
+
+    def _embedding_margin(self, text: str) -> float:
+        """Similaridade com os protótipos de regras menos a com os de narrativa"""
+        vector = list(map(float, self._embedder([text])[0]))
+        best = {intent: max(sum(a * b for a, b in zip(vector, proto)) for proto in protos)
+                for intent, protos in self._prototypes.items()}
+        with self._stats_lock:
+            self.embedding_checks += 1
+        return best[INTENT_RULES] - best[INTENT_NARRATIVE]
+
+    def _lexical(self, stripped: str):
+        """Decisão imediata (vazia ou comando) ou o logit do classificador linear"""
+        if not stripped:
+            return RouteDecision(INTENT_NARRATIVE, 1.0, 0.0), 0.0
+        if stripped[0] in COMMAND_CHARS:
+            return RouteDecision(INTENT_COMMAND, 1.0, 0.0), 0.0
+        normalized = normalize_name(stripped)
+        terms, rules = self._matches(_TOKEN.findall(normalized))
+        z = (self.BIAS
+             + self.WEIGHT_QUESTION * ("?" in normalized)
+             + self.WEIGHT_INTERROGATIVE * bool(_INTERROGATIVE.match(normalized))
+             + self.WEIGHT_RULE_KEYWORD * min(rules, 2)
+             + self.WEIGHT_TERM * min(terms, 3))
+        return None, z
+
+    def _ambiguous(self, z: float) -> bool:
+        # Só as mensagens ambíguas pagam pelo embedding
+        return self._embedder is not None and 0.25 < 1.0 / (1.0 + math.exp(-z)) < 0.75
+
+    def _decide(self, z: float, start: int) -> RouteDecision:
+        score = 1.0 / (1.0 + math.exp(-z))
+        if score > self.threshold:
+            return self._record(RouteDecision(INTENT_RULES, score, score), start)
+        return self._record(RouteDecision(INTENT_NARRATIVE, 1.0 - score, score), start)
+
+    def _record(self, decision: RouteDecision, start: int) -> RouteDecision:
+        elapsed = time.perf_counter_ns() - start
+        with self._stats_lock:
+            self.counts[decision.intent] += 1
+            self.total_ns += elapsed
+            routed = sum(self.counts.values())
+        if self.report_every and routed % self.report_every == 0:
+            stats = self.stats()
+            logger.info("🧭 Roteador: %d mensagens, %d para regras, %d narrativas, %d comandos, %.1f µs em média",
+                        stats["routed"], stats["rules"], stats["narrative"], stats["command"], stats["avg_us"])
+        return decision
+
+    def route(self, text: str) -> RouteDecision:
+        """Roteia a mensagem; o embedding, se houver, roda nesta thread (não use no loop de eventos)"""
+        start = time.perf_counter_ns()
+        stripped = text.strip()
+        decision, z = self._lexical(stripped)
+        if decision is not None:
+            return self._record(decision, start)
+        if self._ambiguous(z):
+            z += self.WEIGHT_EMBEDDING * self._embedding_margin(stripped)
+        return self._decide(z, start)
+
+    async def route_async(self, text: str) -> RouteDecision:
+        """Como `route`, mas o embedding das mensagens ambíguas roda numa thread, sem travar o loop"""
+        start = time.perf_counter_ns()
+        stripped = text.strip()
+        decision, z = self._lexical(stripped)
+        if decision is not None:
+            return self._record(decision, start)
+        if self._ambiguous(z):
+            z += self.WEIGHT_EMBEDDING * await asyncio.to_thread(self._embedding_margin, stripped)
+        return self._decide(z, start)
+
+    def stats(self) -> Dict[str, float]:
+        """Contadores por intenção e tempo médio de roteamento"""
+        routed = sum(self.counts.values())
+        return {
+            "routed": routed,
+            **self.counts,
+            "embedding_checks": self.embedding_checks,
+            "avg_us": self.total_ns / routed / 1000 if routed else 0.0,
+        }
+
+_router: Optional[IntentRouter] = None
+_router_lock = threading.Lock()
+
+def get_intent_router() -> IntentRouter:
+    """Roteador global, compilado na primeira chamada"""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = IntentRouter()
+    return _router
@@ -0,0 +1,7 @@
+import unicodedata
+
+def normalize_name(name: str) -> str:
+    """Normaliza um nome para comparação: sem acentos, sem caixa e com espaços colapsados"""
+    decomposed = unicodedata.normalize("NFKD", name)
+    without_accents = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(without_accents.casefold().split())
@@ -1,4 +1,4 @@
-from discord_tools.chat import ChatMessage, parse_message
+from discord_tools.chat import Chat, ChatMessage
 import datetime
 
 LLM_NAME: str = "LLM"
@@ -10,9 +10,12 @@ Responda continuando a conversa de forma natural, continuando e contribuindo par
 
 """
 
-def chatBuild(messages: list[ChatMessage]):
-    chat_text = map(lambda x: f"$ Mensagem de {x.username} às {x.time}: " + parse_message(x.discord_message) + "\n$$$", messages)
-    chat_text = "\n".join(chat_text)
+def chatBuild(messages: Chat | list[ChatMessage]):
+    # Cada mensagem guarda a linha já renderizada; só falta uni-las
+    if isinstance(messages, Chat):
+        chat_text = messages.history_text
+    else:
+        chat_text = "\n".join(x.rendered for x in messages)
     final_text = f"""As mensagens anteriores são sinalizadas com [ $ Mensagem de x: ] e  [ $ Mensagem do modelo: ] terminando com $$$
 Agora seguem as mensagens:
 {chat_text}
@@ -20,6 +23,36 @@ Agora seguem as mensagens:
 """
     return final_text
 
+def contextBuild(context_summary: str):
+    return f"\n📋 **CONTEXTO DA SESSÃO:**\n{context_summary}\n" if context_summary else ""
+
+def mentionsBuild(mentions: list[tuple[str, str]] | None):
+    # Várias menções agregadas numa só geração: pedir uma resposta única para todas
+    if not mentions or len(mentions) < 2:
+        return ""
+    lines = "\n".join(f"- {username}: {content}" for username, content in mentions)
+    return f"""
+Várias pessoas chamaram você enquanto respondia. Responda numa única mensagem, coerente, a todas estas menções:
+{lines}
+"""
+
+def historySummaryBuild(summary: str):
+    return f"""Resumo das mensagens mais antigas do canal:
+{summary}
+
+"""
+
+def historyFoldBuild(summary: str, lines: str):
+    # Resumo incremental: o resumo anterior é atualizado com as mensagens que saíram da janela
+    previous = f"Resumo atual:\n{summary}\n\n" if summary else ""
+    return f"""Você está resumindo o histórico de uma sessão de RPG num chat de Discord.
+{previous}Atualize o resumo incorporando as mensagens abaixo. Preserve nomes de personagens, locais,
+decisões dos jogadores, combates e ganchos de história em aberto; descarte conversa fora do jogo.
+Responda apenas com o novo resumo, em português, em no máximo três parágrafos curtos.
+
+{lines}
+"""
+
 postinit = lambda: f"\n\n$ Mensagem de {LLM_NAME} às {datetime.datetime.now()}: "
 
 postinit_alt = lambda: f"\n\nFIM DAS MENSAGENS\n"
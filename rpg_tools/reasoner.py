@@ -1,4 +1,6 @@
+import asyncio
 import traceback
+import time
 import os
 from enum import Enum
 from google.generativeai import types
@@ -10,8 +12,11 @@ from rpg_tools.agentic_tools import ToolSettings
 from rpg_tools.agentic_tools.world_history import *
 import google.ai.generativelanguage as glm
 
-from llm_tools import LanguageModel
+from llm_tools import LanguageModel, PromptLayout, for_task
+from rpg_tools.chat_history import ChatHistory
+from discord_tools.channel_cache import ChannelCache, SingleFlight, default_storage, dump_state, load_state
 from discord_tools.commands import COMMAND_CHARS
+from rpg_tools.intent_router import INTENT_RULES, get_intent_router
 
 # Importar sistema RAG
 try:
@@ -23,7 +28,7 @@ except ImportError:
 
 # Importar sistema de contexto Redis
 try:
-    from rpg_tools.context_manager import context_manager
+    from rpg_tools.context_manager import get_context_manager
     CONTEXT_AVAILABLE = True
 except ImportError:
     CONTEXT_AVAILABLE = False
@@ -43,6 +48,11 @@ class RpgReasoner:
     rpg_init: RpgInit
     rag_system: any  # Sistema RAG para consultas D&D
     channel_id: str  # ID do canal Discord
+    history: ChatHistory  # Janela de mensagens recentes e resumo das antigas
+    stage_timeouts: dict  # Timeout em segundos de cada etapa do pipeline de resposta
+    stage_latency: dict  # Última latência medida de cada etapa, em ms
+    max_tool_steps: int  # Máximo de passos do laço de ferramentas por resposta
+    step_latency: list  # Latência de cada passo do último laço de ferramentas, em ms
     
     def __init__(self, channel_id: str = None):
         self.world_history = WorldHistoryTool()
@@ -50,6 +60,13 @@ class RpgReasoner:
         self.state = RpgState.Conversation
         self.rpg_init = None
         self.channel_id = channel_id
+        self.history = ChatHistory()
+        self.stage_timeouts = {"context_update": 30.0, "rag": 20.0, "context_summary": 5.0, "generation": 90.0}
+        self.stage_latency = {}
+        self.max_tool_steps = 4
+        self.step_latency = []
+        # Atualizações de contexto ainda rodando depois da resposta entregue
+        self._background: set[asyncio.Task] = set()
         
         # Inicializar sistema RAG se disponível
         if RAG_AVAILABLE:
@@ -66,30 +83,13 @@ class RpgReasoner:
         else:
             self.rag_system = None
     
-    def _should_use_rag(self, query: str) -> bool:
-        """Determina se deve usar RAG ou ferramentas RPG"""
-        if not self.rag_system:
-            return False
-        
-        # Se é uma pergunta sobre D&D, usar RAG
-        if self.rag_system.is_dnd_question(query):
-            return True
-        
-        # Se é uma pergunta sobre regras, usar RAG
-        dnd_keywords = ['regra', 'regras', 'd&d', 'dnd', 'dungeons', 'dragons', 'classe', 'raça', 'magia', 'combate']
-        query_lower = query.lower()
-        if any(keyword in query_lower for keyword in dnd_keywords):
-            return True
-        
-        return False
-    
     def _get_context_summary(self) -> str:
         """Obtém resumo do contexto Redis para usar nos prompts"""
         if not CONTEXT_AVAILABLE or not self.channel_id:
             return ""
         
         try:
-            return context_manager.get_context_summary(self.channel_id)
+            return get_context_manager().get_context_summary(self.channel_id)
         except Exception as e:
             print(f"Erro ao obter contexto: {e}")
             return ""
@@ -100,19 +100,21 @@ class RpgReasoner:
             return
         
         try:
-            context_manager.update_context(self.channel_id, message, username)
+            get_context_manager().update_context(self.channel_id, message, username)
         except Exception as e:
             print(f"Erro ao atualizar contexto: {e}")
     
-    def GenerateRequest(self, chat: chat_.Chat, model: LanguageModel) -> list[str]:
+    async def GenerateRequest(self, chat: chat_.Chat, model: LanguageModel,
+                              mentions: list[tuple[str, str]] = None, on_text=None, on_stream_end=None,
+                              intent: str = None) -> list[str]:
         to_return: list[str] = []
         try:
             if self.state is RpgState.Conversation:
-                return self.ConversationRequest(chat, model)
+                return await self.ConversationRequest(chat, model, mentions, on_text, on_stream_end, intent)
             elif self.state is RpgState.Initializing:
-                return self.InitializingRequest(chat, model)
+                return await self.InitializingRequest(chat, model)
             elif self.state is RpgState.WorldBuild:
-                return self.WorldBuild(chat, model)
+                return await self.WorldBuild(chat, model)
             else:
                 to_return.append(f"WARNING: State {self.state} in construction")
                 print(to_return)
@@ -122,96 +124,246 @@ class RpgReasoner:
             
         return to_return
     
-    def ConversationRequest(self, chat: chat_.Chat, model: LanguageModel):
+    def to_state(self) -> dict:
+        """Estado serializável do reasoner, para despejo no armazenamento"""
+        return {
+            "state": self.state.value,
+            "world_history": self.world_history.main_text,
+            "tools": list(self.tool_settings.Conversation_tool_list.keys()),
+            "history_summary": self.history.summary,
+            "summarized_upto": self.history.summarized_upto,
+        }
+
+    def load_state(self, state: dict):
+        self.state = RpgState(state["state"])
+        self.world_history.main_text = state["world_history"]
+        for key in list(self.tool_settings.Conversation_tool_list.keys()):
+            if key not in state["tools"]:
+                self.tool_settings.remove_tool(key)
+        self.history.summary = state["history_summary"]
+        self.history.summarized_upto = state["summarized_upto"]
+
+    def memory_size(self) -> int:
+        return len(self.world_history.main_text) + len(self.history.summary) + 4096
+
+    async def _stage(self, name: str, func, *args, default=None):
+        """Roda uma etapa bloqueante do pipeline numa thread, com timeout; falha ou atraso viram o valor padrão"""
+        timeout = self.stage_timeouts.get(name)
+        start = time.perf_counter()
+        try:
+            return await asyncio.wait_for(asyncio.to_thread(func, *args), timeout)
+        except asyncio.TimeoutError:
+            print(f"⏱️ Etapa {name} excedeu {timeout}s, seguindo sem ela")
+        except Exception as e:
+            print(f"⚠️ Erro na etapa {name}: {e}")
+        finally:
+            self.stage_latency[name] = (time.perf_counter() - start) * 1000
+        return default
+
+    def _rag_answer(self, chat: chat_.Chat, query: str, intent: str = None) -> str | None:
+        """
+        Resposta do RAG se a mensagem for uma consulta de regras, senão None
+        `intent` é a intenção já decidida por quem recebeu a mensagem; sem ela, a mensagem é roteada aqui
+        """
+        if not self.rag_system:
+            return None
+        if intent is None:
+            intent = get_intent_router().route(self._strip_command(query)).intent
+        if intent != INTENT_RULES:
+            return None
+        print("🔍 Usando sistema RAG para consulta D&D")
+        try:
+            return self.rag_system.generate_answer(chat, query)
+        except Exception as e:
+            print(f"⚠️ Erro no RAG, usando ferramentas RPG: {e}")
+            # Fallback para ferramentas RPG
+            return None
+
+    async def ConversationRequest(self, chat: chat_.Chat, model: LanguageModel,
+                                  mentions: list[tuple[str, str]] = None, on_text=None, on_stream_end=None,
+                                  intent: str = None):
+        # Pipeline da resposta como um pequeno DAG:
+        #   atualização do contexto (análise pelo LLM) -> em segundo plano, não atrasa a resposta
+        #   RAG e resumo do contexto -> em paralelo -> geração
+        # A mensagem nova já vai na íntegra no histórico, então o resumo pode ser o da versão anterior
+        # `mentions` traz (usuário, texto) das menções agregadas numa só geração; são analisadas juntas
+        # Com `on_text`, a resposta é gerada em streaming e o texto acumulado é entregue a cada trecho;
+        # `on_stream_end` é chamado assim que o modelo termina de gerar o texto
+        last_message = ""
+        if chat.messages:
+            last_message = chat.messages[-1].text
+            username = chat.messages[-1].username
+            analyzed = last_message
+            if mentions and len(mentions) > 1:
+                analyzed = "\n".join(f"{user}: {content}" for user, content in mentions)
+                username = ", ".join(dict.fromkeys(user for user, _ in mentions))
+            update_task = asyncio.create_task(
+                self._stage("context_update", self._update_context, analyzed, username))
+            self._background.add(update_task)
+            update_task.add_done_callback(self._background_done)
+        return await self._conversation_reply(chat, model, last_message, mentions, on_text, on_stream_end, intent)
+
+    def _background_done(self, task: asyncio.Task):
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"⚠️ Erro na atualização do contexto em segundo plano: {task.exception()}")
+
+    async def _conversation_reply(self, chat: chat_.Chat, model: LanguageModel, last_message: str,
+                                  mentions: list[tuple[str, str]] = None, on_text=None, on_stream_end=None,
+                                  intent: str = None):
         to_return: list[str] = []
         try:
-            # Verificar se deve usar RAG para a última mensagem
-            last_message = ""
-            if chat.messages:
-                last_message = chat.messages[-1].discord_message.content
-            
-            # Atualizar contexto Redis com a mensagem
-            if chat.messages:
-                username = chat.messages[-1].username
-                self._update_context(last_message, username)
-            
-            # Se deve usar RAG, gerar resposta RAG
-            if self._should_use_rag(last_message):
-                print("🔍 Usando sistema RAG para consulta D&D")
-                try:
-                    rag_response = self.rag_system.generate_answer(chat, last_message)
-                    to_return.append(rag_response)
-                    return to_return
-                except Exception as e:
-                    print(f"⚠️ Erro no RAG, usando ferramentas RPG: {e}")
-                    # Fallback para ferramentas RPG
-            
-            # Obter contexto Redis para enriquecer o prompt
-            context_summary = self._get_context_summary()
+            rag_response, context_summary = await asyncio.gather(
+                self._stage("rag", self._rag_answer, chat, last_message, intent),
+                self._stage("context_summary", self._get_context_summary, default=""),
+            )
+            if rag_response:
+                to_return.append(rag_response)
+                return to_return
             
             # Usar ferramentas RPG normais com contexto enriquecido
-            req = prompts.preinit + \
-                self.tool_settings.get_conversation_tools_explanation() + \
-                self.world_history.GetHistory() + \
-                (f"\n📋 **CONTEXTO DA SESSÃO:**\n{context_summary}\n" if context_summary else "") + \
-                prompts.chatBuild(chat.messages) + \
-                prompts.postinit()
+            # Instruções fixas primeiro, campanha depois e só no fim o que muda a cada mensagem,
+            # para o prefixo ser reaproveitado pelo cache de contexto do modelo
+            req = PromptLayout(
+                system=prompts.preinit + self.tool_settings.get_conversation_tools_explanation(),
+                campaign=self.world_history.GetHistory(),
+                dynamic=prompts.contextBuild(context_summary) + \
+                    self.history.build(chat, for_task(model, "summary")) + \
+                    prompts.mentionsBuild(mentions) + \
+                    prompts.postinit(),
+            )
         except Exception as e:
             print("Error in request formation", e, e.__traceback__)
             to_return.append("An internal error ocurred while generating request. Code CR1")
             
         if len(to_return) == 0:
-            try:
-                response: types.GenerateContentResponse = model.generate_content_with_functions(req, self.tool_settings.get_tool_list())
-            except Exception as e:    
-                print("Error in generation")
-                to_return.append("An internal error ocurred while generating answer. Code CR2")
-                traceback.print_exc()
-                return to_return
-            for part in response.parts:
+            model = for_task(model, "conversation", self.stage_timeouts["generation"] * 1000)
+            to_return = await self._agent_loop(req, chat, model, on_text, on_stream_end)
+        return to_return
+
+    async def _generate_step(self, req: PromptLayout, model: LanguageModel, on_text, streamed: str,
+                             request_start: float):
+        """
+        Um passo de geração; devolve (partes da resposta do modelo, texto novo)
+        Em streaming, o texto acumulado (`streamed` + o novo) vai para `on_text` a cada trecho
+        """
+        tools = self.tool_settings.get_tool_list()
+        if on_text is None:
+            response: types.GenerateContentResponse = await model.generate_content_with_functions_async(req, tools)
+            parts = list(response.parts)
+            return parts, "".join(part.text for part in parts if part.text)
+        parts, text = [], ""
+        async for chunk in model.generate_content_stream_async(req, tools):
+            for part in chunk.parts:
+                parts.append(part)
                 if part.text:
-                    if part.text[0] in COMMAND_CHARS:
-                        # Não responder texto com códigos
-                        to_return.append(part.text[1:])
-                    else:
-                        to_return.append(part.text)
-                    
-                if part.function_call:
-                    match part.function_call.name:
-                        case "JogarD20":
-                            resultado_dado = JogarD20()
-                            print(f"@JogarD20 with result {resultado_dado}")
-                            # Dar uma mensagem de follow up com o resultado
-                            to_return.insert(0, f"@ O resultado do dado D20 foi {resultado_dado}")
-                        case "InicializarRPG":
-                            to_return += self.InitializeRpg(chat, model)
-                        case "ExpandirHistoria":
-                            to_return.append("História atualizada")
-                            to_return.append(self.world_history.AddHistory(**part.function_call.args))
-                        case _:
-                            to_return.insert(0, f"Function called but not implemented: {part.function_call.name}")
-                            print(to_return)
+                    if not streamed and not text:
+                        self.stage_latency["first_token"] = (time.perf_counter() - request_start) * 1000
+                    text += part.text
+                    await on_text(self._strip_command(streamed + text))
+        return parts, text
+
+    @staticmethod
+    def _strip_command(text: str) -> str:
+        # Não responder texto com códigos
+        return text[1:] if text and text[0] in COMMAND_CHARS else text
+
+    async def _agent_loop(self, req: PromptLayout, chat: chat_.Chat, model: LanguageModel,
+                          on_text=None, on_stream_end=None) -> list[str]:
+        """
+        Laço de ferramentas: as chamadas de função de cada passo rodam em paralelo e os
+        resultados voltam ao modelo como respostas de função, na mesma conversa, até ele
+        responder só com texto ou atingir max_tool_steps
+
+        Sem `on_text`, devolve os textos e as mensagens das ferramentas na ordem em que ocorreram;
+        em streaming, o texto vai para `on_text` e o retorno traz só as mensagens das ferramentas.
+        `on_stream_end` é chamado quando um passo termina sem chamadas de função (não virá
+        mais texto) ou, no máximo, ao sair do laço.
+        """
+        to_return: list[str] = []
+        streamed = ""
+        stream_ended = False
+        self.step_latency = []
+        request_start = time.perf_counter()
+        try:
+            async with asyncio.timeout(self.stage_timeouts["generation"]):
+                for step in range(self.max_tool_steps):
+                    step_start = time.perf_counter()
+                    parts, text = await self._generate_step(req, model, on_text, streamed, request_start)
+                    if text:
+                        if on_text is None:
+                            to_return.append(self._strip_command(text))
+                        else:
+                            streamed += text
+                    calls = [part.function_call for part in parts if part.function_call]
+                    if not calls and on_stream_end is not None:
+                        # Último passo: o texto já está completo, sem esperar o resto da resposta
+                        stream_ended = True
+                        await on_stream_end()
+                    results = await asyncio.gather(*(self._run_tool(call, chat, model) for call in calls))
+                    self.step_latency.append((time.perf_counter() - step_start) * 1000)
+                    print(f"🔁 Passo {step + 1}: {self.step_latency[-1]:.0f} ms, {len(calls)} ferramenta(s)")
+
+                    stop = not calls
+                    for messages, _, done in results:
+                        to_return += messages
+                        stop = stop or done
+                    if stop:
+                        break
+                    req.turns.append(("model", parts))
+                    req.turns.append(("function", [(call.name, result) for call, (_, result, _) in zip(calls, results)]))
+            self.stage_latency["generation"] = (time.perf_counter() - request_start) * 1000
+        except Exception as e:
+            print("Error in generation")
+            to_return.append("An internal error ocurred while generating answer. Code CR2")
+            traceback.print_exc()
+        if on_stream_end is not None and not stream_ended:
+            await on_stream_end()
         return to_return
+
+    async def _run_tool(self, function_call, chat: chat_.Chat, model: LanguageModel):
+        """
+        Executa uma chamada de função do modelo
+        Retorna (mensagens para o canal, resultado devolvido ao modelo, se o laço deve parar)
+        """
+        match function_call.name:
+            case "JogarD20":
+                resultado_dado = await asyncio.to_thread(JogarD20)
+                print(f"@JogarD20 with result {resultado_dado}")
+                # Dar uma mensagem de follow up com o resultado
+                return [f"@ O resultado do dado D20 foi {resultado_dado}"], {"resultado": resultado_dado}, False
+            case "InicializarRPG":
+                # O canal passa para a criação do mundo; a conversa atual termina aqui
+                return await self.InitializeRpg(chat, model), {"status": "partida inicializada"}, True
+            case "ExpandirHistoria":
+                added = await asyncio.to_thread(self.world_history.AddHistory, **function_call.args)
+                return ["História atualizada", added], {"status": "história atualizada"}, False
+            case _:
+                message = f"Function called but not implemented: {function_call.name}"
+                print(message)
+                return [message], {"erro": "função não implementada"}, False
     
-    def ExpandHistRequest(self, chat: chat_.Chat, model: LanguageModel) -> list[str]:
+    async def ExpandHistRequest(self, chat: chat_.Chat, model: LanguageModel) -> list[str]:
         to_return: list[str] = []
         try:
             # Obter contexto Redis para enriquecer o prompt
-            context_summary = self._get_context_summary()
+            context_summary = await self._stage("context_summary", self._get_context_summary, default="")
             
-            req = prompts.preinit + \
-                self.world_history.GetHistory() + \
-                (f"\n📋 **CONTEXTO DA SESSÃO:**\n{context_summary}\n" if context_summary else "") + \
-                prompts.chatBuild(chat.messages) + \
-                prompts.postinit_alt() + \
-                AddHistoryTool_explanation_alt
+            req = PromptLayout(
+                system=prompts.preinit,
+                campaign=self.world_history.GetHistory(),
+                dynamic=prompts.contextBuild(context_summary) + \
+                    self.history.build(chat, for_task(model, "summary")) + \
+                    prompts.postinit_alt() + \
+                    AddHistoryTool_explanation_alt,
+            )
         except Exception as e:
             print("Error in request formation", e, e.__traceback__)
             to_return.append("An internal error ocurred while generating request. Code CR1")
             
         if len(to_return) == 0:
             try:
-                response: types.GenerateContentResponse = model.generate_content_with_functions(req, [AddHistoryTool_glm])
+                response: types.GenerateContentResponse = await for_task(model, "world").generate_content_with_functions_async(req, [AddHistoryTool_glm])
             except Exception as e:    
                 print("Error in generation")
                 to_return.append("An internal error ocurred while generating answer. Code CR2")
@@ -235,16 +387,16 @@ class RpgReasoner:
                             print(to_return)
         return to_return
     
-    def InitializeRpg(self, chat: chat_.Chat, model: LanguageModel) -> list[str]:
+    async def InitializeRpg(self, chat: chat_.Chat, model: LanguageModel) -> list[str]:
         # OK: Mensagens e ferramentas para a inicialização
         # TODO: Formalizar protocolo de inicialização
         # TODO: Salvar os dados da sessão no longo prazo
         self.state = RpgState.Initializing
         self.rpg_init = RpgInit()
-        return self.InitializingRequest(chat, model)
+        return await self.InitializingRequest(chat, model)
         
     
-    def InitializingRequest(self, chat: chat_.Chat, model: LanguageModel):
+    async def InitializingRequest(self, chat: chat_.Chat, model: LanguageModel):
         # Remove a ferramenta de inicializar rpg, para mitigar um bug de a chamar em loop
         self.tool_settings.remove_tool("InitRPG")
         
@@ -252,23 +404,25 @@ class RpgReasoner:
         return ["Primeiramente, diga aqui como quer que seja o mundo de RPG. Será um mundo medieval, cyberpunk, de fantasia, \
 ou uma odisseia cósmica? Escreva aqui todas as informações essenciais, que preencherei o restante."]
         
-    def WorldBuild(self, chat: chat_.Chat, model: LanguageModel) -> list[str]:
+    async def WorldBuild(self, chat: chat_.Chat, model: LanguageModel) -> list[str]:
         to_return: list[str] = []
         self.state = RpgState.Conversation
         try:
             # Obter contexto Redis para enriquecer o prompt
-            context_summary = self._get_context_summary()
+            context_summary = await self._stage("context_summary", self._get_context_summary, default="")
             
-            req = prompts.preinit_create_history + WorldHistoryTool_explanation + \
-                  (f"\n📋 **CONTEXTO DA SESSÃO:**\n{context_summary}\n" if context_summary else "") + \
-                  prompts.chatBuild(chat.messages) + prompts.postinit_alt() + prompts.postinit_create_history
+            req = PromptLayout(
+                system=prompts.preinit_create_history + WorldHistoryTool_explanation,
+                dynamic=prompts.contextBuild(context_summary) + \
+                    self.history.build(chat, for_task(model, "summary")) + prompts.postinit_alt() + prompts.postinit_create_history,
+            )
         except Exception as e:
             print("Error in request formation", e, e.__traceback__)
             to_return.append("An internal error ocurred while generating answer. CodeWB2")
             
         if len(to_return) == 0:
             try:
-                response: types.GenerateContentResponse = model.generate_content_with_functions(req, functions=[WorldHistoryTool_glm])
+                response: types.GenerateContentResponse = await for_task(model, "world").generate_content_with_functions_async(req, [WorldHistoryTool_glm])
             except Exception as e:    
                 print("Error in generation")
                 traceback.print_exc()
@@ -294,21 +448,55 @@ ou uma odisseia cósmica? Escreva aqui todas as informações essenciais, que pr
         return to_return
     
 class ReasonerManager:
-    channel_reasoner: dict
+    channel_reasoner: ChannelCache  # ID do canal -> RpgReasoner, com despejo LRU para o armazenamento
     
-    def __init__(self):
-        self.channel_reasoner = dict()
+    def __init__(self, storage=None, spill_ttl=None, **cache_options):
+        # Sem armazenamento explícito, usa o do contexto das sessões na primeira necessidade
+        self.storage = storage
+        self.spill_ttl = spill_ttl
+        self.spill_prefix = "rpg:reasoner:"
+        self.channel_reasoner = ChannelCache(self._spill, size_of=RpgReasoner.memory_size, **cache_options)
+        self._loading = SingleFlight()
+
+    def _storage(self):
+        if self.storage is None:
+            self.storage, self.spill_ttl = default_storage()
+        return self.storage
+
+    def _spill(self, channel_id, reasoner: RpgReasoner):
+        storage = self._storage()
+        if storage is not None:
+            storage.set(f"{self.spill_prefix}{channel_id}", dump_state(reasoner.to_state()), self.spill_ttl)
+
+    def _restore(self, channel_id):
+        storage = self._storage()
+        blob = storage.get(f"{self.spill_prefix}{channel_id}") if storage is not None else None
+        if not blob:
+            return None
+        reasoner = RpgReasoner(str(channel_id))
+        reasoner.load_state(load_state(blob))
+        return reasoner
     
-    def add_channel(self, channel) -> RpgReasoner:
-        if channel.name in self.channel_reasoner.keys():
-            return self.channel_reasoner[channel.name]
-        else:
+    async def add_channel(self, channel) -> RpgReasoner:
+        reasoner = self.channel_reasoner.get(channel.id)
+        if reasoner is not None:
+            return reasoner
+        # Criar o reasoner carrega o RAG e lê o armazenamento: numa thread, uma vez por canal
+        return await self._loading.run(channel.id, lambda: asyncio.to_thread(self._load_channel, channel))
+
+    def _load_channel(self, channel) -> RpgReasoner:
+        try:
+            reasoner = self._restore(channel.id)
+        except Exception as e:
+            print(f"Erro ao restaurar reasoner do canal {channel.id}: {e}")
+            reasoner = None
+        if reasoner is None:
             # Criar reasoner com ID do canal para contexto Redis
             reasoner = RpgReasoner(str(channel.id))
-            self.channel_reasoner[channel.name] = reasoner
-            print(f"Current reasoners: {self.channel_reasoner}")
-            return reasoner
+        else:
+            print(f"♻️ Reasoner do canal {channel.name} restaurado")
+        self.channel_reasoner.put(channel.id, reasoner)
+        print(f"Current reasoners: {len(self.channel_reasoner)}")
+        return reasoner
     
 GlobalReasonerManager = ReasonerManager()
-    
-    
\ No newline at end of file
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Testes da execução assíncrona do RpgReasoner
+Uma geração lenta num canal não pode travar o loop de eventos nem os outros canais
+"""
+
+import sys
+import os
+import asyncio
+import time
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import FakeModel, make_chat, response, text_part
+from llm_tools import LanguageModel
+from rpg_tools.reasoner import RpgReasoner
+
+GENERATION_SECONDS = 0.3
+
+class BlockingModel(FakeModel):
+    """Modelo falso com chamadas síncronas lentas, como o cliente do Gemini"""
+
+    def generate_content_with_functions(self, req, tools):
+        time.sleep(GENERATION_SECONDS)
+        return response(text_part("resposta"))
+
+class AsyncModel(BlockingModel):
+    """Modelo falso com cliente assíncrono nativo"""
+
+    async def generate_content_with_functions_async(self, req, tools):
+        await asyncio.sleep(GENERATION_SECONDS)
+        return response(text_part("resposta"))
+
+async def serve_channels(model: LanguageModel, channels: int):
+    """Atende vários canais ao mesmo tempo e conta quantas vezes o loop conseguiu rodar"""
+    ticks = 0
+    stop = asyncio.Event()
+
+    async def heartbeat():
+        nonlocal ticks
+        while not stop.is_set():
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    beat = asyncio.create_task(heartbeat())
+    reasoners = [RpgReasoner() for _ in range(channels)]
+    start = time.perf_counter()
+    results = await asyncio.gather(*(r.GenerateRequest(make_chat(f"olá do canal {i}"), model) for i, r in enumerate(reasoners)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await beat
+    return results, elapsed, ticks
+
+def test_channels_are_served_in_parallel():
+    channels = 4
+    for model in (BlockingModel(), AsyncModel()):
+        results, elapsed, ticks = asyncio.run(serve_channels(model, channels))
+        assert results == [["resposta"]] * channels
+        # Em série levaria channels * GENERATION_SECONDS
+        assert elapsed < 2 * GENERATION_SECONDS, f"{type(model).__name__}: {elapsed:.2f}s"
+        # O loop continuou livre durante as gerações
+        assert ticks >= 10
+
+def test_pipeline_stages_run_concurrently():
+    """Atualização do contexto, resumo e geração: o caminho crítico é a etapa mais lenta, não a soma"""
+    reasoner = RpgReasoner()
+    reasoner._update_context = lambda message, username: time.sleep(0.3)
+    reasoner._get_context_summary = lambda: time.sleep(0.2) or "Thorin está em Ironforge"
+
+    async def scenario():
+        start = time.perf_counter()
+        result = await reasoner.ConversationRequest(make_chat("olá do canal 0"), AsyncModel())
+        elapsed = time.perf_counter() - start
+        await asyncio.gather(*reasoner._background)
+        return result, elapsed
+
+    result, elapsed = asyncio.run(scenario())
+    assert result == ["resposta"]
+    # Em série: 0.3 + 0.2 + 0.3
+    assert elapsed < 0.65, f"{elapsed:.2f}s"
+    assert set(reasoner.stage_latency) >= {"context_update", "context_summary", "rag", "generation"}
+
+def test_reply_does_not_wait_for_context_update():
+    reasoner = RpgReasoner()
+    reasoner._update_context = lambda message, username: time.sleep(1)
+    reasoner._get_context_summary = lambda: ""
+
+    async def scenario():
+        start = time.perf_counter()
+        result = await reasoner.ConversationRequest(make_chat("olá do canal 0"), AsyncModel())
+        elapsed = time.perf_counter() - start
+        # A atualização segue depois da resposta entregue
+        pending = len(reasoner._background)
+        await asyncio.gather(*reasoner._background)
+        return result, elapsed, pending
+
+    result, elapsed, pending = asyncio.run(scenario())
+    assert result == ["resposta"]
+    assert elapsed < 0.8, f"{elapsed:.2f}s"
+    assert pending == 1
+    assert reasoner.stage_latency["context_update"] >= 1000
+    assert not reasoner._background
+
+def test_slow_stage_times_out():
+    reasoner = RpgReasoner()
+    reasoner.stage_timeouts["context_summary"] = 0.05
+    reasoner._get_context_summary = lambda: time.sleep(1) or "nunca chega"
+
+    async def timed_request():
+        start = time.perf_counter()
+        result = await reasoner.ConversationRequest(make_chat("olá do canal 0"), AsyncModel())
+        return result, time.perf_counter() - start
+
+    # A thread da etapa abandonada segue até o fim; só a resposta é medida
+    result, elapsed = asyncio.run(timed_request())
+    assert result == ["resposta"]
+    assert elapsed < 0.9
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-v"]))
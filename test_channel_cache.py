@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Testes dos gerenciadores de canais com despejo LRU e restauração pelo armazenamento
+"""
+
+import sys
+import os
+import asyncio
+import datetime
+from types import SimpleNamespace
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from discord_tools.channel_cache import ChannelCache
+from discord_tools.chat import ChatManager, ChatMessage
+from discord_tools.transcript_store import TranscriptStore
+from rpg_tools.context_storage import MemoryContextStorage
+from rpg_tools.reasoner import ReasonerManager, RpgState
+
+class FakeChannel:
+    """Canal falso: history() devolve as mensagens registradas, filtrando por `after`"""
+
+    def __init__(self, id: int, name: str):
+        self.id = id
+        self.name = name
+        self.fetches = []
+
+    def history(self, limit=100, after=None, oldest_first=True):
+        self.fetches.append(after)
+
+        async def messages():
+            return
+            yield
+        return messages()
+
+class FakeAuthor:
+    """Autor falso; precisa ser hashable porque os mapas globais de IDs usam o objeto como chave"""
+
+    def __init__(self, id: int, display_name: str):
+        self.id = id
+        self.display_name = display_name
+
+class HistoryChannel:
+    """Canal falso com `count` mensagens reais de texto, paginadas como na API do Discord"""
+
+    def __init__(self, id: int, count: int, fail_after_pages: int = None):
+        self.id = id
+        self.name = f"canal{id}"
+        self.members = []
+        self.guild = SimpleNamespace(members=[], roles=[])
+        author = FakeAuthor(1, "Thorin")
+        start = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+        self.messages = [SimpleNamespace(id=100 + i, content=f"passo {i}", author=author, mentions=[],
+                                         created_at=start + datetime.timedelta(seconds=i),
+                                         channel=self, guild=self.guild)
+                         for i in range(count)]
+        self.pages = 0
+        self.fail_after_pages = fail_after_pages
+
+    def history(self, limit=100, after=None, before=None, oldest_first=False):
+        if self.fail_after_pages is not None and self.pages >= self.fail_after_pages:
+            raise ConnectionError("bot reiniciado")
+        self.pages += 1
+        # `after` vem como horário ou como o ID (Object) da última mensagem guardada
+        after_id = getattr(after, "id", None)
+        found = [m for m in self.messages
+                 if (after is None or (m.id > after_id if after_id else m.created_at > after))
+                 and (before is None or m.id < before.id)]
+        found = found[:limit] if oldest_first else found[::-1][:limit]
+
+        async def messages():
+            for message in found:
+                yield message
+        return messages()
+
+def test_lru_and_idle_eviction():
+    evicted = []
+    cache = ChannelCache(lambda key, value: evicted.append(key), max_channels=2, idle_ttl=3600, min_idle=0)
+    cache.put(1, "a")
+    cache.put(2, "b")
+    cache.get(1)
+    cache.put(3, "c")
+    assert evicted == [2]
+    assert 1 in cache and 3 in cache
+
+    cache.idle_ttl = 0
+    cache.evict()
+    assert sorted(evicted) == [1, 2, 3]
+    assert len(cache) == 0
+
+def test_memory_cap_keeps_recent_channels():
+    evicted = []
+    cache = ChannelCache(lambda key, value: evicted.append(key), size_of=len,
+                         max_channels=100, max_bytes=10, min_idle=3600)
+    cache.put(1, "x" * 8)
+    cache.put(2, "y" * 8)
+    # Os dois foram usados agora há pouco: o teto é excedido, mas nada é despejado
+    assert evicted == []
+    cache.min_idle = 0
+    cache.evict()
+    assert evicted == [1]
+
+def test_chat_spills_and_restores_with_delta_fetch():
+    storage = MemoryContextStorage()
+    manager = ChatManager(storage=storage, max_channels=1, min_idle=0)
+    # Mesmo nome em servidores diferentes não colide mais
+    taverna_a, taverna_b = FakeChannel(1, "taverna"), FakeChannel(2, "taverna")
+
+    async def scenario():
+        chat = await manager.add_channel(taverna_a)
+        when = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+        chat.append(ChatMessage.from_rendered(when, "Thorin", "$ Mensagem de Thorin às ontem: olá\n$$$"))
+        other = await manager.add_channel(taverna_b)
+        assert other is not chat
+        await asyncio.sleep(0.05)  # o despejo grava numa thread
+        restored = await manager.add_channel(taverna_a)
+        return chat, restored, when
+
+    chat, restored, when = asyncio.run(scenario())
+    assert restored is not chat
+    assert restored.history_text == chat.history_text
+    assert restored.messages[0].time == when
+    # Na volta, só busca o que chegou depois da última mensagem salva
+    assert taverna_a.fetches == [None, when]
+
+def test_reasoner_state_survives_eviction():
+    storage = MemoryContextStorage()
+    manager = ReasonerManager(storage=storage, max_channels=1, min_idle=0)
+    first = asyncio.run(manager.add_channel(FakeChannel(10, "taverna")))
+    first.world_history.WriteHistory("Ironforge resiste aos goblins.")
+    first.tool_settings.remove_tool("InitRPG")
+    first.state = RpgState.WorldBuild
+    first.history.summary, first.history.summarized_upto = "Thorin chegou.", 12
+
+    asyncio.run(manager.add_channel(FakeChannel(11, "masmorra")))
+    restored = asyncio.run(manager.add_channel(FakeChannel(10, "taverna")))
+    assert restored is not first
+    assert restored.state is RpgState.WorldBuild
+    assert "Ironforge" in restored.world_history.GetHistory()
+    assert "InitRPG" not in restored.tool_settings.Conversation_tool_list
+    assert (restored.history.summary, restored.history.summarized_upto) == ("Thorin chegou.", 12)
+
+def test_recent_history_first_then_backfill():
+    storage = MemoryContextStorage()
+    manager = ChatManager(storage=storage, recover_limit=50, backfill_page=100, backfill_delay=0.05)
+    channel = HistoryChannel(1, 350)
+
+    async def scenario():
+        chat = await manager.add_channel(channel)
+        # A primeira resposta só esperou pela página recente
+        first = [m.text for m in chat.messages]
+        await manager._backfills[channel.id]
+        return chat, first
+
+    chat, first = asyncio.run(scenario())
+    assert first == [f"passo {i}" for i in range(300, 350)]
+    assert [m.text for m in chat.messages] == [f"passo {i}" for i in range(350)]
+    assert manager._load_cursor(channel.id) == {"before": 100, "done": True}
+
+def test_backfill_resumes_from_persisted_cursor():
+    storage = MemoryContextStorage()
+    channel = HistoryChannel(1, 350, fail_after_pages=3)
+    manager = ChatManager(storage=storage, recover_limit=50, backfill_page=100, backfill_delay=0)
+
+    async def first_run():
+        await manager.add_channel(channel)
+        await manager._backfills[channel.id]
+
+    asyncio.run(first_run())
+    # Recentes e uma página anterior; a segunda página falhou
+    assert manager._load_cursor(channel.id) == {"before": 200, "done": False}
+
+    # Reinício sem despejo: um ChatManager novo, só com o armazenamento compartilhado
+    channel.fail_after_pages, channel.pages = None, 0
+    restarted = ChatManager(storage=storage, recover_limit=50, backfill_page=100, backfill_delay=0)
+
+    async def second_run():
+        chat = await restarted.add_channel(channel)
+        await restarted._backfills[channel.id]
+        return chat
+
+    chat = asyncio.run(second_run())
+    # Busca do delta e páginas a partir do cursor (a última vem vazia), sem recomeçar do início
+    assert channel.pages == 3
+    assert [m.text for m in chat.messages] == [f"passo {i}" for i in range(350)]
+
+def test_concurrent_first_messages_share_one_initialization():
+    chats = ChatManager(storage=MemoryContextStorage(), recover_limit=50, backfill_delay=0)
+    reasoners = ReasonerManager(storage=MemoryContextStorage())
+    channel = HistoryChannel(1, 20)
+
+    async def scenario():
+        return await asyncio.gather(*(chats.add_channel(channel) for _ in range(5)),
+                                    *(reasoners.add_channel(channel) for _ in range(5)))
+
+    results = asyncio.run(scenario())
+    assert all(chat is results[0] for chat in results[:5])
+    assert all(reasoner is results[5] for reasoner in results[5:])
+    # Uma só busca na API do Discord; as outras chamadas esperaram a mesma tarefa
+    assert channel.pages == 1
+    assert chats._loading.joined == 4 and reasoners._loading.joined == 4
+
+def test_concurrent_first_messages_are_not_duplicated():
+    manager = ChatManager(storage=MemoryContextStorage(), recover_limit=50, backfill_delay=0)
+    channel = HistoryChannel(1, 20)
+    first, second = channel.messages[-2:]
+
+    async def on_message(message):
+        chat = await manager.add_channel(channel)
+        chat.add_message(message, "Thorin")
+        return chat
+
+    async def scenario():
+        return await asyncio.gather(on_message(first), on_message(second))
+
+    # As duas mensagens já estão no histórico buscado pela recuperação compartilhada
+    chat, _ = asyncio.run(scenario())
+    assert manager._loading.joined == 1
+    assert [m.message_id for m in chat.messages] == [m.id for m in channel.messages]
+
+def test_transcript_store_warm_restart(tmp_path):
+    path = str(tmp_path / "transcripts.db")
+    storage, channel = MemoryContextStorage(), HistoryChannel(1, 30)
+    manager = ChatManager(storage=storage, recover_limit=50, backfill_delay=0, transcripts=TranscriptStore(path))
+    chat = asyncio.run(manager.add_channel(channel))
+    # A mensagem que disparou, vinda do on_message, já entrou pela recuperação
+    chat.add_message(channel.messages[-1], "Thorin")
+    assert len(chat.messages) == 30
+    manager.transcripts.close()
+
+    # Reinício: chegaram mais 3 mensagens enquanto o bot estava fora
+    more = HistoryChannel(1, 33)
+    more.messages[:30] = channel.messages
+    store = TranscriptStore(path)
+    restarted = ChatManager(storage=storage, recover_limit=50, backfill_delay=0, transcripts=store)
+    assert asyncio.run(restarted.rehydrate({1: more}.get)) == 1
+    chat = asyncio.run(restarted.add_channel(more))
+    # Só a busca do delta, depois do último ID guardado; sem on_message, a mais nova também entra
+    assert more.pages == 1
+    assert [m.text for m in chat.messages] == [f"passo {i}" for i in range(33)]
+    store.flush()
+    assert [row[0] for row in store.load(1, 5)] == [128, 129, 130, 131, 132]
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Testes da janela de histórico com orçamento de tokens
+O resumo é feito por uma função local, sem chamadas ao Gemini
+"""
+
+import sys
+import os
+import datetime
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from discord_tools.chat import Chat, ChatMessage
+from rpg_tools.chat_history import ChatHistory, HistoryBudget, estimate_tokens
+
+def fake_summarizer(summary, lines, model):
+    """Guarda só a contagem de mensagens resumidas"""
+    previous = int(summary.split()[0]) if summary else 0
+    return f"{previous + lines.count('$ Mensagem de')} mensagens resumidas"
+
+def add_messages(chat: Chat, start: int, count: int):
+    base = datetime.datetime(2025, 1, 1)
+    for i in range(start, start + count):
+        chat.append(ChatMessage(None, base + datetime.timedelta(seconds=i), f"Jogador{i % 4}",
+                            f"eu avanço pelo corredor escuro da masmorra, passo {i}"))
+
+def test_short_history_is_verbatim():
+    chat = Chat()
+    add_messages(chat, 0, 10)
+    history = ChatHistory(HistoryBudget(recent_tokens=1000), summarizer=fake_summarizer)
+    text = history.build(chat)
+    assert "passo 0" in text and "passo 9" in text
+    assert history.summary == ""
+
+def test_prompt_size_stays_bounded():
+    chat = Chat()
+    budget = HistoryBudget(recent_tokens=600, summary_tokens=100)
+    history = ChatHistory(budget, summarizer=fake_summarizer)
+    sizes = []
+    for step in range(40):
+        add_messages(chat, step * 25, 25)
+        text = history.build(chat)
+        history.wait(5)
+        sizes.append(estimate_tokens(text))
+    limit = budget.recent_tokens + budget.fold_tokens + budget.summary_tokens + 100
+    assert max(sizes) <= limit
+    # A última mensagem sempre vai na íntegra; as antigas só no resumo
+    text = history.build(chat)
+    assert "passo 999" in text and "passo 0," not in text
+    assert "mensagens resumidas" in text
+    assert history.summarized_upto == int(history.summary.split()[0])
+
+def test_summarizer_failure_keeps_window():
+    def broken(summary, lines, model):
+        raise RuntimeError("sem modelo")
+    chat = Chat()
+    add_messages(chat, 0, 500)
+    history = ChatHistory(HistoryBudget(recent_tokens=600), summarizer=broken)
+    history.build(chat)
+    history.wait(5)
+    text = history.build(chat)
+    assert history.summarized_upto is None
+    assert "passo 499" in text
+    assert estimate_tokens(text) < 1000
+
+def test_ring_buffer_keeps_summary_cursor_absolute():
+    chat = Chat(max_messages=300)
+    history = ChatHistory(HistoryBudget(recent_tokens=600, summary_tokens=100), summarizer=fake_summarizer)
+    for step in range(40):
+        add_messages(chat, step * 25, 25)
+        history.build(chat)
+        history.wait(5)
+    # O buffer guarda só as últimas 300; o cursor conta também as que saíram
+    assert len(chat.messages) == 300 and chat.first_index == 700
+    assert chat.messages[0].text == "eu avanço pelo corredor escuro da masmorra, passo 700"
+    assert chat.first_index < history.summarized_upto <= 1000
+    assert "passo 999" in history.build(chat)
+
+    restored = Chat.from_state(chat.to_state())
+    assert restored.first_index == chat.first_index
+    assert restored.history_text == chat.history_text
+    assert restored.memory_size() == chat.memory_size()
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-v"]))
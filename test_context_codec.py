@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Testes do codec versionado dos contextos RPG armazenados
+"""
+
+import sys
+import os
+import json
+from datetime import datetime
+
+import pytest
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from rpg_tools import context_codec
+from rpg_tools.context_codec import (ContextCodec, MAGIC, HEADER_SIZE, SCHEMA_VERSION, SERIALIZER_JSON,
+                                     SERIALIZER_ORJSON, SERIALIZER_MSGPACK, COMPRESSION_NONE,
+                                     COMPRESSION_ZLIB, COMPRESSION_ZSTD, migrate)
+from rpg_tools.context_manager import RpgContext
+
+def make_context(events: int = 3) -> RpgContext:
+    return RpgContext(
+        session_id="42_1735732800", channel_id="42", channel_name="taverna",
+        world_name="Terra dos Anões", created_at=datetime(2025, 1, 1, 12, 0),
+        player_characters=[{"name": "Thorin", "role": "guerreiro"}],
+        key_events=[{"type": "event", "description": f"O dragão atacou a cidade {i}", "importance": "high"}
+                    for i in range(events)],
+        event_summaries=[{"level": 1, "count": 100, "highlights": ["Ironforge resistiu"]}],
+    )
+
+SERIALIZERS = [
+    SERIALIZER_JSON,
+    pytest.param(SERIALIZER_ORJSON, marks=pytest.mark.skipif(not context_codec.ORJSON_AVAILABLE, reason="sem orjson")),
+    pytest.param(SERIALIZER_MSGPACK, marks=pytest.mark.skipif(not context_codec.MSGPACK_AVAILABLE, reason="sem msgpack")),
+]
+
+@pytest.mark.parametrize("serializer", SERIALIZERS)
+def test_roundtrip(serializer):
+    codec = ContextCodec(RpgContext, serializer=serializer, compression="none")
+    context = make_context()
+    blob = codec.encode(context)
+    assert blob[:HEADER_SIZE] == MAGIC + bytes((SCHEMA_VERSION, serializer, COMPRESSION_NONE))
+    decoded = codec.decode(blob)
+    assert decoded.model_dump() == context.model_dump()
+    assert codec.decode_dict(blob)["world_name"] == "Terra dos Anões"
+
+@pytest.mark.parametrize("compression, flag", [
+    ("zlib", COMPRESSION_ZLIB),
+    pytest.param("zstd", COMPRESSION_ZSTD,
+                 marks=pytest.mark.skipif(not context_codec.ZSTD_AVAILABLE, reason="sem zstandard")),
+])
+def test_compressed_payload(compression, flag):
+    codec = ContextCodec(RpgContext, compression=compression, compress_threshold=256)
+    context = make_context(events=50)
+    blob = codec.encode(context)
+    assert blob[HEADER_SIZE - 1] == flag
+    assert len(blob) < len(context.model_dump_json(exclude_none=True))
+    assert codec.decode(blob).model_dump() == context.model_dump()
+
+    # Abaixo do limiar, o payload vai sem compressão
+    small = ContextCodec(RpgContext, compression=compression, compress_threshold=1 << 20).encode(context)
+    assert small[HEADER_SIZE - 1] == COMPRESSION_NONE
+
+def test_legacy_plain_json_is_migrated():
+    # Formato original: JSON do pydantic sem cabeçalho nem event_summaries
+    legacy = json.loads(make_context().model_dump_json())
+    del legacy["event_summaries"]
+    codec = ContextCodec(RpgContext)
+    for blob in (json.dumps(legacy).encode(), json.dumps(legacy)):
+        decoded = codec.decode(blob)
+        assert decoded.event_summaries == []
+        assert decoded.key_events[0]["description"] == "O dragão atacou a cidade 0"
+
+def test_migrate_v1_to_v2():
+    data = migrate({"session_id": "1", "key_events": []}, 1)
+    assert data["event_summaries"] == []
+    # Dados já na versão atual passam intactos
+    assert migrate({"event_summaries": [{"level": 2}]}, SCHEMA_VERSION) == {"event_summaries": [{"level": 2}]}
+
+    # Um blob v1 com cabeçalho também é migrado na leitura
+    payload = json.dumps({"session_id": "1", "channel_id": "1", "channel_name": "taverna"}).encode()
+    blob = MAGIC + bytes((1, SERIALIZER_JSON, COMPRESSION_NONE)) + payload
+    assert ContextCodec(RpgContext).decode(blob).event_summaries == []
+
+@pytest.mark.parametrize("version", [0, SCHEMA_VERSION + 1])
+def test_unknown_or_future_version_is_rejected(version):
+    with pytest.raises(ValueError):
+        migrate({}, version)
+    blob = MAGIC + bytes((version, SERIALIZER_JSON, COMPRESSION_NONE)) + make_context().model_dump_json().encode()
+    with pytest.raises(ValueError):
+        ContextCodec(RpgContext).decode(blob)
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
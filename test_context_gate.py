@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Testes do pré-filtro que evita análises de contexto pelo LLM
+"""
+
+import sys
+import os
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from rpg_tools.context_gate import ContextGate
+from rpg_tools.context_manager import ContextManager, RpgContext
+from rpg_tools.context_storage import MemoryContextStorage
+from fakes import FakeAnalyzer
+
+CHATTER = ["lol", "ok", "kkkkkk", "hahaha", "1d20+3", "rolei 17", "(( vou pegar água ))",
+           "ooc: alguém viu o jogo ontem?", "<@123456> ok", "blz, valeu!", "👍", "Vamos jogar RPG!"]
+
+NARRATIVE = [
+    "Meu personagem é um guerreiro anão chamado Thorin",
+    "Vamos criar um mundo medieval chamado Terra dos Anões com uma cidade chamada Ironforge",
+    "O grupo chega à taverna do Pônei Saltitante e encontra um mago misterioso",
+    "A missão agora é recuperar o artefato roubado do templo",
+]
+
+def test_chatter_is_skipped():
+    gate = ContextGate()
+    for message in CHATTER:
+        assert not gate.should_analyze(message), message
+    assert gate.stats()["skipped"] == len(CHATTER)
+
+def test_narrative_is_analyzed():
+    gate = ContextGate()
+    for message in NARRATIVE:
+        assert gate.should_analyze(message), message
+
+def test_gazetteer_overrides_length():
+    context = RpgContext(session_id="s", channel_id="c", channel_name="c")
+    context.add_character({"name": "Thorin"}, is_player=True)
+    gate = ContextGate()
+    assert gate.should_analyze("thórin morre", context)
+    assert not gate.should_analyze("ele morre", context)
+
+def test_manager_avoids_analyzer_calls():
+    class CountingAnalyzer(FakeAnalyzer):
+        calls = 0
+        def analyze_message_context(self, message, current_context=None):
+            CountingAnalyzer.calls += 1
+            return super().analyze_message_context(message, current_context)
+
+    manager = ContextManager(MemoryContextStorage(), analyzer=CountingAnalyzer())
+    for message in CHATTER + NARRATIVE:
+        manager.update_context("42", message, "Thorin")
+    assert CountingAnalyzer.calls == len(NARRATIVE)
+    stats = manager.gate.stats()
+    print(f"\n🚦 {stats['skipped']} de {stats['checked']} análises evitadas")
+    assert stats["skipped"] == len(CHATTER)
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-v", "-s"]))
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Testes de conformidade e desempenho dos backends de contexto RPG
+Os mesmos testes rodam contra memória, SQLite e Redis (se houver servidor)
+"""
+
+import sys
+import os
+import sqlite3
+import time
+from datetime import timedelta
+
+import pytest
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from rpg_tools.context_storage import MemoryContextStorage, SqliteContextStorage, RedisContextStorage
+from rpg_tools.context_manager import ContextManager
+from fakes import FakeAnalyzer
+
+def make_manager(storage, **kwargs) -> ContextManager:
+    """Gerenciador com as chaves sob rpg:test:, apagadas pelo fixture do Redis"""
+    manager = ContextManager(storage, analyzer=FakeAnalyzer(), **kwargs)
+    manager.session_prefix = "rpg:test:session:"
+    manager.channel_prefix = "rpg:test:channel:"
+    manager.summary_prefix = "rpg:test:summary:"
+    return manager
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def storage(request, tmp_path):
+    if request.param == "memory":
+        yield MemoryContextStorage()
+    elif request.param == "sqlite":
+        backend = SqliteContextStorage(str(tmp_path / "context.db"))
+        yield backend
+        backend.close()
+    else:
+        backend = RedisContextStorage()
+        if not backend.ping():
+            pytest.skip("Redis não está disponível")
+        yield backend
+        for key in list(backend.scan_iter("rpg:test:")):
+            backend.delete(key)
+
+def test_get_set_delete(storage):
+    assert storage.get("rpg:test:missing") is None
+    storage.set("rpg:test:a", b"\x00\x01binario")
+    assert storage.get("rpg:test:a") == b"\x00\x01binario"
+    storage.set("rpg:test:a", b"novo")
+    assert storage.get("rpg:test:a") == b"novo"
+    storage.delete("rpg:test:a")
+    assert storage.get("rpg:test:a") is None
+    storage.delete("rpg:test:a")
+
+def test_ttl_expiration(storage):
+    storage.set("rpg:test:ttl", b"x", timedelta(milliseconds=50))
+    storage.set("rpg:test:durable", b"y")
+    assert storage.get("rpg:test:ttl") == b"x"
+    time.sleep(0.1)
+    assert storage.get("rpg:test:ttl") is None
+    assert storage.get("rpg:test:durable") == b"y"
+
+def test_hash_fields(storage):
+    assert storage.hget("rpg:test:hash", "version") is None
+    storage.hset("rpg:test:hash", {"version": b"1", "text": b"resumo"}, timedelta(hours=1))
+    storage.hset("rpg:test:hash", {"version": b"2"}, timedelta(hours=1))
+    assert storage.hget("rpg:test:hash", "version") == b"2"
+    assert storage.hget("rpg:test:hash", "text") == b"resumo"
+    assert "rpg:test:hash" in list(storage.scan_iter("rpg:test:"))
+    storage.delete("rpg:test:hash")
+    assert storage.hget("rpg:test:hash", "text") is None
+
+def test_scan_prefix(storage):
+    for i in range(5):
+        storage.set(f"rpg:test:scan:{i}", b"v")
+    storage.set("rpg:test:other", b"v")
+    assert sorted(storage.scan_iter("rpg:test:scan:")) == [f"rpg:test:scan:{i}" for i in range(5)]
+
+def test_incremental_scan(storage):
+    for i in range(25):
+        storage.set(f"rpg:test:page:{i:02d}", b"v")
+    cursor, seen, batches = None, [], 0
+    while True:
+        cursor, keys = storage.scan("rpg:test:page:", cursor, count=10)
+        seen += keys
+        batches += 1
+        if cursor is None:
+            break
+    assert sorted(set(seen)) == [f"rpg:test:page:{i:02d}" for i in range(25)]
+    assert batches >= 2
+
+def test_expire_and_memory_usage(storage):
+    storage.set("rpg:test:slide", b"x" * 100, timedelta(milliseconds=80))
+    time.sleep(0.05)
+    assert storage.expire("rpg:test:slide", timedelta(milliseconds=80))
+    time.sleep(0.05)
+    assert storage.get("rpg:test:slide") == b"x" * 100
+    assert storage.memory_usage("rpg:test:slide") >= 100
+    assert not storage.expire("rpg:test:missing", timedelta(seconds=1))
+    assert storage.memory_usage("rpg:test:missing") is None
+
+def test_manager_roundtrip(storage):
+    manager = make_manager(storage)
+    assert manager.get_session("42") is None
+    session_id = manager.create_session("42", "taverna")
+    assert manager.get_session("42").session_id == session_id
+
+    context = manager.update_context("42", "O dragão atacou a cidade", "Thorin")
+    assert context.world_name == "Terra dos Anões"
+    reloaded = manager.get_session("42")
+    assert reloaded.has_character("thorin")
+    assert reloaded.current_location == "Ironforge"
+    assert "Terra dos Anões" in manager.get_context_summary("42")
+
+    # O resumo acompanha a versão, inclusive entre instâncias do gerenciador
+    other = make_manager(storage)
+    assert other.get_context_summary("42") == manager.get_context_summary("42")
+    manager.update_context("42", "A rainha Elara é coroada em Ironforge", "Thorin")
+    assert "Elara" in other.get_context_summary("42")
+
+def test_sweeper_removes_orphans(storage):
+    manager = make_manager(storage)
+    for channel in range(5):
+        manager.create_session(str(channel), "canal")
+    # Sessões órfãs deixadas por versões antigas, sem canal apontando para elas
+    for channel in range(5):
+        storage.set(f"rpg:test:session:{channel}_1", b"antiga", timedelta(hours=1))
+
+    totals = manager.cleanup_expired_sessions()
+    assert totals["removed"] == 5
+    report = manager.memory_report()
+    assert report["rpg:test:session:"]["keys"] == 5
+    assert report["rpg:test:channel:"]["keys"] == 5
+    assert report["rpg:test:session:"]["bytes"] > 0
+
+def test_sweeper_keeps_session_being_created(storage):
+    manager = make_manager(storage)
+    # A varredura roda noutra thread; aqui ela acontece logo depois da sessão ser gravada
+    save_context = manager._save_context
+
+    def save_and_sweep(context):
+        save_context(context)
+        manager.cleanup_expired_sessions()
+
+    manager._save_context = save_and_sweep
+    context = manager.update_context("9", "O dragão atacou a cidade", "Thorin")
+    assert context.world_name == "Terra dos Anões"
+    assert manager.get_session("9") is not None
+
+def test_sqlite_purges_expired_rows(tmp_path):
+    storage = SqliteContextStorage(str(tmp_path / "context.db"))
+    storage.set("rpg:test:old", b"x", timedelta(milliseconds=20))
+    storage.hset("rpg:test:hash", {"version": b"1"}, timedelta(milliseconds=20))
+    storage.set("rpg:test:durable", b"y")
+    time.sleep(0.05)
+    # O início de cada varredura apaga as linhas expiradas, que as leituras só ignoravam
+    assert list(storage.scan_iter("rpg:test:")) == ["rpg:test:durable"]
+    rows = storage._conn.execute("SELECT (SELECT COUNT(*) FROM rpg_kv), (SELECT COUNT(*) FROM rpg_hash)").fetchone()
+    assert rows == (1, 0)
+
+    # Um hset que falha desfaz a transação e não prende a conexão
+    with pytest.raises(sqlite3.IntegrityError):
+        storage.hset("rpg:test:hash", {"version": b"2", "text": None})
+    assert not storage._conn.in_transaction
+    assert storage.hget("rpg:test:hash", "version") is None
+    storage.set("rpg:test:after", b"z")
+    assert storage.get("rpg:test:after") == b"z"
+    storage.close()
+
+def test_sliding_expiry(storage):
+    manager = make_manager(storage, session_ttl=timedelta(milliseconds=300))
+    manager.touch_interval = 0
+
+    manager.create_session("7", "canal")
+    for _ in range(4):
+        time.sleep(0.1)
+        assert manager.get_session("7") is not None
+    time.sleep(0.4)
+    assert manager.get_session("7") is None
+
+def test_deleted_and_expired_sessions_leave_no_memory_state(storage):
+    manager = make_manager(storage, session_ttl=timedelta(milliseconds=200))
+    manager.touch_interval = 0
+    for channel in ("1", "2"):
+        manager.create_session(channel, "canal")
+        manager.get_context_summary(channel)
+    assert set(manager._summary_cache) == set(manager._last_touch) == {"1", "2"}
+
+    # Canal apagado com a sessão ainda gravada: a varredura remove a órfã e esquece o canal
+    storage.delete("rpg:test:channel:1")
+    manager.cleanup_expired_sessions()
+    assert "1" not in manager._summary_cache and "1" not in manager._last_touch
+
+    # Canal que expirou sozinho no armazenamento
+    time.sleep(0.3)
+    manager.cleanup_expired_sessions()
+    assert not manager._summary_cache and not manager._last_touch
+
+def test_performance(storage):
+    """Mede operações por segundo; o limite é folgado, serve para detectar regressões grosseiras"""
+    payload = b"x" * 2048
+    operations = 2000
+    start = time.perf_counter()
+    for i in range(operations):
+        storage.set(f"rpg:test:perf:{i % 100}", payload, timedelta(hours=1))
+        assert storage.get(f"rpg:test:perf:{i % 100}") == payload
+    elapsed = time.perf_counter() - start
+    print(f"\n{type(storage).__name__}: {2 * operations / elapsed:.0f} ops/s")
+    assert elapsed < 10
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v", "-s"]))
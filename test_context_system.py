@@ -17,8 +17,9 @@ async def test_context_system():
     
     try:
         # Testar importação do sistema de contexto
-        from rpg_tools.context_manager import context_manager, RpgContext
+        from rpg_tools.context_manager import get_context_manager, RpgContext
         print("✅ Sistema de contexto importado com sucesso")
+        context_manager = get_context_manager()
         
         # Testar criação de contexto
         print("\n📝 Testando criação de contexto...")
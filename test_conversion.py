@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Testes da conversão das mensagens do Discord para texto dos prompts
+Só os IDs mencionados são resolvidos, sem varrer os membros do servidor
+"""
+
+import sys
+import os
+import asyncio
+import datetime
+from types import SimpleNamespace
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from discord_tools.chat import Chat
+from discord_tools.conversion import parse_message
+from discord_tools.user_id import UserId, RoleId
+import discord_tools.user_id as user_id
+
+class FakeEntity:
+    """Usuário ou cargo falso; precisa ser hashable porque os mapas de IDs usam o objeto como chave"""
+
+    def __init__(self, id: int, **attrs):
+        self.id = id
+        self.__dict__.update(attrs)
+
+class FakeGuild:
+    """Servidor cujo cache só conhece `cached`; membros de `remote` só vêm pela API"""
+
+    def __init__(self, cached=(), roles=(), remote=()):
+        self.cached = {member.id: member for member in cached}
+        self.role_cache = {role.id: role for role in roles}
+        self.remote = {member.id: member for member in remote}
+        self.fetches = []
+
+    @property
+    def members(self):
+        raise AssertionError("parse_message não deve varrer os membros do servidor")
+
+    def get_member(self, id):
+        return self.cached.get(id)
+
+    def get_role(self, id):
+        return self.role_cache.get(id)
+
+    def get_channel(self, id):
+        return None
+
+    async def fetch_member(self, id):
+        self.fetches.append(id)
+        if id not in self.remote:
+            raise LookupError(id)
+        return self.remote[id]
+
+def message(content, guild, mentions=(), role_mentions=(), channel_mentions=()):
+    return SimpleNamespace(content=content, guild=guild, mentions=list(mentions),
+                           role_mentions=list(role_mentions), channel_mentions=list(channel_mentions),
+                           author=FakeEntity(1, display_name="Autor"))
+
+def fresh_maps(monkeypatch):
+    monkeypatch.setattr(user_id, "GlobalUserId", UserId())
+    monkeypatch.setattr(user_id, "GlobalRoleId", RoleId())
+    import discord_tools.conversion as conversion
+    monkeypatch.setattr(conversion, "GlobalUserId", user_id.GlobalUserId)
+    monkeypatch.setattr(conversion, "GlobalRoleId", user_id.GlobalRoleId)
+
+def test_resolves_only_mentioned_ids(monkeypatch):
+    fresh_maps(monkeypatch)
+    thorin = FakeEntity(10, display_name="Thorin")
+    mago = FakeEntity(20, display_name="Gandalf")
+    guarda = FakeEntity(90, name="guarda")
+    guild = FakeGuild(cached=[mago], roles=[guarda])
+
+    text = parse_message(message("<@10> ataca", guild, mentions=[thorin]))
+    assert text == "@Thorin ataca"
+    # Fora das menções da mensagem, vem do cache do servidor
+    assert parse_message(message("fala <@20>", guild)) == "fala @Gandalf"
+    assert parse_message(message("chamem a <@&90>", guild)) == "chamem a @role_guarda"
+    assert set(user_id.GlobalUserId.id_user) == {10, 20}
+
+def test_unknown_member_is_fetched_once_in_background(monkeypatch):
+    fresh_maps(monkeypatch)
+    gimli = FakeEntity(30, display_name="Gimli")
+    guild = FakeGuild(remote=[gimli])
+
+    async def scenario():
+        first = [parse_message(message(f"<@{id}> chega", guild)) for id in (30, 40)]
+        parse_message(message("<@40> chega", guild))
+        await asyncio.sleep(0.01)
+        later = [parse_message(message(f"<@{id}> chega", guild)) for id in (30, 40)]
+        return first, later
+
+    first, later = asyncio.run(scenario())
+    assert first == ["@usuário_desconhecido chega"] * 2
+    assert later == ["@Gimli chega", "@usuário_desconhecido chega"]
+    # O ID inexistente não é buscado de novo a cada menção
+    assert sorted(guild.fetches) == [30, 40]
+
+def test_stored_message_is_rerendered_when_member_is_found(monkeypatch):
+    fresh_maps(monkeypatch)
+    gimli = FakeEntity(30, display_name="Gimli")
+    guild = FakeGuild(remote=[gimli])
+    chat = Chat()
+
+    async def scenario():
+        for i, content in enumerate(("<@30> chega", "<@40> chega")):
+            msg = message(content, guild)
+            msg.id, msg.created_at = i + 1, datetime.datetime(2025, 1, 1)
+            chat.add_message(msg, "Thorin")
+        before = [m.text for m in chat.messages]
+        await asyncio.sleep(0.01)
+        return before
+
+    assert asyncio.run(scenario()) == ["@usuário_desconhecido chega"] * 2
+    # A busca encontrou o membro: a linha já guardada passa a trazer o nome
+    assert [m.text for m in chat.messages] == ["@Gimli chega", "@usuário_desconhecido chega"]
+    assert chat._bytes == sum(m.size() for m in chat.messages)
+    assert not user_id.GlobalUserId._waiters
+
+def test_text_between_mentions_is_kept(monkeypatch):
+    fresh_maps(monkeypatch)
+    thorin = FakeEntity(10, display_name="Thorin")
+    mago = FakeEntity(20, display_name="Gandalf")
+    guild = FakeGuild(cached=[thorin, mago])
+
+    # O padrão antigo `<.+>` engolia tudo entre a primeira e a última menção
+    assert parse_message(message("<@10> cura <@!20> e <@10>", guild)) == "@Thorin cura @Gandalf e @Thorin"
+    assert parse_message(message("a < b e c > d", guild)) == "a < b e c > d"
+    assert parse_message(message("sem marcação", guild)) == "sem marcação"
+
+def test_channel_emoji_and_timestamp_markup(monkeypatch):
+    fresh_maps(monkeypatch)
+    taverna = FakeEntity(50, name="taverna")
+    guild = FakeGuild()
+
+    text = parse_message(message("<#50> <#51> <:d20:123> <a:fogo:456>", guild, channel_mentions=[taverna]))
+    assert text == "#taverna #canal_desconhecido :d20: :fogo:"
+    # 1735732800 = 01/01/2025 12:00 UTC
+    assert parse_message(message("sessão <t:1735732800>", guild)) == "sessão 01/01/2025 12:00 UTC"
+    assert parse_message(message("<t:1735732800:t> <t:1735732800:d>", guild)) == "12:00 UTC 01/01/2025"
+    assert parse_message(message("<t:1735732800:R>", guild)) == "01/01/2025 12:00 UTC"
+    # Timestamp fora do intervalo fica como está
+    assert parse_message(message("<t:99999999999999999999>", guild)) == "<t:99999999999999999999>"
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-v"]))
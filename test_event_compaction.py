@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Testes da compactação em camadas do log de eventos do contexto RPG
+"""
+
+import sys
+import os
+import json
+from types import SimpleNamespace
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from rpg_tools.event_compaction import EventRetentionPolicy, compact_events, merge_summaries, enforce_payload_cap
+
+def event(i, **fields):
+    return {"type": "event", "description": f"evento {i}", "importance": "high",
+            "added_at": f"2025-01-01T00:{i // 60:02d}:{i % 60:02d}", **fields}
+
+def make_context(count):
+    return SimpleNamespace(key_events=[event(i) for i in range(count)], event_summaries=[])
+
+def payload_size(context):
+    return len(json.dumps({"events": context.key_events, "summaries": context.event_summaries}).encode())
+
+def test_compaction_keeps_recent_events_and_summarizes_whole_batches():
+    policy = EventRetentionPolicy(recent_events=10, summary_batch=5, max_highlights=2)
+    context = make_context(22)
+    assert policy.needs_compaction(context)
+
+    assert compact_events(context, policy)
+    # 12 em excesso: só os dois lotes completos viram resumos, na ordem em que aconteceram
+    assert [e["description"] for e in context.key_events] == [f"evento {i}" for i in range(10, 22)]
+    assert [(s["count"], s["from"], s["to"]) for s in context.event_summaries] == [
+        (5, "2025-01-01T00:00:00", "2025-01-01T00:00:04"),
+        (5, "2025-01-01T00:00:05", "2025-01-01T00:00:09"),
+    ]
+    # Os destaques guardados são os mais recentes do lote
+    assert context.event_summaries[0]["highlights"] == ["evento 3", "evento 4"]
+    assert not compact_events(context, policy)
+
+    assert compact_events(context, policy, force=True)
+    assert len(context.key_events) == 10
+    assert context.event_summaries[-1]["count"] == 2
+
+def test_summaries_deduplicate_names_in_order():
+    policy = EventRetentionPolicy(recent_events=0, summary_batch=10)
+    context = SimpleNamespace(event_summaries=[], key_events=[
+        {"type": "location", "name": "Ironforge"},
+        {"type": "quest", "name": "Resgatar a rainha"},
+        {"type": "location", "name": "Moria"},
+        {"type": "location", "name": "Ironforge"},
+        {"type": "quest", "name": "Resgatar a rainha"},
+        {"type": "event", "description": "sem importância", "importance": "low"},
+    ])
+    compact_events(context, policy, force=True)
+    summary = context.event_summaries[0]
+    assert summary["locations"] == ["Ironforge", "Moria"]
+    assert summary["quests"] == ["Resgatar a rainha"]
+    assert summary["highlights"] == []
+    assert summary["from"] is None
+
+def test_merge_summaries_orders_and_caps_highlights():
+    older = {"level": 1, "count": 5, "from": "a", "to": "b", "highlights": ["h1", "h2"],
+             "locations": ["Moria", "Ironforge"], "quests": ["q1"]}
+    newer = {"level": 2, "count": 10, "from": "c", "to": "d", "highlights": ["h3", "h4"],
+             "locations": ["Ironforge", "Erebor"], "quests": ["q1", "q2"]}
+    merged = merge_summaries(older, newer, max_highlights=3)
+    assert merged["level"] == 3
+    assert merged["count"] == 15
+    assert (merged["from"], merged["to"]) == ("a", "d")
+    assert merged["highlights"] == ["h2", "h3", "h4"]
+    assert merged["locations"] == ["Moria", "Ironforge", "Erebor"]
+    assert merged["quests"] == ["q1", "q2"]
+
+def test_excess_summaries_merge_from_the_oldest():
+    policy = EventRetentionPolicy(recent_events=0, summary_batch=1, max_summaries=3, max_highlights=10)
+    context = make_context(5)
+    compact_events(context, policy)
+    # Os três mais antigos foram fundidos num nível superior; os dois últimos seguem intactos
+    assert [(s["level"], s["count"]) for s in context.event_summaries] == [(3, 3), (1, 1), (1, 1)]
+    assert context.event_summaries[0]["highlights"] == ["evento 0", "evento 1", "evento 2"]
+
+def test_payload_cap_trims_only_what_is_needed():
+    policy = EventRetentionPolicy(recent_events=20, summary_batch=10)
+    context = make_context(20)
+    policy.max_payload_bytes = payload_size(context)
+    # Exatamente no limite, nada muda
+    assert not enforce_payload_cap(context, policy, payload_size)
+    assert len(context.key_events) == 20
+
+    # Um byte abaixo força o corte dos eventos recentes, mantendo os mais novos
+    policy.max_payload_bytes -= 1
+    assert enforce_payload_cap(context, policy, payload_size)
+    assert payload_size(context) <= policy.max_payload_bytes
+    assert 0 < len(context.key_events) < 20
+    assert context.key_events[-1]["description"] == "evento 19"
+
+def test_payload_cap_drops_summary_details_before_events():
+    policy = EventRetentionPolicy(recent_events=5, summary_batch=5, max_highlights=5)
+    context = make_context(15)
+    compact_events(context, policy)
+    full = payload_size(context)
+    bare = json.loads(json.dumps(context.event_summaries))
+    for summary in bare:
+        summary["highlights"], summary["locations"], summary["quests"] = [], [], []
+    policy.max_payload_bytes = full - 1
+
+    assert enforce_payload_cap(context, policy, payload_size)
+    # Bastou esvaziar os detalhes do resumo mais antigo; os eventos recentes ficaram
+    assert context.event_summaries[0] == bare[0]
+    assert context.event_summaries[1]["highlights"]
+    assert len(context.key_events) == 5
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-v"]))
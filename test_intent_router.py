@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Testes do roteador de intenções: regras (RAG), narrativa e comandos
+"""
+
+import sys
+import os
+import asyncio
+import logging
+import threading
+import time
+from types import SimpleNamespace
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from rpg_tools.intent_router import IntentRouter, get_intent_router, INTENT_COMMAND, INTENT_NARRATIVE, INTENT_RULES
+from rpg_tools.reasoner import RpgReasoner
+
+def test_routes_rules_narrative_and_commands():
+    router = IntentRouter(report_every=0)
+    rules = [
+        "Quais são as características dos Anões?",
+        "Como funciona a regra de agarrar?",
+        "qual a CA do goblin?",
+        "Quanto de dano causa uma bola de fogo?",
+    ]
+    narrative = [
+        "eu ataco o goblin com minha espada",
+        "alguém quer pizza?",
+        "O que tem atrás da porta?",
+        # "do" e "on" estão no dicionário, mas não contam como termos de D&D
+        "Thorin entra na taverna e pede o vinho do dono",
+    ]
+    for text in rules:
+        decision = router.route(text)
+        assert decision.intent == INTENT_RULES, text
+        assert decision.confidence > 0.5
+    for text in narrative:
+        assert router.route(text).intent == INTENT_NARRATIVE, text
+    for text in ["!help", "\\reset", "&vamos pra taverna"]:
+        assert router.route(text) == (INTENT_COMMAND, 1.0, 0.0)
+
+    stats = router.stats()
+    assert stats["routed"] == 11
+    assert (stats[INTENT_RULES], stats[INTENT_NARRATIVE], stats[INTENT_COMMAND]) == (4, 4, 3)
+
+def test_embedding_only_for_ambiguous_messages():
+    router = IntentRouter(report_every=0)
+    # Vetores de brinquedo: "regra" aponta para o eixo das regras
+    router.attach_embedder(lambda texts: [[1.0, 0.0] if "regra" in t.lower() else [0.0, 1.0] for t in texts])
+    assert router.route("eu ataco o goblin").intent == INTENT_NARRATIVE
+    assert router.embedding_checks == 0
+    # Ambígua: pergunta sem termos de D&D, decidida pelo embedding
+    assert router.route("O que tem atrás da porta?").intent == INTENT_NARRATIVE
+    assert router.embedding_checks == 1
+
+def test_async_route_embeds_off_the_event_loop():
+    router = IntentRouter(report_every=0)
+    threads = []
+
+    def embedder(texts):
+        threads.append(threading.current_thread())
+        return [[1.0, 0.0] if "regra" in t.lower() else [0.0, 1.0] for t in texts]
+
+    router.attach_embedder(embedder)
+    threads.clear()
+
+    async def scenario():
+        loop_thread = threading.current_thread()
+        narrative = await router.route_async("O que tem atrás da porta?")
+        command = await router.route_async("!help")
+        return loop_thread, narrative, command
+
+    loop_thread, narrative, command = asyncio.run(scenario())
+    assert narrative.intent == INTENT_NARRATIVE
+    assert command.intent == INTENT_COMMAND
+    # O embedding da mensagem ambígua rodou numa thread, não no loop
+    assert len(threads) == 1 and threads[0] is not loop_thread
+    assert router.stats()["routed"] == 2
+
+def test_routing_takes_microseconds():
+    router = IntentRouter(report_every=0)
+    text = "eu ataco o goblin com minha espada e rolo iniciativa, depois corro pra floresta " * 3
+    start = time.perf_counter()
+    for _ in range(1000):
+        router.route(text)
+    assert (time.perf_counter() - start) / 1000 < 0.001
+
+def test_stats_report_goes_to_logging(caplog):
+    router = IntentRouter(report_every=2)
+    with caplog.at_level(logging.INFO, logger="rpg_tools.intent_router"):
+        router.route("eu ataco o goblin")
+        router.route("!help")
+    assert "2 mensagens" in caplog.text
+
+def test_reasoner_reuses_the_routed_intent():
+    reasoner = RpgReasoner()
+    reasoner.rag_system = SimpleNamespace(generate_answer=lambda chat, query: "resposta das regras")
+    router = get_intent_router()
+    routed = router.stats()["routed"]
+    # Quem recebeu a mensagem já a roteou: o reasoner não roteia de novo nem conta duas vezes
+    assert reasoner._rag_answer(None, "Como funciona a regra de agarrar?", INTENT_NARRATIVE) is None
+    assert reasoner._rag_answer(None, "eu ataco o goblin", INTENT_RULES) == "resposta das regras"
+    assert router.stats()["routed"] == routed
+    # Sem intenção decidida, a mensagem é roteada aqui
+    assert reasoner._rag_answer(None, "Como funciona a regra de agarrar?") == "resposta das regras"
+    assert router.stats()["routed"] == routed + 1
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-v"]))
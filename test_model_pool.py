@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Testes do pool de modelos em níveis: escolha por tarefa, tamanho do prompt e saúde do nível
+"""
+
+import sys
+import os
+import asyncio
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from llm_tools import LanguageModel, ModelPool, ModelTier, for_task
+
+class TierModel(LanguageModel):
+    """Modelo falso que responde com o nome do nível, ou falha quando `failing`"""
+
+    def __init__(self, name):
+        self.name = name
+        self.failing = False
+        self.calls = 0
+
+    def generate_content(self, req):
+        self.calls += 1
+        if self.failing:
+            raise RuntimeError(f"{self.name} fora do ar")
+        return self.name
+
+    def generate_content_with_functions(self, req, tools):
+        return self.generate_content(req)
+
+    def configure(self, model_name, functions):
+        pass
+
+def make_pool(task_tiers: dict = None):
+    tiers = {name: TierModel(name) for name in ("lite", "flash", "pro")}
+    pool = ModelPool([
+        ModelTier("pro", tiers["pro"], p95_limit_ms=1000),
+        ModelTier("lite", tiers["lite"], p95_limit_ms=100, max_prompt_tokens=100),
+        ModelTier("flash", tiers["flash"], p95_limit_ms=500),
+    ], task_tiers=task_tiers)
+    return pool, tiers
+
+def test_task_and_prompt_size_pick_the_tier():
+    pool, _ = make_pool()
+    assert pool.for_task("summary").generate_content("curto") == "lite"
+    assert pool.for_task("world").generate_content("curto") == "flash"
+    assert pool.generate_content("curto") == "flash"
+    # Não cabe no lite: sobe para o flash
+    assert pool.for_task("rag").generate_content("x" * 1000) == "flash"
+    # Sem pool, for_task devolve o próprio modelo
+    plain = TierModel("único")
+    assert for_task(plain, "summary") is plain
+
+def test_pro_tier_is_opt_in(monkeypatch):
+    monkeypatch.setenv("MODEL_TIER_WORLD", "pro")
+    monkeypatch.setenv("MODEL_TIER_SUMMARY", "ultra")
+    pool = ModelPool.from_env()
+    assert pool.task_tiers["world"] == "pro"
+    assert pool.task_tiers["summary"] == "lite"
+    assert ModelPool.TASK_TIERS["world"] == "flash"
+    assert "pro" not in ModelPool.TASK_TIERS.values()
+
+def test_slow_or_failing_tier_falls_back_to_faster():
+    pool, tiers = make_pool({"world": "pro"})
+    pro = pool.tiers[2]
+    for _ in range(ModelTier.MIN_SAMPLES):
+        pro.record(5000, True)
+    assert not pro.healthy()
+    assert pool.for_task("world").generate_content("curto") == "flash"
+
+    # Falha no pedido: repete no nível mais rápido seguinte e conta o erro
+    tiers["flash"].failing = True
+    assert asyncio.run(pool.generate_content_async("curto")) == "lite"
+    assert pool.tiers[1].error_rate() == 0.5  # Um sucesso (o pedido "world") e uma falha
+
+def test_latency_budget_prefers_a_tier_that_fits():
+    pool, _ = make_pool()
+    flash = pool.tiers[1]
+    for _ in range(ModelTier.MIN_SAMPLES):
+        flash.record(400, True)
+    assert flash.healthy()
+    assert pool.for_task("conversation", latency_budget_ms=200).generate_content("curto") == "lite"
+    assert pool.for_task("conversation", latency_budget_ms=1000).generate_content("curto") == "flash"
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Testes da organização dos prompts do RpgReasoner em prefixo estável e cauda dinâmica
+Usa um modelo local que registra quais prefixos seriam reaproveitados pelo cache
+"""
+
+import sys
+import os
+import asyncio
+from types import SimpleNamespace
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from discord_tools.chat import Chat
+from fakes import FakeModel, add_message as add_chat_message, response, text_part
+import llm_tools
+from llm_tools import GeminiModel, PromptLayout
+from rpg_tools.reasoner import RpgReasoner
+
+class PrefixRecordingModel(FakeModel):
+    """Modelo falso: guarda os prefixos vistos e conta os caracteres que não precisariam ser reenviados"""
+
+    def __init__(self):
+        self.prefixes = {}
+        self.requests = []
+        self.reused_chars = 0
+        self.sent_chars = 0
+
+    def _record(self, req, tools):
+        assert isinstance(req, PromptLayout)
+        key = req.prefix_key(tools)
+        if key in self.prefixes:
+            self.reused_chars += len(req.system)
+        else:
+            self.prefixes[key] = req.system
+            self.sent_chars += len(req.system)
+        self.sent_chars += len(req.campaign) + len(req.dynamic)
+        self.requests.append(req)
+        return response(text_part("O goblin recua."))
+
+    def generate_content_with_functions(self, req, tools):
+        return self._record(req, tools)
+
+def add_message(chat: Chat, i: int):
+    add_chat_message(chat, f"eu ataco o goblin pela {i}ª vez", minutes=i)
+
+def test_conversation_prefix_is_reused():
+    reasoner = RpgReasoner()
+    reasoner.world_history.WriteHistory("Reino anão de Ironforge, ameaçado por goblins. " * 50)
+    model = PrefixRecordingModel()
+    chat = Chat()
+    for i in range(10):
+        add_message(chat, i)
+        assert asyncio.run(reasoner.ConversationRequest(chat, model)) == ["O goblin recua."]
+
+    assert len(model.prefixes) == 1
+    first, last = model.requests[0], model.requests[-1]
+    # Nada volátil no prefixo: mensagens e horário ficam só na cauda
+    assert "1ª vez" not in first.system + first.campaign
+    assert "9ª vez" in last.dynamic
+    assert "Ironforge" in last.campaign
+    # Só o primeiro pedido envia as instruções; os outros as reaproveitam
+    assert model.reused_chars == 9 * len(first.system)
+
+def test_campaign_change_keeps_shared_prefix():
+    reasoner = RpgReasoner()
+    model = PrefixRecordingModel()
+    chat = Chat()
+    add_message(chat, 0)
+    asyncio.run(reasoner.ConversationRequest(chat, model))
+    reasoner.world_history.WriteHistory("Uma nave perdida entre galáxias.")
+    add_message(chat, 1)
+    asyncio.run(reasoner.ConversationRequest(chat, model))
+    # A campanha de cada canal vai na cauda; o prefixo em cache é o mesmo para todos
+    assert len(model.prefixes) == 1
+    assert model.requests[0].system == model.requests[1].system
+    assert "galáxias" in model.requests[1].campaign
+
+def test_failed_context_cache_is_retried_after_backoff(monkeypatch):
+    attempts = []
+
+    def create(**kwargs):
+        attempts.append(kwargs)
+        raise RuntimeError("cota excedida")
+
+    monkeypatch.setattr(llm_tools.genai.caching.CachedContent, "create", create)
+    monkeypatch.setattr(GeminiModel, "_prefix_models", {})
+    model = GeminiModel("gemini-test", [])
+    layout = PromptLayout("instruções " * 2000, "campanha " * 2000, "mensagens")
+
+    first, cached = model._prefix_model(layout, None)
+    assert not cached and len(attempts) == 1
+    # Dentro do intervalo de espera, o modelo sem cache é reaproveitado
+    assert model._prefix_model(layout, None) == (first, False)
+    assert len(attempts) == 1
+
+    # Passado o intervalo, a criação do cache é tentada de novo
+    key = (model.model_name, layout.prefix_key(None))
+    entry = model._prefix_models[key]
+    model._prefix_models[key] = (entry[0], entry[1], entry[2] - model.CACHE_RETRY)
+    model._prefix_model(layout, None)
+    assert len(attempts) == 2
+
+def test_context_cache_is_shared_across_channels_and_tiers(monkeypatch):
+    created = []
+
+    def create(**kwargs):
+        created.append(kwargs)
+        return SimpleNamespace(name="cachedContents/rpg")
+
+    monkeypatch.setattr(llm_tools.genai.caching.CachedContent, "create", create)
+    monkeypatch.setattr(llm_tools.genai.GenerativeModel, "from_cached_content", lambda cache: object())
+    monkeypatch.setattr(GeminiModel, "_prefix_models", {})
+    system = "instruções " * 2000
+    flash, world = GeminiModel("gemini-test", []), GeminiModel("gemini-test", [])
+    # Mais canais que qualquer limite fixo de entradas: um único cache, sem recriações
+    for channel in range(40):
+        model = flash if channel % 2 else world
+        assert model._prefix_model(PromptLayout(system, f"campanha {channel}", "mensagens"), None)[1]
+    assert len(created) == 1
+    assert "contents" not in created[0]
+
+def test_layout_renders_as_plain_prompt():
+    layout = PromptLayout("instruções\n", "campanha\n", "mensagens\n")
+    assert str(layout) == "instruções\ncampanha\nmensagens\n"
+    assert layout.prefix_key() == PromptLayout("instruções\n", "outra campanha\n", "outra").prefix_key()
+    assert layout.prefix_key() != PromptLayout("outras instruções\n", "campanha\n", "mensagens\n").prefix_key()
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -3,8 +3,9 @@
 Teste de integração do sistema RAG D&D
 """
 
+import datetime
 from rag import get_rag_system
-from discord_tools.chat import Chat
+from discord_tools.chat import Chat, ChatMessage
 
 def test_rag_system():
     """Testa o sistema RAG"""
@@ -42,7 +43,7 @@ def test_rag_system():
     try:
         chat = Chat()
         chat.SetName("LLM", False)
-        chat.chat_text += f"$ Mensagem de Fulaninho: {test_query}\n\n"
+        chat.append(ChatMessage(None, datetime.datetime.now(), "Fulaninho", test_query))
         response = rag_system.generate_answer(chat, test_query)
         print(f"Resposta: {response}")
         print("✅ Resposta gerada com sucesso!")
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Testes da agregação de menções por canal durante uma geração
+"""
+
+import sys
+import os
+import asyncio
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from discord_tools.coalescer import ReplyCoalescer
+
+async def burst(coalescer: ReplyCoalescer, handled: list):
+    async def handler(batch):
+        handled.append(list(batch))
+        await asyncio.sleep(0.2)
+
+    async def mention(channel, text, delay):
+        await asyncio.sleep(delay)
+        return await coalescer.submit(channel, text, handler)
+
+    return await asyncio.gather(
+        mention("taverna", "a", 0.0),
+        # Chegam durante a geração da primeira resposta
+        mention("taverna", "b", 0.01),
+        mention("taverna", "c", 0.02),
+        mention("taverna", "d", 0.1),
+        mention("taverna", "e", 0.15),
+        # Outro canal não espera pela taverna
+        mention("masmorra", "x", 0.0),
+    )
+
+def test_mentions_are_coalesced_per_channel():
+    coalescer = ReplyCoalescer(debounce=0.05)
+    handled = []
+    ran = asyncio.run(burst(coalescer, handled))
+    assert ran == [True, False, False, False, False, True]
+    assert sorted(handled) == [["a"], ["b", "c", "d", "e"], ["x"]]
+    assert coalescer.requests == 3
+    assert coalescer.coalesced == 3
+
+def test_single_mention_is_not_delayed():
+    coalescer = ReplyCoalescer(debounce=1.0)
+    started = []
+
+    async def handler(batch):
+        started.append(asyncio.get_running_loop().time())
+
+    async def run():
+        start = asyncio.get_running_loop().time()
+        await coalescer.submit("taverna", "a", handler)
+        return start, asyncio.get_running_loop().time()
+
+    start, done = asyncio.run(run())
+    # Nada em andamento: sem debounce antes da resposta nem depois dela
+    assert started[0] - start < 0.1
+    assert done - start < 0.1
+
+def test_handler_error_does_not_block_channel():
+    coalescer = ReplyCoalescer(debounce=0)
+    calls = []
+
+    async def failing(batch):
+        calls.append(batch)
+        raise RuntimeError("falha na geração")
+
+    async def run():
+        await coalescer.submit("taverna", "a", failing)
+        await coalescer.submit("taverna", "b", failing)
+
+    asyncio.run(run())
+    assert calls == [["a"], ["b"]]
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-v"]))
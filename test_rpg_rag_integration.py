@@ -29,6 +29,8 @@ def test_rpg_rag_integration():
             print("❌ Falha ao inicializar sistema RAG")
             return False
         
+        from rpg_tools.intent_router import INTENT_RULES, get_intent_router
+
         # Criar agente RPG
         reasoner = RpgReasoner()
         print("✅ Agente RPG criado com sucesso")
@@ -49,7 +51,7 @@ def test_rpg_rag_integration():
         
         print("\n🔍 Teste de Detecção de Perguntas D&D:")
         for question, expected in test_questions:
-            result = reasoner._should_use_rag(question)
+            result = get_intent_router().route(question).intent == INTENT_RULES
             status = "✅" if result == expected else "❌"
             print(f"{status} '{question}' -> {result} (esperado: {expected})")
         
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Testes das respostas em streaming: edições limitadas no Discord e chamadas de função no meio do texto
+"""
+
+import sys
+import os
+import asyncio
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from discord_tools.streaming import StreamingReply
+from fakes import FakeModel, call_part, make_chat, response, text_part
+from rpg_tools.reasoner import RpgReasoner
+
+class FakeMessage:
+    def __init__(self, content):
+        self.content = content
+        self.edits = 0
+
+    async def edit(self, content):
+        self.content = content
+        self.edits += 1
+
+class FakeChannel:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, content):
+        message = FakeMessage(content)
+        self.sent.append(message)
+        return message
+
+class StreamingModel(FakeModel):
+    """Modelo falso que entrega cada passo em trechos; "D20" vira uma chamada de função"""
+
+    def __init__(self, steps):
+        self.steps = list(steps)
+
+    def generate_content_with_functions(self, req, tools):
+        raise AssertionError("o caminho em streaming não deve chamar a geração completa")
+
+    async def generate_content_stream_async(self, req, tools):
+        for piece in self.steps.pop(0):
+            await asyncio.sleep(0.01)
+            if piece == "D20":
+                yield response(call_part("JogarD20"))
+            else:
+                yield response(text_part(piece))
+
+def test_edits_are_throttled_and_split():
+    async def scenario():
+        channel = FakeChannel()
+        reply = StreamingReply(channel, min_interval=0.05, limit=100)
+        text = ""
+        for i in range(60):
+            text += f"palavra{i} " + ("\n" if i % 10 == 9 else "")
+            await reply.update(text)
+            await asyncio.sleep(0.005)
+        await reply.finish()
+        return channel, reply, text
+
+    channel, reply, text = asyncio.run(scenario())
+    # Publicou logo o primeiro trecho e não editou a cada atualização
+    assert channel.sent[0].content.startswith("palavra0")
+    assert reply.edits < 30
+    assert len(channel.sent) > 1
+    assert all(len(m.content) <= 100 for m in channel.sent)
+    assert "".join(m.content.replace("\n", "") for m in channel.sent) == text.replace("\n", "")
+
+def test_reasoner_streams_text_and_handles_function_calls():
+    reasoner = RpgReasoner()
+    chat = make_chat()
+    seen = []
+
+    async def on_text(text):
+        seen.append(text)
+
+    model = StreamingModel([["&O goblin ", "recua ", "D20"], ["e cai."]])
+    result = asyncio.run(reasoner.GenerateRequest(chat, model, on_text=on_text))
+    # O texto dos dois passos veio em partes, sem o caractere de comando; o dado vem depois dele
+    assert seen == ["O goblin ", "O goblin recua ", "O goblin recua e cai."]
+    assert len(result) == 1 and result[0].startswith("@ O resultado do dado D20 foi")
+    assert "first_token" in reasoner.stage_latency
+
+def test_stream_end_is_signaled_once_when_text_is_complete():
+    reasoner = RpgReasoner()
+    chat = make_chat()
+    seen, ended = [], []
+
+    async def on_text(text):
+        seen.append(text)
+
+    async def on_stream_end():
+        ended.append(seen[-1])
+
+    model = StreamingModel([["&O goblin ", "D20"], ["cai."]])
+    result = asyncio.run(reasoner.GenerateRequest(chat, model, on_text=on_text, on_stream_end=on_stream_end))
+    # Sinalizado uma vez, com o texto completo, antes de GenerateRequest devolver as mensagens das ferramentas
+    assert ended == ["O goblin cai."]
+    assert len(result) == 1
+
+    async def finish_twice():
+        channel = FakeChannel()
+        reply = StreamingReply(channel, min_interval=0)
+        await reply.update("texto")
+        await reply.finish()
+        # O chamador ainda finaliza depois do reasoner; a segunda chamada não publica nada
+        reply.text = "texto alterado"
+        await reply.finish()
+        return channel
+
+    assert [m.content for m in asyncio.run(finish_twice()).sent] == ["texto"]
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-v"]))
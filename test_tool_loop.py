@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Testes do laço de ferramentas do RpgReasoner: chamadas em paralelo e resultados devolvidos ao modelo
+"""
+
+import sys
+import os
+import asyncio
+
+# Adicionar o diretório raiz ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import FakeModel, make_chat, response, text_part as text, call_part as call
+from rpg_tools.reasoner import RpgReasoner
+
+class ScriptedModel(FakeModel):
+    """Modelo falso que responde cada passo com as partes roteirizadas e guarda os turnos recebidos"""
+
+    def __init__(self, steps):
+        self.steps = list(steps)
+        self.turns_seen = []
+
+    def generate_content_with_functions(self, req, tools):
+        self.turns_seen.append(list(req.turns))
+        return response(*(self.steps.pop(0) if self.steps else [call("JogarD20")]))
+
+def test_tool_results_are_fed_back_to_the_model():
+    reasoner = RpgReasoner()
+    model = ScriptedModel([
+        [text("Thorin e Balin atacam!"), call("JogarD20"), call("JogarD20")],
+        [text("Os dois golpes acertam o goblin.")],
+    ])
+    result = asyncio.run(reasoner.GenerateRequest(make_chat(), model))
+
+    assert result[0] == "Thorin e Balin atacam!"
+    assert [r.startswith("@ O resultado do dado D20 foi") for r in result[1:3]] == [True, True]
+    assert result[3] == "Os dois golpes acertam o goblin."
+    # O segundo passo recebeu a resposta do modelo e os dois resultados, na mesma conversa
+    assert model.turns_seen[0] == []
+    (role_model, _), (role_function, responses) = model.turns_seen[1]
+    assert (role_model, role_function) == ("model", "function")
+    assert [name for name, _ in responses] == ["JogarD20", "JogarD20"]
+    assert all(1 <= result["resultado"] <= 20 for _, result in responses)
+    assert len(reasoner.step_latency) == 2
+
+def test_loop_is_bounded():
+    reasoner = RpgReasoner()
+    model = ScriptedModel([])  # sempre pede mais um dado
+    result = asyncio.run(reasoner.GenerateRequest(make_chat(), model))
+    assert len(model.turns_seen) == reasoner.max_tool_steps
+    assert len(result) == reasoner.max_tool_steps
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-v"]))